@@ -1,57 +1,369 @@
 
-from typing import Optional
+import queue
+import threading
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
 
 import cv2
-from pyzbar import pyzbar  # type: ignore
+
+try:
+    from pyzbar import pyzbar  # type: ignore
+    from pyzbar.pyzbar import ZBarSymbol  # type: ignore
+except ImportError:  # 未安装 zbar 时只使用 OpenCV 解码
+    pyzbar = None
+    ZBarSymbol = None
+
+from shexiangtou import get_camera
+from zhenyuan import add_source_arguments, open_source
 
 
 def _decode_bytes(raw: bytes) -> str:
     return raw.decode("utf-8", errors="ignore").strip()
 
 
-def decode_qr_from_camera(timeout_seconds: int = 8) -> Optional[str]:
+Rect = Tuple[int, int, int, int]
+
+
+def _decode_pyzbar(gray) -> List[Tuple[str, Rect]]:
+    # 只启用二维码一种码制，zbar 不再尝试条形码等其他类型
+    results = []
+    for obj in pyzbar.decode(gray, symbols=[ZBarSymbol.QRCODE]):
+        left, top, width, height = obj.rect
+        results.append((_decode_bytes(obj.data), (left, top, width, height)))
+    return results
+
+
+_opencv_detector = threading.local()
+
+
+def _decode_opencv(gray) -> List[Tuple[str, Rect]]:
+    # QRCodeDetector 不是线程安全的，每个线程各用一个
+    detector = getattr(_opencv_detector, "detector", None)
+    if detector is None:
+        detector = _opencv_detector.detector = cv2.QRCodeDetector()
+    ok, texts, points, _ = detector.detectAndDecodeMulti(gray)
+    if not ok:
+        return []
+    return [(text.strip(), tuple(cv2.boundingRect(pts.astype("int32")))) for text, pts in zip(texts, points)]
+
+
+_BACKENDS = {"pyzbar": _decode_pyzbar, "opencv": _decode_opencv}
+
+
+def available_backends() -> List[str]:
+    return ["pyzbar", "opencv"] if pyzbar is not None else ["opencv"]
+
+
+class QRDecoder:
+    """
+    多二维码解码器：每帧返回所有二维码的 (文本, 外接矩形)。
+
+    每隔 full_scan_interval 帧全图扫描一次，其余帧只在最近发现二维码的区域（向外扩 roi_margin 倍）内扫描；
+    区域内丢失二维码时下一帧立即全图扫描。
+    backend="auto" 时全图扫描同时运行 pyzbar 与 cv2.QRCodeDetector，直到累计 calibrate_scans 帧
+    至少有一个后端解出了二维码（空画面说明不了解码能力，不计入），之后固定使用解出二维码最多的那一个，
+    一样多时选更快的；校准期间的区域扫描只用首选后端，不计入校准。
+
+    区域扫描在二维码只占画面一小部分时（摄像头画面中的手机屏幕）才有收益，
+    二维码占满整张图片时与全图扫描相当，见 --benchmark 的两组结果。
+    """
+
+    def __init__(self, backend: str = "auto", full_scan_interval: int = 10, roi_margin: float = 0.5, calibrate_scans: int = 5):
+        if backend != "auto" and backend not in available_backends():
+            raise ValueError(f"不可用的二维码解码后端：{backend}")
+        self.backend = backend
+        self.full_scan_interval = full_scan_interval
+        self.roi_margin = roi_margin
+        self.calibrate_scans = calibrate_scans
+        self.frame_index = 0
+        self.full_scans = 0
+        self.roi_scans = 0
+        self._rois: List[Rect] = []
+        self._force_full = True
+        self._timings = {name: [0.0, 0] for name in available_backends()}
+        self._calibrated = 0
+
+    def reset(self):
+        self.frame_index = 0
+        self._rois = []
+        self._force_full = True
+
+    def _decode_calibrating(self, gray) -> List[Tuple[str, Rect]]:
+        best = []
+        samples = {}
+        for name in self._timings:
+            begin = time.perf_counter()
+            results = _BACKENDS[name](gray)
+            samples[name] = (time.perf_counter() - begin, len([text for text, _ in results if text]))
+            if len(results) > len(best):
+                best = results
+        if not any(found for _, found in samples.values()):
+            return best
+        for name, (seconds, found) in samples.items():
+            self._timings[name][0] += seconds
+            self._timings[name][1] += found
+        self._calibrated += 1
+        if self._calibrated >= self.calibrate_scans:
+            most = max(found for _, found in self._timings.values())
+            candidates = [name for name, (_, found) in self._timings.items() if found >= most]
+            self.backend = min(candidates, key=lambda name: self._timings[name][0])
+        return best
+
+    def _decode(self, gray, full: bool = True) -> List[Tuple[str, Rect]]:
+        if self.backend == "auto":
+            if len(self._timings) == 1:
+                self.backend = next(iter(self._timings))
+            elif full:
+                return self._decode_calibrating(gray)
+            else:
+                return _BACKENDS[available_backends()[0]](gray)
+        return _BACKENDS[self.backend](gray)
+
+    def _expand(self, rect: Rect, shape) -> Rect:
+        x, y, w, h = rect
+        dx, dy = int(w * self.roi_margin), int(h * self.roi_margin)
+        x0, y0 = max(0, x - dx), max(0, y - dy)
+        x1, y1 = min(shape[1], x + w + dx), min(shape[0], y + h + dy)
+        return x0, y0, x1 - x0, y1 - y0
+
+    def decode(self, gray) -> List[Tuple[str, Rect]]:
+        full = self._force_full or not self._rois or self.frame_index % self.full_scan_interval == 0
+        self.frame_index += 1
+        results: List[Tuple[str, Rect]] = []
+        if full:
+            self.full_scans += 1
+            results = self._decode(gray)
+        else:
+            self.roi_scans += 1
+            for x, y, w, h in self._rois:
+                for text, (rx, ry, rw, rh) in self._decode(gray[y : y + h, x : x + w], full=False):
+                    results.append((text, (rx + x, ry + y, rw, rh)))
+        # 去掉空文本与相邻区域重复解出的同一个码
+        unique = []
+        for text, rect in results:
+            if text and all(text != known for known, _ in unique):
+                unique.append((text, rect))
+        self._force_full = not full and len(unique) < len(self._rois)
+        self._rois = [self._expand(rect, gray.shape) for _, rect in unique]
+        return unique
+
+
+def decode_frame(gray, backend: str = "auto") -> List[str]:
+    """返回一帧灰度图中所有二维码的文本（单张图片，始终全图扫描）。"""
+    if backend == "auto":
+        backend = available_backends()[0]
+    return [text for text, _ in QRDecoder(backend).decode(gray)]
+
 
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        raise RuntimeError("无法打开摄像头")
+def iter_qr_codes(
+    source=None,
+    repeat_window: float = 10.0,
+    show: bool = True,
+    stop_event: Optional[threading.Event] = None,
+    timeout_seconds: Optional[float] = None,
+    on_frame: Optional[Callable] = None,
+) -> Iterator[str]:
+    """
+    连续扫描，摄像头全程只打开一次，每识别到一个新二维码就产出其文本。
+
+    同一二维码在 repeat_window 秒内再次出现不重复产出；一直停留在画面中的二维码
+    每次出现都会刷新计时，因此不会每隔 repeat_window 秒重复签到。
+    stop_event 被置位、按 q、超时或来源读完时结束。
+    show=True 用 OpenCV 窗口预览，只能在主线程中使用；在后台线程中扫描时应传 show=False，
+    通过 on_frame(frame, found) 取得每帧画面与解码结果，由界面线程自行显示（frame 为共享帧，不要修改）。
+    """
+    cap = get_camera(0) if source is None else open_source(source)
+    decoder = QRDecoder()
+    last_seen = {}
+    start = time.monotonic()
+    try:
+        while stop_event is None or not stop_event.is_set():
+            if timeout_seconds is not None and time.monotonic() - start > timeout_seconds:
+                break
+            ok, frame = cap.read(copy=show)
+            if not ok:
+                if getattr(cap, "exhausted", False):
+                    break
+                continue
+
+            now = time.monotonic()
+            found = decoder.decode(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+            for text, _ in found:
+                previous = last_seen.get(text)
+                last_seen[text] = now
+                if previous is None or now - previous >= repeat_window:
+                    yield text
+
+            if on_frame is not None:
+                on_frame(frame, found)
+            if show:
+                _draw_codes(frame, found)
+                cv2.imshow("QR Code Sign-In (按 q 退出)", frame)
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
+    finally:
+        if source is not None:
+            cap.release()
+        if show:
+            cv2.destroyAllWindows()
+
+
+class QRSignInSession:
+    """
+    后台连续签到线程：把识别到的二维码文本逐个放入结果队列，出错时放入异常对象后退出。
+
+    界面线程用 after() 轮询队列，不会被扫描阻塞，也不需要逐个弹窗确认。
+    HighGUI 不是线程安全的，扫描线程不打开 OpenCV 窗口；preview=True 时保留最新一帧
+    （已缩放到 preview_width 宽并画出二维码框），由界面线程通过 latest_preview() 取出显示。
+    """
+
+    def __init__(self, result_queue=None, repeat_window: float = 10.0, source=None, preview: bool = False, preview_width: int = 320):
+        self.result_queue = result_queue if result_queue is not None else queue.Queue()
+        self.repeat_window = repeat_window
+        self.source = source
+        self.preview = preview
+        self.preview_width = preview_width
+        self._preview_frame = None
+        self._preview_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="qr-sign-in", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def latest_preview(self):
+        """取出上次调用以来的最新预览帧（BGR），没有新帧时返回 None。"""
+        with self._preview_lock:
+            frame, self._preview_frame = self._preview_frame, None
+        return frame
+
+    def _keep_preview(self, frame, found):
+        scale = self.preview_width / frame.shape[1]
+        small = cv2.resize(frame, (self.preview_width, int(round(frame.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+        _draw_codes(small, [(text, tuple(int(v * scale) for v in rect)) for text, rect in found])
+        with self._preview_lock:
+            self._preview_frame = small
+
+    def _run(self):
+        on_frame = self._keep_preview if self.preview else None
+        try:
+            for text in iter_qr_codes(self.source, self.repeat_window, False, self._stop_event, on_frame=on_frame):
+                self.result_queue.put(text)
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            self.result_queue.put(err)
+
+
+def _draw_codes(frame, found):
+    for text, (x, y, w, h) in found:
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        cv2.putText(frame, text, (x, max(20, y - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+
+
+def decode_qr_from_camera(timeout_seconds: int = 8, source=None, show: bool = True) -> Optional[str]:
+    """扫描二维码并返回第一个识别到的文本；source 可为视频文件、图片目录或 FrameSource。"""
+
+    cap = get_camera(0) if source is None else open_source(source)
+    decoder = QRDecoder()
 
     start = cv2.getTickCount()
     freq = cv2.getTickFrequency()
     result: Optional[str] = None
 
     while True:
-        ok, frame = cap.read()
+        ok, frame = cap.read(copy=show)
         if not ok:
+            if getattr(cap, "exhausted", False):
+                break
             continue
 
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        decoded_objects = pyzbar.decode(gray)
-        if decoded_objects:
-            raw = decoded_objects[0].data
-            text = _decode_bytes(raw)
-            result = text
-            cv2.putText(
-                frame,
-                text,
-                (20, 40),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.8,
-                (0, 255, 0),
-                2,
-            )
+        found = decoder.decode(gray)
+        if found:
+            result = found[0][0]
+            if not show:
+                break
+            _draw_codes(frame, found)
             cv2.imshow("QR Code Sign-In", frame)
             cv2.waitKey(300)
             break
 
-        cv2.imshow("QR Code Sign-In (按 q 退出)", frame)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
+        if show:
+            cv2.imshow("QR Code Sign-In (按 q 退出)", frame)
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                break
 
         elapsed = (cv2.getTickCount() - start) / freq
         if elapsed > timeout_seconds:
             break
 
-    cap.release()
-    cv2.destroyAllWindows()
+    if source is not None:
+        cap.release()
+    if show:
+        cv2.destroyAllWindows()
     return result
 
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = add_source_arguments(argparse.ArgumentParser(description="二维码扫描"))
+    parser.add_argument("--timeout", type=float, default=8, help="超时时间（秒）")
+    parser.add_argument("--no-show", action="store_true", help="不显示窗口")
+    parser.add_argument("--session", action="store_true", help="连续签到模式，逐个打印识别到的二维码")
+    parser.add_argument("--repeat-window", type=float, default=10.0, help="连续签到时同一二维码的去重时间（秒）")
+    parser.add_argument("--benchmark", metavar="DIR", default=None, help="对目录中的图片测试各解码方式的吞吐量，如 image")
+    parser.add_argument("--rounds", type=int, default=20, help="测速时每张图片的重复次数")
+    args = parser.parse_args()
+    if args.benchmark:
+        import os
+
+        import numpy as np
+
+        images = []
+        for name in sorted(os.listdir(args.benchmark)):
+            img = cv2.imdecode(np.fromfile(os.path.join(args.benchmark, name), dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                images.append(img)
+        # 二维码占满整张图片时区域跟踪没有收益；把图片缩小后放进 1280x720 的画面，模拟摄像头前举着手机
+        rng = np.random.default_rng(0)
+        camera_frames = []
+        for img in images:
+            frame = cv2.GaussianBlur(rng.integers(90, 160, (720, 1280), dtype=np.uint8), (7, 7), 2)
+            small = cv2.resize(img, (200, max(1, int(200 * img.shape[0] / img.shape[1]))), interpolation=cv2.INTER_AREA)
+            h = min(small.shape[0], 720 - 300)
+            frame[300 : 300 + h, 700:900] = small[:h]
+            camera_frames.append(frame)
+        # 同一画面连续解码 rounds 次，模拟二维码停留在画面中的连续帧
+        modes = [(name, 1) for name in available_backends()] + [(name, 10) for name in available_backends()]
+        for scene, frames in (("原图", images), ("1280x720 画面", camera_frames)):
+            for backend, interval in modes:
+                found = 0
+                begin = time.perf_counter()
+                for frame in frames:
+                    decoder = QRDecoder(backend, full_scan_interval=interval)
+                    for _ in range(args.rounds):
+                        found += len(decoder.decode(frame))
+                elapsed = time.perf_counter() - begin
+                label = "每帧全图" if interval == 1 else f"区域跟踪（每{interval}帧全图）"
+                print(
+                    f"{scene} {backend:7s} {label}：{len(frames) * args.rounds / elapsed:.1f} 帧/秒，"
+                    f"平均每帧 {found / (len(frames) * args.rounds):.2f} 个二维码"
+                )
+        raise SystemExit
+    frame_source = None if args.source is None else open_source(args.source, realtime=args.realtime)
+    if args.session:
+        for code in iter_qr_codes(frame_source, args.repeat_window, not args.no_show, timeout_seconds=args.timeout):
+            print(time.strftime("%H:%M:%S"), code)
+    else:
+        print(decode_qr_from_camera(args.timeout, source=frame_source, show=not args.no_show))
+
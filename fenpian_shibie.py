@@ -0,0 +1,181 @@
+import multiprocessing
+import os
+import threading
+import weakref
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from lbp_suoyin import LBPHistogramIndex, lbp_histogram
+
+# 界面与摄像头线程已在运行，fork 出的子进程会继承持有中的锁；统一用 spawn 启动分片进程
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def shard_mask(labels: np.ndarray, shard: int, shards: int) -> np.ndarray:
+    """按身份轮流分配到各分片，同一身份的样本总在同一分片。"""
+    unique = np.unique(labels)
+    return np.isin(labels, unique[shard::shards])
+
+
+def _shard_worker(conn, source, shard, shards, options):
+    # 子进程：只保留自己分片的直方图，循环处理父进程广播的查询
+    if source[0] == "snapshot":
+        full = LBPHistogramIndex.from_snapshot(source[1])
+        histograms, labels, params = full.histograms, full.labels, full.params
+    else:
+        _, histograms, labels, params = source
+    mask = shard_mask(labels, shard, shards)
+    index = LBPHistogramIndex(np.array(histograms[mask]), labels[mask], **params, **options)
+    del histograms, labels
+    conn.send(len(index))
+    while True:
+        queries = conn.recv()
+        if queries is None:
+            break
+        conn.send(index.query(queries))
+    conn.close()
+
+
+def _shutdown(workers):
+    for conn, process in workers:
+        try:
+            conn.send(None)
+        except (OSError, EOFError):
+            pass
+    for conn, process in workers:
+        process.join(timeout=2)
+        if process.is_alive():
+            process.terminate()
+        conn.close()
+
+
+class ShardedRecognizer:
+    """
+    多进程分片识别：已注册身份分散到 shards 个子进程，每个进程只持有自己的分片。
+
+    父进程计算每张人脸的 LBP 直方图后广播给所有分片，各分片并行查询，
+    取距离最小的 (label, confidence)。predict/predict_batch 接口与 LBPHistogramIndex 相同，
+    可直接作为 FaceModel.recognizer 使用。
+    """
+
+    def __init__(self, source, params, shards: Optional[int] = None, **options):
+        self.shards = max(1, shards or os.cpu_count() or 1)
+        self.radius = params["radius"]
+        self.neighbors = params["neighbors"]
+        self.grid_x = params["grid_x"]
+        self.grid_y = params["grid_y"]
+        self._lock = threading.Lock()
+        self._workers = []
+        self._finalizer = weakref.finalize(self, _shutdown, self._workers)
+        for shard in range(self.shards):
+            parent_conn, child_conn = _MP_CONTEXT.Pipe()
+            process = _MP_CONTEXT.Process(
+                target=_shard_worker, args=(child_conn, source, shard, self.shards, options), daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self._workers.append((parent_conn, process))
+        try:
+            self.shard_sizes = [conn.recv() for conn, _ in self._workers]
+        except EOFError:
+            self.close()
+            raise RuntimeError("识别分片进程启动失败")
+
+    @classmethod
+    def from_index(cls, index: LBPHistogramIndex, shards: Optional[int] = None, **options) -> "ShardedRecognizer":
+        """由内存中的索引切分，各分片数据随进程启动传入子进程。"""
+        merged = {key: getattr(index, key) for key in ("metric", "mode", "top_k")}
+        merged.update(options)
+        source = ("arrays", np.asarray(index.histograms), np.asarray(index.labels), index.params)
+        return cls(source, index.params, shards, **merged)
+
+    @classmethod
+    def from_snapshot(cls, directory, shards: Optional[int] = None, **options) -> "ShardedRecognizer":
+        """各子进程自行内存映射二进制快照并取出自己的分片，父进程不加载直方图。"""
+        params = LBPHistogramIndex.from_snapshot(directory).params
+        return cls(("snapshot", directory), params, shards, **options)
+
+    def __len__(self):
+        return sum(self.shard_sizes)
+
+    @property
+    def params(self):
+        return {"radius": self.radius, "neighbors": self.neighbors, "grid_x": self.grid_x, "grid_y": self.grid_y}
+
+    def compute_histogram(self, gray: np.ndarray) -> np.ndarray:
+        return lbp_histogram(gray, self.radius, self.neighbors, self.grid_x, self.grid_y)
+
+    def query(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        if not self._workers:
+            raise RuntimeError("分片识别服务已关闭")
+        # 同一时刻只允许一轮广播，保证各管道的请求与应答一一对应
+        with self._lock:
+            for conn, _ in self._workers:
+                conn.send(queries)
+            results = [conn.recv() for conn, _ in self._workers]
+        labels = np.stack([r[0] for r in results])
+        distances = np.stack([r[1] for r in results])
+        best = distances.argmin(axis=0)
+        columns = np.arange(queries.shape[0])
+        return labels[best, columns], distances[best, columns]
+
+    def predict(self, gray: np.ndarray) -> Tuple[int, float]:
+        labels, distances = self.query(self.compute_histogram(gray)[None, :])
+        return int(labels[0]), float(distances[0])
+
+    def predict_batch(self, crops: Sequence[np.ndarray]) -> List[Tuple[int, float]]:
+        if len(crops) == 0:
+            return []
+        labels, distances = self.query(np.vstack([self.compute_histogram(crop) for crop in crops]))
+        return [(int(label), float(dist)) for label, dist in zip(labels, distances)]
+
+    def close(self):
+        """结束所有分片进程；等待进行中的查询完成后再关闭。"""
+        with self._lock:
+            self._finalizer()
+            self._workers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="分片识别与单进程索引的预测耗时对比")
+    parser.add_argument("--identities", type=int, default=200, help="模拟的身份数")
+    parser.add_argument("--per-identity", type=int, default=10, help="每个身份的样本数")
+    parser.add_argument("--shards", type=int, default=None, help="分片进程数，默认等于 CPU 核数")
+    parser.add_argument("--faces", type=int, default=4, help="每帧人脸数")
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    index = LBPHistogramIndex.from_images([rng.integers(0, 256, (100, 100), dtype=np.uint8)], [0])
+    total = args.identities * args.per_identity
+    dim = index.histograms.shape[1]
+    index = LBPHistogramIndex(
+        rng.random((total, dim), dtype=np.float32) / dim, np.repeat(np.arange(args.identities), args.per_identity)
+    )
+    crops = [rng.integers(0, 256, (100, 100), dtype=np.uint8) for _ in range(args.faces)]
+
+    def timed(recognizer):
+        recognizer.predict_batch(crops)
+        begin = time.perf_counter()
+        for _ in range(args.rounds):
+            result = recognizer.predict_batch(crops)
+        return 1000 * (time.perf_counter() - begin) / args.rounds, result
+
+    single_ms, expected = timed(index)
+    with ShardedRecognizer.from_index(index, args.shards) as sharded:
+        sharded_ms, result = timed(sharded)
+        print(
+            f"{total} 个样本、每帧 {args.faces} 张人脸：单进程 {single_ms:.1f}ms，"
+            f"{sharded.shards} 个分片 {sharded_ms:.1f}ms，结果一致：{result == expected}"
+        )
@@ -0,0 +1,276 @@
+import csv
+import gzip
+import io
+import lzma
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+
+COMPRESSORS = {"gzip": (".gz", gzip.open), "lzma": (".xz", lzma.open)}
+
+
+def _partition_day(name) -> Optional[date]:
+    try:
+        return datetime.strptime(name[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _partition_seq(name) -> int:
+    stem = name.split(".", 1)[0]
+    return int(stem[11:]) if len(stem) > 11 and stem[11:].isdigit() else 0
+
+
+def _as_day(value) -> Optional[date]:
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+
+class PartitionedLog:
+    """
+    按 分区键/日期 分文件的 CSV 记录：<root>/<键>/<YYYY-MM-DD>-<序号>.csv，键通常为教室。
+
+    每个键常驻一个打开的文件，写入开销与历史长短无关；跨天、超过 max_bytes 或
+    打开超过 max_age 秒时轮转到新文件。轮转出的文件由后台线程用 gzip/lzma 压缩。
+    按时间范围读取时只根据文件名挑选相关分区，不打开其他文件。
+    fieldnames 为 None 时只能读取，不能写入。
+    """
+
+    def __init__(self, root, fieldnames, max_bytes=8 * 1024 * 1024, max_age=None, compression="gzip"):
+        if compression is not None and compression not in COMPRESSORS:
+            raise ValueError(f"不支持的压缩方式：{compression}")
+        self.root = root
+        self.fieldnames = list(fieldnames) if fieldnames is not None else None
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compression = compression
+        self._lock = threading.Lock()
+        # 键 -> [文件对象, csv.writer, 日期, 序号, 打开时刻]
+        self._active = {}
+        self._pending: queue.Queue = queue.Queue()
+        self._compressor = None
+        os.makedirs(root, exist_ok=True)
+        if compression is not None:
+            self._compressor = threading.Thread(target=self._compress_loop, name="partition-compressor", daemon=True)
+            self._compressor.start()
+            # 上次运行留下的、早于今天的未压缩分区
+            today = date.today()
+            for path in self.partitions():
+                name = os.path.basename(path)
+                if name.endswith(".csv") and _partition_day(name) is not None and _partition_day(name) < today:
+                    self._pending.put(path)
+
+    def _key_dir(self, key) -> str:
+        return os.path.join(self.root, str(key))
+
+    def _open(self, key, day: date, min_seq: int = 0):
+        folder = self._key_dir(key)
+        os.makedirs(folder, exist_ok=True)
+        # 同一天接着序号最大且未压缩的分区继续写，否则开新序号；轮转时序号至少为 min_seq
+        last_seq, last_compressed = -1, False
+        for name in os.listdir(folder):
+            if _partition_day(name) == day and not name.endswith(".tmp"):
+                seq = _partition_seq(name)
+                if seq > last_seq or (seq == last_seq and not name.endswith(".csv")):
+                    last_seq, last_compressed = seq, not name.endswith(".csv")
+        seq = last_seq + 1 if last_compressed else max(last_seq, 0)
+        seq = max(seq, min_seq)
+        path = os.path.join(folder, f"{day:%Y-%m-%d}-{seq:03d}.csv")
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        f = open(path, "a", newline="", encoding="utf-8-sig")
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(self.fieldnames)
+        self._active[key] = [f, writer, day, seq, time.monotonic()]
+
+    def _rotate(self, key) -> int:
+        f, _, _, seq, _ = self._active.pop(key)
+        f.close()
+        if self.compression is not None:
+            self._pending.put(f.name)
+        return seq + 1
+
+    def append(self, key, row, moment: Optional[datetime] = None):
+        self.append_many(key, [row], moment)
+
+    def append_many(self, key, rows, moment: Optional[datetime] = None, sync=False):
+        """把若干行写入 key 在 moment 所在日期的分区；sync=True 时写完 fsync。"""
+        if self.fieldnames is None:
+            raise ValueError("分区目录以只读方式打开（未指定 fieldnames），不能写入")
+        day = (moment or datetime.now()).date()
+        with self._lock:
+            active = self._active.get(key)
+            min_seq = 0
+            if active is not None and active[2] != day:
+                self._rotate(key)
+                active = None
+            elif active is not None and (
+                active[0].tell() >= self.max_bytes
+                or (self.max_age is not None and time.monotonic() - active[4] >= self.max_age)
+            ):
+                # 同一天内轮转：旧分区可能尚未压缩完，新分区必须用更大的序号
+                min_seq = self._rotate(key)
+                active = None
+            if active is None:
+                self._open(key, day, min_seq)
+                active = self._active[key]
+            active[1].writerows(rows)
+            active[0].flush()
+            if sync:
+                os.fsync(active[0].fileno())
+
+    def _compress_loop(self):
+        suffix, opener = COMPRESSORS[self.compression]
+        while True:
+            path = self._pending.get()
+            if path is None:
+                return
+            tmp_path = path + suffix + ".tmp"
+            try:
+                with open(path, "rb") as src, opener(tmp_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(tmp_path, path + suffix)
+                os.remove(path)
+            except OSError:
+                # 分区已被清除，或（Windows 下）正被读取，留到下次启动再压缩
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def partitions(self, start=None, end=None, key=None) -> List[str]:
+        """[start, end] 日期范围内的分区文件（按日期、序号排序），只看文件名。"""
+        start_day, end_day = _as_day(start), _as_day(end)
+        keys = [str(key)] if key is not None else sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []
+        found = []
+        for k in keys:
+            folder = self._key_dir(k)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                day = _partition_day(name)
+                if day is None or name.endswith(".tmp"):
+                    continue
+                if (start_day is not None and day < start_day) or (end_day is not None and day > end_day):
+                    continue
+                found.append((day, _partition_seq(name), k, os.path.join(folder, name)))
+        return [path for *_, path in sorted(found)]
+
+    @staticmethod
+    def open_text(path):
+        """以文本方式打开分区；列出后刚被压缩的 .csv 分区改读压缩后的文件。"""
+        for suffix, opener in COMPRESSORS.values():
+            if path.endswith(suffix):
+                return io.TextIOWrapper(opener(path, "rb"), encoding="utf-8-sig", newline="")
+        try:
+            return open(path, "r", encoding="utf-8-sig", newline="")
+        except FileNotFoundError:
+            for suffix, opener in COMPRESSORS.values():
+                if os.path.exists(path + suffix):
+                    return io.TextIOWrapper(opener(path + suffix, "rb"), encoding="utf-8-sig", newline="")
+            raise
+
+    def read(self, start=None, end=None, key=None) -> Iterator[List[str]]:
+        """依次产出范围内各分区的数据行（不含表头），压缩与未压缩的分区都可读取。"""
+        self.flush()
+        for path in self.partitions(start, end, key):
+            try:
+                f = self.open_text(path)
+            except FileNotFoundError:
+                # 读取期间被清除
+                continue
+            with f:
+                reader = csv.reader(f)
+                next(reader, None)
+                yield from reader
+
+    def flush(self):
+        with self._lock:
+            for active in self._active.values():
+                active[0].flush()
+
+    def clear(self, before=None, key=None) -> int:
+        """删除 before 日期之前（不含）的分区，before 为 None 时全部删除，返回删除的文件数。"""
+        before_day = _as_day(before)
+        removed = 0
+        with self._lock:
+            for k in list(self._active):
+                if key is None or str(k) == str(key):
+                    if before_day is None or self._active[k][2] < before_day:
+                        self._active.pop(k)[0].close()
+            for path in self.partitions(key=key):
+                if before_day is None or _partition_day(os.path.basename(path)) < before_day:
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+    def close(self, wait=True):
+        """关闭所有分区文件；wait=True 时等待后台压缩完成。"""
+        with self._lock:
+            for active in self._active.values():
+                active[0].close()
+            self._active.clear()
+        if self._compressor is not None:
+            self._pending.put(None)
+            if wait:
+                self._compressor.join()
+            self._compressor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_partitioned_log(root, fieldnames) -> PartitionedLog:
+    """同一分区目录在进程内共用一个写入对象；表头与已有对象不一致时报错，而不是沿用先来者的表头。"""
+    key = os.path.abspath(root)
+    with _logs_lock:
+        log = _logs.get(key)
+        if log is None:
+            log = _logs[key] = PartitionedLog(root, fieldnames)
+        elif log.fieldnames != list(fieldnames):
+            raise ValueError(f"分区目录 {root} 已以表头 {log.fieldnames} 打开，不能再以 {list(fieldnames)} 写入")
+        return log
+
+
+def close_partitioned_logs():
+    """关闭进程内所有分区写入对象（程序退出时调用）。"""
+    with _logs_lock:
+        logs = list(_logs.values())
+        _logs.clear()
+    for log in logs:
+        log.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="分区数据目录：列出分区或按日期范围导出记录")
+    parser.add_argument("root")
+    parser.add_argument("--start", default=None, help="YYYY-MM-DD")
+    parser.add_argument("--end", default=None, help="YYYY-MM-DD")
+    parser.add_argument("--key", default=None, help="分区键（教室）")
+    parser.add_argument("--rows", action="store_true", help="输出记录而不是分区文件")
+    args = parser.parse_args()
+
+    log = PartitionedLog(args.root, None, compression=None)
+    if args.rows:
+        for item in log.read(args.start, args.end, args.key):
+            print(",".join(item))
+    else:
+        for item in log.partitions(args.start, args.end, args.key):
+            print(item, os.path.getsize(item))
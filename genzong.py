@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+Box = Tuple[int, int, int, int]
+
+
+@dataclass
+class Track:
+    """一条人脸轨迹：框位置与缓存的识别结果。"""
+
+    track_id: int
+    box: Box
+    identity: Optional[str] = None
+    label: Optional[int] = None
+    confidence: float = float("inf")
+    last_predict_frame: int = -1
+    hits: int = 0
+    missed: int = 0
+
+
+def box_iou(a: Box, b: Box) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _centroid_distance(a: Box, b: Box) -> float:
+    acx, acy = a[0] + a[2] / 2, a[1] + a[3] / 2
+    bcx, bcy = b[0] + b[2] / 2, b[1] + b[3] / 2
+    return ((acx - bcx) ** 2 + (acy - bcy) ** 2) ** 0.5
+
+
+class FaceTracker:
+    """
+    基于 IoU（匹配不上时退回中心点距离）的轻量人脸跟踪器。
+
+    每个检测框关联到一条持久轨迹并缓存身份与置信度，只有新轨迹、
+    置信度较差（距离 >= good_confidence）或距上次识别超过 repredict_interval 帧的轨迹才需要再次 predict。
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.3,
+        max_missed: int = 10,
+        repredict_interval: int = 30,
+        good_confidence: float = 70.0,
+    ):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.repredict_interval = repredict_interval
+        self.good_confidence = good_confidence
+        self.tracks: List[Track] = []
+        self.frame_index = 0
+        self._next_id = 1
+        self.predict_calls = 0
+        self.cached_hits = 0
+        self._model = None
+
+    def update(self, boxes: Sequence[Sequence[int]]) -> List[Track]:
+        """用当前帧的检测框更新轨迹，返回与 boxes 一一对应的轨迹。"""
+        self.frame_index += 1
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        candidates = []
+        for bi, box in enumerate(boxes):
+            for ti, track in enumerate(self.tracks):
+                iou = box_iou(box, track.box)
+                if iou >= self.iou_threshold:
+                    candidates.append((iou, bi, ti))
+                else:
+                    dist = _centroid_distance(box, track.box)
+                    limit = 0.5 * max(box[2], box[3], track.box[2], track.box[3])
+                    if dist < limit:
+                        # 中心点匹配的优先级低于任何 IoU 匹配
+                        candidates.append((-dist / limit, bi, ti))
+        candidates.sort(reverse=True)
+
+        matched: List[Optional[Track]] = [None] * len(boxes)
+        used_tracks = set()
+        for _, bi, ti in candidates:
+            if matched[bi] is not None or ti in used_tracks:
+                continue
+            track = self.tracks[ti]
+            track.box = boxes[bi]
+            track.hits += 1
+            track.missed = 0
+            matched[bi] = track
+            used_tracks.add(ti)
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in used_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    continue
+            survivors.append(track)
+        self.tracks = survivors
+
+        for bi, box in enumerate(boxes):
+            if matched[bi] is None:
+                track = Track(self._next_id, box, hits=1)
+                self._next_id += 1
+                self.tracks.append(track)
+                matched[bi] = track
+        return matched  # type: ignore[return-value]
+
+    def needs_predict(self, track: Track) -> bool:
+        if track.label is None or track.confidence >= self.good_confidence:
+            return True
+        if self.frame_index - track.last_predict_frame >= self.repredict_interval:
+            return True
+        self.cached_hits += 1
+        return False
+
+    def set_prediction(self, track: Track, label: int, confidence: float, identity: str):
+        track.label = label
+        track.confidence = confidence
+        track.identity = identity
+        track.last_predict_frame = self.frame_index
+        self.predict_calls += 1
+
+    def active_identities(self):
+        """当前帧可见轨迹中已识别的身份集合。"""
+        return {t.identity for t in self.tracks if t.missed == 0 and t.identity not in (None, "unknown")}
+
+    def bind_model(self, model):
+        """模型热加载后缓存的身份不再可信，换模型时清空轨迹。"""
+        if self._model is not model:
+            self.reset()
+            self._model = model
+
+    def reset(self):
+        self.tracks.clear()
+        self.frame_index = 0
+
+
+if __name__ == "__main__":
+    tracker = FaceTracker()
+    for step in range(5):
+        current = tracker.update([(100 + step, 100, 80, 80), (300, 120 + step, 90, 90)])
+        for t in current:
+            if tracker.needs_predict(t):
+                tracker.set_prediction(t, t.track_id, 40.0, f"p{t.track_id}")
+    print(f"predict 调用 {tracker.predict_calls} 次，缓存命中 {tracker.cached_hits} 次")
@@ -0,0 +1,331 @@
+import bisect
+import csv
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+# 各粒度的时段键格式，字符串顺序即时间顺序
+RESOLUTIONS = {
+    "minute": "%Y-%m-%d %H:%M",
+    "hour": "%Y-%m-%d %H",
+    "day": "%Y-%m-%d",
+}
+METRICS = ("temperature", "light", "people")
+ROLLUP_FIELDS = ["时段", "教室", "条数"] + [f"{m}_{k}" for m in METRICS for k in ("min", "max", "mean")]
+STATE_FILE = "open_buckets.json"
+
+
+def _new_bucket():
+    return {"count": 0, **{m: [float("inf"), float("-inf"), 0.0] for m in METRICS}}
+
+
+def _bucket_row(key, room, bucket):
+    row = [key, room, bucket["count"]]
+    for m in METRICS:
+        low, high, total = bucket[m]
+        row += [round(low, 2), round(high, 2), round(total / bucket["count"], 2)]
+    return row
+
+
+def _as_datetime(value) -> datetime:
+    # 与 shixu.to_epoch_ms 相对：接受 datetime 或毫秒时间戳
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromtimestamp(int(value) / 1000)
+
+
+def _accumulate(buckets, room, moment: datetime, data, closed):
+    """把一条样本计入 buckets；结束的时段以 (粒度, 时段键, 教室, 累计值) 追加到 closed。"""
+    for resolution, fmt in RESOLUTIONS.items():
+        key = moment.strftime(fmt)
+        current = buckets.get((resolution, room))
+        if current is None or current[0] != key:
+            if current is not None and current[1]["count"]:
+                closed.append((resolution, current[0], room, current[1]))
+            current = (key, _new_bucket())
+            buckets[(resolution, room)] = current
+        bucket = current[1]
+        bucket["count"] += 1
+        for m in METRICS:
+            value = float(data[m])
+            stats = bucket[m]
+            if value < stats[0]:
+                stats[0] = value
+            if value > stats[1]:
+                stats[1] = value
+            stats[2] += value
+
+
+def _encode_row(row) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue().encode("utf-8")
+
+
+class RollupEngine:
+    """
+    环境数据的多粒度汇总：每个教室在分钟/小时/天三个粒度上维护当前时段的
+    最小/最大/平均/条数，每条样本只做常数次字典更新。
+
+    时段结束（同一教室出现下一时段的样本）时把该行追加到 rollup_<粒度>.csv，
+    并立即把未结束的时段保存到 open_buckets.json；没有时段结束时每 checkpoint_seconds 秒保存一次。
+    已写出的 (时段, 教室) 记在内存索引中，崩溃后从旧状态恢复也不会写出重复行。
+
+    索引按时段键排序、记录每行的字节偏移，query() 二分定位后只读取命中的行；
+    文件被其他进程追加时只从上次索引的位置往后读。
+    """
+
+    def __init__(self, directory, checkpoint_seconds: float = 60.0):
+        self.directory = directory
+        self.checkpoint_seconds = checkpoint_seconds
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # (粒度, 教室) -> (时段键, 累计值)
+        self._open = {}
+        # 粒度 -> 按 (时段键, 教室, 偏移) 排序的列表 / 已写出的 (时段键, 教室) / 已索引到的文件大小
+        self._index = {}
+        self._written = {}
+        self._indexed_size = {}
+        state_path = os.path.join(directory, STATE_FILE)
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                for item in json.load(f):
+                    self._open[(item["resolution"], item["room"])] = (item["key"], item["bucket"])
+        self._last_checkpoint = time.monotonic()
+
+    def _path(self, resolution):
+        return os.path.join(self.directory, f"rollup_{resolution}.csv")
+
+    def _refresh_index(self, resolution):
+        """把文件中尚未索引的行（首次为全部，之后只有新追加的）加入索引。"""
+        path = self._path(resolution)
+        index = self._index.setdefault(resolution, [])
+        written = self._written.setdefault(resolution, set())
+        position = self._indexed_size.get(resolution, 0)
+        if not os.path.exists(path) or os.path.getsize(path) <= position:
+            return
+        with open(path, "rb") as f:
+            f.seek(position)
+            if position == 0:
+                f.readline()
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    # 末尾不完整的行等写完后再索引
+                    break
+                row = next(csv.reader([line.decode("utf-8")]), None)
+                if row and len(row) >= 2:
+                    bisect.insort(index, (row[0], row[1], offset))
+                    written.add((row[0], row[1]))
+                position = f.tell()
+        self._indexed_size[resolution] = position
+
+    def _write_rows(self, resolution, rows):
+        """追加行并更新索引；已写出的 (时段, 教室) 跳过。"""
+        self._refresh_index(resolution)
+        index = self._index[resolution]
+        written = self._written[resolution]
+        rows = [row for row in rows if (row[0], row[1]) not in written]
+        if not rows:
+            return
+        path = self._path(resolution)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        with open(path, "ab") as f:
+            if new_file:
+                f.write(b"\xef\xbb\xbf" + _encode_row(ROLLUP_FIELDS))
+            for row in rows:
+                offset = f.tell()
+                f.write(_encode_row(row))
+                bisect.insort(index, (row[0], row[1], offset))
+                written.add((row[0], row[1]))
+            self._indexed_size[resolution] = f.tell()
+
+    def _write_closed(self, closed):
+        by_resolution = {}
+        for resolution, key, room, bucket in closed:
+            by_resolution.setdefault(resolution, []).append(_bucket_row(key, room, bucket))
+        for resolution, rows in by_resolution.items():
+            self._write_rows(resolution, rows)
+
+    def _save_state(self):
+        state = [
+            {"resolution": res, "room": room, "key": key, "bucket": bucket}
+            for (res, room), (key, bucket) in self._open.items()
+        ]
+        tmp_path = os.path.join(self.directory, STATE_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.directory, STATE_FILE))
+        self._last_checkpoint = time.monotonic()
+
+    def add(self, room, moment: datetime, data):
+        """加入一条样本；data 含 temperature / light / people。"""
+        with self._lock:
+            closed = []
+            _accumulate(self._open, room, moment, data, closed)
+            if closed:
+                self._write_closed(closed)
+            if closed or time.monotonic() - self._last_checkpoint >= self.checkpoint_seconds:
+                self._save_state()
+
+    def _read_rows(self, resolution, room, start, end):
+        self._refresh_index(resolution)
+        index = self._index[resolution]
+        lo = 0 if start is None else bisect.bisect_left(index, (start,))
+        hi = len(index) if end is None else bisect.bisect_left(index, (end,))
+        offsets = sorted(offset for _, bucket_room, offset in index[lo:hi] if room is None or bucket_room == room)
+        rows = []
+        if not offsets:
+            return rows
+        with open(self._path(resolution), "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                row = next(csv.reader([f.readline().decode("utf-8")]))
+                rows.append(dict(zip(ROLLUP_FIELDS, row)))
+        return rows
+
+    def query(self, resolution, room=None, start=None, end=None):
+        """
+        返回 [start, end) 时段内的汇总行（字典），含尚未结束的当前时段。
+        start/end 为与该粒度格式相同的时段键字符串，如 "2025-11-27 10"。
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"不支持的汇总粒度：{resolution}")
+        with self._lock:
+            result = self._read_rows(resolution, room, start, end)
+            for (res, bucket_room), (key, bucket) in self._open.items():
+                if res != resolution or not bucket["count"]:
+                    continue
+                if room is not None and bucket_room != room:
+                    continue
+                if (start is not None and key < start) or (end is not None and key >= end):
+                    continue
+                result.append(dict(zip(ROLLUP_FIELDS, map(str, _bucket_row(key, bucket_room, bucket)))))
+        result.sort(key=lambda row: (row["时段"], row["教室"]))
+        return result
+
+    def _discard_range(self, resolution, start_key, end_key):
+        """从汇总文件中删除 [start_key, end_key) 内的行（写临时文件后替换），并重建索引。"""
+        path = self._path(resolution)
+        self._index.pop(resolution, None)
+        self._written.pop(resolution, None)
+        self._indexed_size.pop(resolution, None)
+        if not os.path.exists(path):
+            return
+        tmp_path = path + ".tmp"
+        with open(path, "r", encoding="utf-8-sig", newline="") as src, open(
+            tmp_path, "w", encoding="utf-8-sig", newline=""
+        ) as dst:
+            reader = csv.reader(src)
+            writer = csv.writer(dst)
+            writer.writerow(next(reader, ROLLUP_FIELDS))
+            for row in reader:
+                if not row:
+                    continue
+                if (start_key is None or row[0] >= start_key) and (end_key is None or row[0] < end_key):
+                    continue
+                writer.writerow(row)
+        os.replace(tmp_path, path)
+
+    def rebuild(self, samples, start=None, end=None) -> int:
+        """
+        用 samples（(教室, 时刻, data) 的可迭代对象，按时间顺序）重算 [start, end) 内的汇总，返回样本数。
+
+        范围按天对齐，范围内原有的行与未结束时段先被丢弃，因此重复回填同一范围结果不变。
+        end 为 None 时最后的时段仍未结束，接着作为当前时段继续累加。
+        """
+        with self._lock:
+            for resolution, fmt in RESOLUTIONS.items():
+                start_key = None if start is None else start.strftime(fmt)
+                end_key = None if end is None else end.strftime(fmt)
+                self._discard_range(resolution, start_key, end_key)
+                for (res, room), (key, _) in list(self._open.items()):
+                    if res == resolution and (start_key is None or key >= start_key) and (
+                        end_key is None or key < end_key
+                    ):
+                        del self._open[(res, room)]
+            buckets = {}
+            closed = []
+            total = 0
+            for room, moment, data in samples:
+                _accumulate(buckets, room, moment, data, closed)
+                total += 1
+                if len(closed) >= 1000:
+                    self._write_closed(closed)
+                    closed = []
+            for (resolution, room), (key, bucket) in buckets.items():
+                if end is not None:
+                    # end 已对齐到天，剩下的时段都已完整
+                    if bucket["count"]:
+                        closed.append((resolution, key, room, bucket))
+                else:
+                    previous = self._open.get((resolution, room))
+                    if previous is not None and previous[1]["count"]:
+                        # 范围之前留下的当前时段已被回填的样本结束
+                        closed.append((resolution, previous[0], room, previous[1]))
+                    self._open[(resolution, room)] = (key, bucket)
+            self._write_closed(closed)
+            self._save_state()
+            return total
+
+    def close(self):
+        """保存未结束的时段。"""
+        with self._lock:
+            self._save_state()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def rebuild_from_log(ts_log, engine: RollupEngine, start=None, end=None) -> int:
+    """
+    由二进制时序日志（见 shixu.py）重算汇总，返回处理的样本数。
+    start/end 为 datetime 或毫秒时间戳，向外对齐到整天；同一范围可重复回填，不会产生重复行。
+    """
+    if start is not None:
+        start = datetime.combine(_as_datetime(start).date(), datetime.min.time())
+    if end is not None:
+        end = _as_datetime(end)
+        if end.time() != datetime.min.time():
+            end = datetime.combine(end.date() + timedelta(days=1), datetime.min.time())
+
+    def samples():
+        for records in ts_log.iter_range(start, end):
+            for record in records:
+                data = {"temperature": record["temperature"], "light": record["light"], "people": record["people"]}
+                yield ts_log.rooms[int(record["room"])], datetime.fromtimestamp(int(record["ts"]) / 1000), data
+
+    return engine.rebuild(samples(), start, end)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="环境数据汇总查询")
+    parser.add_argument("directory", help="汇总目录")
+    parser.add_argument("--resolution", choices=list(RESOLUTIONS), default="hour")
+    parser.add_argument("--room", default=None)
+    parser.add_argument("--start", default=None)
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--rebuild", metavar="LOG", default=None, help="先由二进制时序日志目录重算汇总")
+    parser.add_argument("--rebuild-start", default=None, help="重算的起始日期 YYYY-MM-DD，缺省为日志开头")
+    parser.add_argument("--rebuild-end", default=None, help="重算的结束日期 YYYY-MM-DD（不含），缺省为日志末尾")
+    args = parser.parse_args()
+
+    with RollupEngine(args.directory) as rollups:
+        if args.rebuild:
+            from shixu import TimeSeriesLog
+
+            with TimeSeriesLog(args.rebuild) as source_log:
+                start = datetime.strptime(args.rebuild_start, "%Y-%m-%d") if args.rebuild_start else None
+                end = datetime.strptime(args.rebuild_end, "%Y-%m-%d") if args.rebuild_end else None
+                print(f"回填 {rebuild_from_log(source_log, rollups, start, end)} 条样本")
+        for item in rollups.query(args.resolution, args.room, args.start, args.end):
+            print(item)
@@ -1,28 +1,49 @@
 
 import os
+import queue
 from collections import deque
 from datetime import datetime
 import tkinter as tk
 from tkinter import messagebox, ttk
 
+import cv2
 import matplotlib
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 
-from erweima import decode_qr_from_camera
+from erweima import QRSignInSession
+from fenqu import close_partitioned_logs
 from huanjingjiance import SensorSimulator
+from huizong import RollupEngine
 from kongzhiluoji import DEFAULT_ROOM, evaluate_controls, get_room_profile
-from renlian_shibie import recognize_from_camera
+from renlian_moxing import FACE_LIST_PATH
+from renlian_shibie import RecognitionWorker, recognize_from_camera
+from shexiangtou import release_all_cameras
+from shixu import TimeSeriesLog
 from shujucunchu import (
-    append_environment_record,
-    append_sign_record,
+    SIGN_DUPLICATE,
+    SIGN_OK,
+    EnvironmentRecordWriter,
+    SignInStore,
+    SignHistoryReader,
     clear_sign_records,
-    load_sign_names,
 )
 
 matplotlib.rcParams["font.sans-serif"] = ["SimHei"]
 matplotlib.rcParams["axes.unicode_minus"] = False
 
+# 人员检测节奏（秒）与界面轮询结果队列的间隔（毫秒）相互独立
+CAMERA_RECOGNITION_INTERVAL = 2.0
+CAMERA_RECOGNITION_WINDOW = 1.0
+CAMERA_POLL_MS = 100
+# 连续签到时同一二维码的去重时间（秒）
+SIGN_REPEAT_WINDOW = 10.0
+# 签到历史每页条数：打开对话框只读最新一页，滚动到顶部再读更早的
+SIGN_PAGE_SIZE = 50
+# 数据存储方式："csv" 为两个 CSV 文件；"sqlite" 时环境与签到数据都写入 classroom.db（见 shujuku.py）；
+# "partitioned" 时写入 data/environment 与 data/sign 下按教室/日期轮转、压缩的分区文件（见 fenqu.py）
+STORAGE_BACKEND = "csv"
+
 
 class SmartClassroomApp:
 
@@ -39,14 +60,38 @@ class SmartClassroomApp:
         base_dir = os.path.dirname(__file__)
         self.csv_path = os.path.join(base_dir, "classroom_data.csv")
         self.sign_csv_path = os.path.join(base_dir, "sign_records.csv")
+        if STORAGE_BACKEND == "sqlite":
+            self.csv_path = self.sign_csv_path = os.path.join(base_dir, "classroom.db")
+        elif STORAGE_BACKEND == "partitioned":
+            self.csv_path = os.path.join(base_dir, "data", "environment")
+            self.sign_csv_path = os.path.join(base_dir, "data", "sign")
+        # 环境数据由后台线程批量写盘，关闭窗口时 close() 写出剩余记录
+        self.env_writer = EnvironmentRecordWriter(self.csv_path, backend=STORAGE_BACKEND)
+        # 同时写入带完整时间戳的二进制时序日志，便于跨天按时间范围读取（见 shixu.py）
+        self.ts_log = TimeSeriesLog(os.path.join(base_dir, "env_log"))
+        # 分钟/小时/天汇总随每条样本增量更新，长时段统计不再扫描原始数据（见 huizong.py）
+        self.rollups = RollupEngine(os.path.join(base_dir, "rollups"))
         self.known_people = []
         self.camera_monitoring = False
         self.camera_job = None
+        self.camera_results: queue.Queue = queue.Queue()
+        self.camera_worker: RecognitionWorker | None = None
+        # 最近一次识别的投票汇总：{姓名: {"votes", "mean_confidence", "std_confidence"}}
+        self.last_votes: dict = {}
         self.people_count = 0
-        # 签到历史（格式：'时间  姓名'）
-        self.sign_history: list[str] = load_sign_names(self.sign_csv_path)
+        # 签到历史（格式：'时间  姓名'）在打开签到对话框时从文件末尾分页读取
+        self.sign_history: SignHistoryReader | None = None
         self.sign_dialog: tk.Toplevel | None = None
         self.sign_listbox: tk.Listbox | None = None
+        self.sign_results: queue.Queue = queue.Queue()
+        self.sign_session: QRSignInSession | None = None
+        # 本场签到的名册与已签到索引，首次开始签到时创建
+        self.sign_store: SignInStore | None = None
+        self.sign_job = None
+        self.sign_status_var = tk.StringVar(value="未开始签到")
+        # 签到预览画在 Tk 标签上，扫描线程不打开 OpenCV 窗口；保留 PhotoImage 引用以免被回收
+        self.sign_preview_label: ttk.Label | None = None
+        self.sign_preview_image: tk.PhotoImage | None = None
 
         self._build_ui()
         self._init_chart()
@@ -124,12 +169,14 @@ class SmartClassroomApp:
         if self.monitor_job is not None:
             self.master.after_cancel(self.monitor_job)
             self.monitor_job = None
+        self.env_writer.flush()
         self._log("监测已暂停。")
 
     def _schedule_next(self):
         data = self.simulator.generate()
         data["people"] = self.people_count
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        now = datetime.now()
+        timestamp = now.strftime("%H:%M:%S")
         self.history.append({"time": timestamp, **data})
         for key in ("temperature", "light"):
             self.labels[key].set(f"{data[key]}")
@@ -140,7 +187,9 @@ class SmartClassroomApp:
 
         record = dict(data)
         record["people"] = self.people_count
-        append_environment_record(self.csv_path, self.current_room, timestamp, record, controls)
+        self.env_writer.append(self.current_room, timestamp, record, controls, now)
+        self.ts_log.append(self.current_room, now, record, controls)
+        self.rollups.add(self.current_room, now, record)
         self._log(f"[{timestamp}] 数据：{data} 控制：{controls}")
         self.update_chart()
 
@@ -172,7 +221,7 @@ class SmartClassroomApp:
     def recognize_camera(self):
         self._log("启动摄像头人脸识别（按 q 关闭）...")
         try:
-            identity, people_set = recognize_from_camera(duration_seconds=None, silent=False)
+            identity, people_set, votes = recognize_from_camera(duration_seconds=None, silent=False)
         except FileNotFoundError as err:
             messagebox.showerror("资源缺失", str(err))
             return
@@ -180,43 +229,70 @@ class SmartClassroomApp:
             messagebox.showerror("摄像头错误", str(err))
             return
 
-        self._process_camera_result(identity, people_set, source="手动识别", notify=False)
+        self._process_camera_result(identity, people_set, source="手动识别", notify=False, votes=votes)
 
     def start_camera_monitor(self):
         if self.camera_monitoring:
             return
         self.camera_monitoring = True
-        self._log("人员检测已开启（每2秒静默识别）")
+        # 每次开启都换一个新队列：已停止的旧线程可能还在完成最后一轮识别，
+        # 它之后放入的结果或异常留在旧队列里，不会被当成本次检测的结果
+        self.camera_results = queue.Queue()
+        self.camera_worker = RecognitionWorker(
+            self.camera_results,
+            interval_seconds=CAMERA_RECOGNITION_INTERVAL,
+            duration_seconds=CAMERA_RECOGNITION_WINDOW,
+        )
+        self.camera_worker.start()
+        self._log(f"人员检测已开启（每{CAMERA_RECOGNITION_INTERVAL:g}秒后台静默识别）")
         self._camera_monitor_tick()
 
     def stop_camera_monitor(self):
         if not self.camera_monitoring:
             return
         self.camera_monitoring = False
+        if self.camera_worker is not None:
+            self.camera_worker.stop()
+            self.camera_worker = None
         if self.camera_job is not None:
             self.master.after_cancel(self.camera_job)
             self.camera_job = None
         self._log("人员检测已停止")
 
     def _camera_monitor_tick(self):
-        try:
-            identity, people_set = recognize_from_camera(duration_seconds=1, silent=True)
-        except Exception as err:  # pylint: disable=broad-exception-caught
-            self._log(f"人员检测异常：{err}")
-            self.stop_camera_monitor()
-            return
-
-        self._process_camera_result(identity, people_set, source="人员检测", notify=False)
+        """只在界面线程中取出后台识别结果，不做任何阻塞操作。"""
+        self.camera_job = None
+        while True:
+            try:
+                result = self.camera_results.get_nowait()
+            except queue.Empty:
+                break
+            if not self.camera_monitoring:
+                continue
+            if isinstance(result, Exception):
+                self._log(f"人员检测异常：{result}")
+                self.stop_camera_monitor()
+                return
+            identity, people_set, votes = result
+            self._process_camera_result(identity, people_set, source="人员检测", notify=False, votes=votes)
 
         if self.camera_monitoring:
-            self.camera_job = self.master.after(2000, self._camera_monitor_tick)
+            self.camera_job = self.master.after(CAMERA_POLL_MS, self._camera_monitor_tick)
 
-    def _process_camera_result(self, identity, people_set, source: str, notify: bool = False):
+    def _process_camera_result(self, identity, people_set, source: str, notify: bool = False, votes=None):
+        """votes 为识别时的投票汇总，有则在结果中附上每人的票数与平均置信度。"""
+        self.last_votes = votes or {}
         if people_set:
             self.known_people = sorted(list(people_set))
             self.people_count = len(people_set)
             self.labels["people"].set(str(self.people_count))
-            summary = f"{source}：识别到 {self.people_count} 人（{', '.join(self.known_people)}）"
+            people_text = ", ".join(
+                f"{name}（{self.last_votes[name]['votes']}票，{self.last_votes[name]['mean_confidence']:.1f}）"
+                if name in self.last_votes
+                else name
+                for name in self.known_people
+            )
+            summary = f"{source}：识别到 {self.people_count} 人（{people_text}）"
             self.people_list_var.set(summary)
             self._log(summary)
             if notify:
@@ -251,59 +327,168 @@ class SmartClassroomApp:
 
         dialog = tk.Toplevel(self.master)
         dialog.title("二维码签到")
-        dialog.geometry("360x320")
-        ttk.Label(dialog, text="请使用摄像头对准签到二维码，按 q 结束", font=("SimHei", 11)).pack(pady=5)
+        dialog.geometry("460x620")
+        ttk.Label(dialog, text="请依次将签到二维码对准摄像头", font=("SimHei", 11)).pack(pady=5)
         btn_frame = ttk.Frame(dialog)
         btn_frame.pack(pady=5)
-        ttk.Button(btn_frame, text="启动摄像头扫描", command=self.scan_qr_sign).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="开始连续签到", command=self.start_sign_session).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="停止签到", command=self.stop_sign_session).pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="未签到名单", command=self.show_missing_sign).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="清空签到记录", command=self.clear_sign_gui).pack(side="left", padx=5)
-
-        self.sign_listbox = tk.Listbox(dialog, height=10)
-        self.sign_listbox.pack(fill="both", expand=True, padx=10, pady=10)
-        for item in self.sign_history:
+        ttk.Label(dialog, textvariable=self.sign_status_var, font=("SimHei", 10)).pack()
+        self.sign_preview_label = ttk.Label(dialog)
+        self.sign_preview_label.pack()
+
+        ttk.Button(dialog, text="加载更早记录", command=self.load_older_signs).pack()
+        list_frame = ttk.Frame(dialog)
+        list_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical")
+        self.sign_listbox = tk.Listbox(
+            list_frame,
+            height=10,
+            yscrollcommand=lambda first, last: self._on_sign_scroll(scrollbar, first, last),
+        )
+        scrollbar.configure(command=self.sign_listbox.yview)
+        scrollbar.pack(side="right", fill="y")
+        self.sign_listbox.pack(side="left", fill="both", expand=True)
+        self.sign_history = SignHistoryReader(self.sign_csv_path, SIGN_PAGE_SIZE, STORAGE_BACKEND)
+        for item in self.sign_history.newest():
             self.sign_listbox.insert("end", item)
+        self.sign_listbox.see("end")
 
         dialog.protocol("WM_DELETE_WINDOW", lambda: self._close_sign_dialog(dialog))
         self.sign_dialog = dialog
 
+    def load_older_signs(self):
+        """在列表顶部插入更早的一页记录，保持当前可见位置不跳动。"""
+        if self.sign_history is None or not self.sign_listbox or not self.sign_listbox.winfo_exists():
+            return
+        page = self.sign_history.older()
+        for item in reversed(page):
+            self.sign_listbox.insert(0, item)
+        if page:
+            self.sign_listbox.yview(len(page))
+
+    def _on_sign_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        # 滚动到顶部时自动加载上一页；内容不满一屏时由“加载更早记录”按钮加载
+        if float(first) == 0.0 and float(last) < 1.0 and self.sign_history is not None and self.sign_history.has_more:
+            self.master.after_idle(self.load_older_signs)
+
     def _close_sign_dialog(self, dialog: tk.Toplevel):
+        self.stop_sign_session()
         if dialog and dialog.winfo_exists():
             dialog.destroy()
         self.sign_dialog = None
         self.sign_listbox = None
+        self.sign_history = None
+        self.sign_preview_label = None
+        self.sign_preview_image = None
 
     def clear_sign_gui(self):
         if messagebox.askyesno("确认清空", "确定要清空所有签到记录吗？此操作不可恢复。"):
-            clear_sign_records(self.sign_csv_path)
-            self.sign_history.clear()
+            clear_sign_records(self.sign_csv_path, backend=STORAGE_BACKEND)
+            self.sign_history = SignHistoryReader(self.sign_csv_path, SIGN_PAGE_SIZE, STORAGE_BACKEND)
+            # 签到可能仍在进行，直接换成空的索引，而不是置为 None
+            if self.sign_store is not None:
+                self.sign_store = self._new_sign_store()
             if self.sign_listbox and self.sign_listbox.winfo_exists():
                 self.sign_listbox.delete(0, "end")
 
-    def scan_qr_sign(self):
-        try:
-            content = decode_qr_from_camera()
-        except Exception as err:  # pylint: disable=broad-exception-caught
-            messagebox.showerror("识别异常", f"二维码识别失败：{err}")
+    def start_sign_session(self):
+        """摄像头保持打开，连续识别多名学生的签到二维码。"""
+        if self.sign_session is not None and self.sign_session.is_running():
             return
-
-        if not content:
-            messagebox.showwarning("识别失败", "未检测到有效二维码内容。")
+        if self.sign_store is None:
+            self.sign_store = self._new_sign_store()
+        self.sign_session = QRSignInSession(self.sign_results, repeat_window=SIGN_REPEAT_WINDOW, preview=True)
+        self.sign_session.start()
+        self.sign_status_var.set("签到进行中（点击“停止签到”结束）")
+        self._log("连续签到已开始")
+        self._sign_session_tick()
+
+    def stop_sign_session(self):
+        if self.sign_session is not None:
+            self.sign_session.stop()
+            self.sign_session = None
+            self._log("连续签到已结束")
+        if self.sign_job is not None:
+            self.master.after_cancel(self.sign_job)
+            self.sign_job = None
+        self.sign_status_var.set("未开始签到")
+        if self.sign_preview_label is not None and self.sign_preview_label.winfo_exists():
+            self.sign_preview_label.configure(image="")
+        self.sign_preview_image = None
+
+    def _show_sign_preview(self):
+        """把扫描线程保留的最新一帧画到对话框中（PPM 数据由 Tk 直接解码，不需要 PIL）。"""
+        frame = self.sign_session.latest_preview() if self.sign_session is not None else None
+        if frame is None or self.sign_preview_label is None or not self.sign_preview_label.winfo_exists():
+            return
+        ok, buf = cv2.imencode(".ppm", frame)
+        if not ok:
+            return
+        self.sign_preview_image = tk.PhotoImage(data=buf.tobytes(), format="PPM")
+        self.sign_preview_label.configure(image=self.sign_preview_image)
+
+    def _sign_session_tick(self):
+        """在界面线程中取出签到结果，逐条写入记录与列表，不弹窗。"""
+        self.sign_job = None
+        # 先判断线程状态再取队列，线程结束前放入的结果不会遗漏
+        running = self.sign_session is not None and self.sign_session.is_running()
+        while True:
+            try:
+                result = self.sign_results.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(result, Exception):
+                self._log(f"二维码识别失败：{result}")
+                self.stop_sign_session()
+                self.sign_status_var.set(f"识别异常：{result}")
+                return
+            self._record_sign(result)
+
+        if running:
+            self._show_sign_preview()
+            self.sign_job = self.master.after(CAMERA_POLL_MS, self._sign_session_tick)
+        elif self.sign_session is not None:
+            # 帧来源读完或摄像头中断
+            self.stop_sign_session()
+
+    def show_missing_sign(self):
+        if self.sign_store is None or self.sign_store.roster is None:
+            messagebox.showinfo("未签到名单", "尚未开始签到或未找到名册。")
             return
+        missing = self.sign_store.missing()
+        summary = self.sign_store.summary()
+        text = "、".join(missing) if missing else "全部已签到"
+        messagebox.showinfo("未签到名单", f"已签到 {summary['signed']}/{summary['total']} 人\n{text}")
 
+    def _new_sign_store(self) -> SignInStore:
+        return SignInStore.from_roster_file(self.sign_csv_path, FACE_LIST_PATH, backend=STORAGE_BACKEND)
+
+    def _record_sign(self, content: str):
         student_name = content.strip()
-        append_sign_record(self.sign_csv_path, student_name)
-        # 使用当前时间与姓名组成一条可读记录
-        time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if self.sign_store is None:
+            self.sign_store = self._new_sign_store()
+        # 未登记与重复的二维码在写盘前直接拒绝
+        status = self.sign_store.sign(student_name)
+        if status != SIGN_OK:
+            reason = "重复签到" if status == SIGN_DUPLICATE else "未登记"
+            self.sign_status_var.set(f"{reason}：{student_name}")
+            self._log(f"签到被拒绝（{reason}）：{student_name}")
+            return
+        # 使用签到时间与姓名组成一条可读记录
+        time_str = self.sign_store.signed[student_name]
         record_line = f"{time_str}  {student_name}"
-        self.sign_history.append(record_line)
         if self.sign_listbox and self.sign_listbox.winfo_exists():
             self.sign_listbox.insert("end", record_line)
             self.sign_listbox.see("end")
+        self.sign_status_var.set(f"{student_name} 签到成功")
         self._log(f"签到成功：{student_name}")
-        messagebox.showinfo("签到成功", f"{student_name} 签到成功！")
 
     def on_close(self):
-        """窗口关闭时的统一处理：停止监测与人员检测并销毁主窗口。"""
+        """窗口关闭时的统一处理：停止监测与人员检测、释放摄像头并销毁主窗口。"""
         try:
             self.stop_camera_monitor()
         except Exception:
@@ -312,6 +497,30 @@ class SmartClassroomApp:
             self.stop_monitoring()
         except Exception:
             pass
+        try:
+            self.stop_sign_session()
+        except Exception:
+            pass
+        try:
+            self.env_writer.close()
+        except Exception:
+            pass
+        try:
+            self.ts_log.close()
+        except Exception:
+            pass
+        try:
+            self.rollups.close()
+        except Exception:
+            pass
+        try:
+            close_partitioned_logs()
+        except Exception:
+            pass
+        try:
+            release_all_cameras()
+        except Exception:
+            pass
         if self.sign_dialog and self.sign_dialog.winfo_exists():
             self.sign_dialog.destroy()
         self.master.destroy()
@@ -4,6 +4,10 @@ ROOM_PROFILES = {
 
 DEFAULT_ROOM = "A-101"
 
+# evaluate_controls 可能输出的全部状态，二进制日志中按下标编码
+AC_STATES = ("待机", "制冷中", "制热中")
+LIGHT_STATES = ("维持", "开灯", "调暗")
+
 
 def get_room_profile(room_id):
     return ROOM_PROFILES.get(room_id, ROOM_PROFILES[DEFAULT_ROOM])
@@ -0,0 +1,476 @@
+import json
+import math
+import os
+import tempfile
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# 与 OpenCV LBPH 的 predict 保持一致：找不到样本时返回 (-1, DBL_MAX)
+NO_MATCH = (-1, float(np.finfo(np.float64).max))
+# 单次距离计算允许的最大元素数，用于按块切分训练样本；块放得进缓存时比一次算完更快
+_MAX_BLOCK_ELEMENTS = 1 << 20
+# 二进制快照的清单文件，记录参数与当前版本的数据文件名
+SNAPSHOT_MANIFEST = "snapshot.json"
+
+
+def _neighbor_weights(radius: int, neighbors: int):
+    """圆形邻域采样点的双线性插值偏移与权重，与 OpenCV elbp 的计算方式相同。"""
+    result = []
+    one = np.float32(1)
+    for n in range(neighbors):
+        # OpenCV 以 float 保存采样坐标与权重，这里同样用 float32 以保证编码逐位一致
+        x = np.float32(radius * math.cos(2.0 * math.pi * n / neighbors))
+        y = np.float32(-radius * math.sin(2.0 * math.pi * n / neighbors))
+        fx, fy = int(math.floor(x)), int(math.floor(y))
+        cx, cy = int(math.ceil(x)), int(math.ceil(y))
+        tx, ty = x - np.float32(fx), y - np.float32(fy)
+        weights = ((one - tx) * (one - ty), tx * (one - ty), (one - tx) * ty, tx * ty)
+        result.append((fx, fy, cx, cy, weights))
+    return result
+
+
+def elbp(gray: np.ndarray, radius: int = 1, neighbors: int = 8) -> np.ndarray:
+    """扩展 LBP 编码图，输出尺寸为 (rows - 2r, cols - 2r)。"""
+    src = np.asarray(gray, dtype=np.float32)
+    rows, cols = src.shape[:2]
+    h, w = rows - 2 * radius, cols - 2 * radius
+    if h <= 0 or w <= 0:
+        raise ValueError("人脸区域过小，无法计算 LBP")
+    center = src[radius : radius + h, radius : radius + w]
+    codes = np.zeros((h, w), dtype=np.int32)
+    eps = np.finfo(np.float32).eps
+
+    def window(dy, dx):
+        return src[radius + dy : radius + dy + h, radius + dx : radius + dx + w]
+
+    for n, (fx, fy, cx, cy, (w1, w2, w3, w4)) in enumerate(_neighbor_weights(radius, neighbors)):
+        t = w1 * window(fy, fx) + w2 * window(fy, cx) + w3 * window(cy, fx) + w4 * window(cy, cx)
+        bit = (t > center) | (np.abs(t - center) < eps)
+        codes |= bit.astype(np.int32) << n
+    return codes
+
+
+def spatial_histogram(codes: np.ndarray, num_patterns: int, grid_x: int = 8, grid_y: int = 8) -> np.ndarray:
+    """按 grid_x × grid_y 网格统计归一化 LBP 直方图并拼接为一行 float32。"""
+    height, width = codes.shape[0] // grid_y, codes.shape[1] // grid_x
+    if height == 0 or width == 0:
+        raise ValueError("人脸区域过小，无法划分网格")
+    cells = codes[: height * grid_y, : width * grid_x].reshape(grid_y, height, grid_x, width)
+    cells = cells.transpose(0, 2, 1, 3).reshape(grid_y * grid_x, height * width)
+    offsets = (np.arange(grid_y * grid_x) * num_patterns)[:, None]
+    hist = np.bincount((cells + offsets).ravel(), minlength=grid_y * grid_x * num_patterns)
+    return (hist.astype(np.float32) / np.float32(height * width)).reshape(-1)
+
+
+def lbp_histogram(gray: np.ndarray, radius: int = 1, neighbors: int = 8, grid_x: int = 8, grid_y: int = 8) -> np.ndarray:
+    """与 LBPHFaceRecognizer 相同参数下单张人脸的特征直方图。"""
+    return spatial_histogram(elbp(gray, radius, neighbors), 1 << neighbors, grid_x, grid_y)
+
+
+def chi_square_distances(queries: np.ndarray, samples: np.ndarray) -> np.ndarray:
+    """HISTCMP_CHISQR_ALT：2 * Σ (q - s)² / (q + s)，返回 (查询数, 样本数) 的距离矩阵。"""
+    m, dim = queries.shape
+    n = samples.shape[0]
+    out = np.empty((m, n), dtype=np.float64)
+    block = max(1, _MAX_BLOCK_ELEMENTS // max(1, m * dim))
+    q = queries[:, None, :]
+    for start in range(0, n, block):
+        s = samples[None, start : start + block, :]
+        total = q + s
+        diff = q - s
+        np.multiply(diff, diff, out=diff)
+        # 分母为 0 的位置不做除法，直接为 0，省去 np.where 的临时数组
+        terms = np.divide(diff, total, out=np.zeros_like(diff), where=total > np.finfo(np.float32).eps)
+        # 与 compareHist 一样用 double 累加
+        out[:, start : start + block] = 2.0 * terms.sum(axis=2, dtype=np.float64)
+    return out
+
+
+def l1_distances(queries: np.ndarray, samples: np.ndarray) -> np.ndarray:
+    m, dim = queries.shape
+    n = samples.shape[0]
+    out = np.empty((m, n), dtype=np.float64)
+    block = max(1, _MAX_BLOCK_ELEMENTS // max(1, m * dim))
+    for start in range(0, n, block):
+        diff = np.abs(queries[:, None, :] - samples[None, start : start + block, :])
+        out[:, start : start + block] = diff.sum(axis=2, dtype=np.float64)
+    return out
+
+
+_METRICS = {"chisqr": chi_square_distances, "l1": l1_distances}
+
+
+class LBPHistogramIndex:
+    """
+    基于 NumPy 的 LBPH 最近邻索引，接口与 cv2.face.LBPHFaceRecognizer.predict 相同。
+
+    训练直方图保存在一块连续的 float32 矩阵中，一帧内所有人脸一次向量化计算距离。
+    - "centroid"：只与每个身份的平均直方图比较，耗时与身份数成正比，推荐的快速模式；
+    - "coarse"：先用平均直方图选出 top_k 个候选身份，再在这些身份的样本中精确比较，
+      速度与精度折中，身份多时推荐；
+    - "exact"：与 LBPH 逐样本比较结果一致，但比 OpenCV 的原生实现慢数倍，
+      只用于校验一致性或快照冷启动，不是 LBPH 的加速替代（对比见 python lbp_suoyin.py）。
+    predict 返回的 (label, confidence) 语义与 LBPH 相同：confidence 为距离，越小越相似。
+    """
+
+    def __init__(
+        self,
+        histograms: np.ndarray,
+        labels: Sequence[int],
+        radius: int = 1,
+        neighbors: int = 8,
+        grid_x: int = 8,
+        grid_y: int = 8,
+        metric: str = "chisqr",
+        mode: str = "exact",
+        top_k: int = 5,
+    ):
+        if metric not in _METRICS:
+            raise ValueError(f"不支持的距离度量：{metric}")
+        if mode not in ("exact", "centroid", "coarse"):
+            raise ValueError(f"不支持的检索模式：{mode}")
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.metric = metric
+        self.mode = mode
+        self.top_k = top_k
+        self.num_patterns = 1 << neighbors
+        self.labels = np.asarray(labels, dtype=np.int32).reshape(-1)
+        histograms = np.ascontiguousarray(histograms, dtype=np.float32)
+        if histograms.ndim != 2 or histograms.shape[0] != self.labels.size:
+            raise ValueError("直方图行数与标签数量不一致")
+        self.histograms = histograms
+        # 精确模式用不到平均直方图，不计算，避免快照加载后立即读遍整个文件
+        self.centroid_labels = None
+        self.centroids = None
+        if mode != "exact":
+            self._build_centroids()
+
+    def _build_centroids(self):
+        if self.labels.size == 0:
+            self.centroid_labels = np.empty(0, dtype=np.int32)
+            self.centroids = np.empty((0, self.histograms.shape[1]), dtype=np.float32)
+            return
+        unique, inverse = np.unique(self.labels, return_inverse=True)
+        sums = np.zeros((unique.size, self.histograms.shape[1]), dtype=np.float64)
+        np.add.at(sums, inverse, self.histograms)
+        counts = np.bincount(inverse, minlength=unique.size)[:, None]
+        self.centroid_labels = unique.astype(np.int32)
+        self.centroids = (sums / counts).astype(np.float32)
+
+    @classmethod
+    def from_recognizer(cls, recognizer, **kwargs) -> "LBPHistogramIndex":
+        """从已读取 trainer.yml 的 LBPHFaceRecognizer 导出直方图与参数。"""
+        histograms = recognizer.getHistograms()
+        labels = np.asarray(recognizer.getLabels()).reshape(-1)
+        matrix = None
+        if len(histograms):
+            matrix = np.vstack([np.asarray(h, dtype=np.float32).reshape(1, -1) for h in histograms])
+        params = dict(
+            radius=recognizer.getRadius(),
+            neighbors=recognizer.getNeighbors(),
+            grid_x=recognizer.getGridX(),
+            grid_y=recognizer.getGridY(),
+        )
+        params.update(kwargs)
+        if matrix is None:
+            num_patterns = 1 << params["neighbors"]
+            matrix = np.empty((0, params["grid_x"] * params["grid_y"] * num_patterns), dtype=np.float32)
+        return cls(matrix, labels, **params)
+
+    @classmethod
+    def from_images(cls, images: Sequence[np.ndarray], labels: Sequence[int], **kwargs) -> "LBPHistogramIndex":
+        """直接由灰度人脸图计算直方图建立索引，不依赖 OpenCV 的 face 模块。"""
+        params = {key: kwargs[key] for key in ("radius", "neighbors", "grid_x", "grid_y") if key in kwargs}
+        if len(images) == 0:
+            dim = params.get("grid_x", 8) * params.get("grid_y", 8) * (1 << params.get("neighbors", 8))
+            return cls(np.empty((0, dim), dtype=np.float32), [], **kwargs)
+        matrix = np.vstack([lbp_histogram(img, **params) for img in images])
+        return cls(matrix, labels, **kwargs)
+
+    @classmethod
+    def from_snapshot(cls, directory, mmap: bool = True, **kwargs) -> "LBPHistogramIndex":
+        """
+        读取 save_snapshot 写出的二进制快照。
+
+        mmap=True 时直方图与标签以 numpy.load(mmap_mode='r') 映射，不解析文本、不复制数据，
+        启动耗时与模型大小基本无关。
+        """
+        manifest_path = os.path.join(directory, SNAPSHOT_MANIFEST)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"未找到模型快照：{manifest_path}")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        mmap_mode = "r" if mmap else None
+        histograms = np.load(os.path.join(directory, manifest["histograms"]), mmap_mode=mmap_mode)
+        labels = np.load(os.path.join(directory, manifest["labels"]), mmap_mode=mmap_mode)
+        if len(labels) != manifest["count"]:
+            raise RuntimeError(f"模型快照不完整：{directory}")
+        params = {key: manifest[key] for key in ("radius", "neighbors", "grid_x", "grid_y")}
+        params.update(kwargs)
+        return cls(histograms, labels, **params)
+
+    def save_snapshot(self, directory):
+        """
+        写出二进制快照：histograms-<版本>.npy、labels-<版本>.npy 与清单 snapshot.json。
+
+        数据文件每次使用新文件名，最后原子替换清单，读者要么看到旧版本要么看到新版本；
+        旧版本文件可能仍被其他进程映射（Windows 下无法删除），清理失败时留到下次。
+        """
+        os.makedirs(directory, exist_ok=True)
+        version = "%d-%d" % (time.time_ns(), os.getpid())
+        manifest = dict(self.params)
+        manifest.update(
+            histograms=f"histograms-{version}.npy",
+            labels=f"labels-{version}.npy",
+            count=int(self.labels.size),
+        )
+        np.save(os.path.join(directory, manifest["histograms"]), np.ascontiguousarray(self.histograms, dtype=np.float32))
+        np.save(os.path.join(directory, manifest["labels"]), np.ascontiguousarray(self.labels, dtype=np.int32))
+        tmp_path = os.path.join(directory, SNAPSHOT_MANIFEST + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(directory, SNAPSHOT_MANIFEST))
+        for name in os.listdir(directory):
+            if name.endswith(".npy") and name not in (manifest["histograms"], manifest["labels"]):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    def compute_histogram(self, gray: np.ndarray) -> np.ndarray:
+        return lbp_histogram(gray, self.radius, self.neighbors, self.grid_x, self.grid_y)
+
+    def _distances(self, queries: np.ndarray, samples: np.ndarray) -> np.ndarray:
+        return _METRICS[self.metric](queries, samples)
+
+    def query(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """批量查询直方图，返回 (labels, distances)，均为长度 m 的数组。"""
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.histograms.shape[1])
+        m = queries.shape[0]
+        if self.labels.size == 0:
+            return np.full(m, NO_MATCH[0], dtype=np.int32), np.full(m, NO_MATCH[1])
+
+        if self.mode == "centroid":
+            dist = self._distances(queries, self.centroids)
+            best = dist.argmin(axis=1)
+            return self.centroid_labels[best], dist[np.arange(m), best]
+
+        if self.mode == "exact" or self.centroid_labels.size <= self.top_k:
+            dist = self._distances(queries, self.histograms)
+            best = dist.argmin(axis=1)
+            return self.labels[best], dist[np.arange(m), best]
+
+        # 粗到细：先按身份平均直方图选候选，再在候选身份的全部样本里精确比较
+        coarse = self._distances(queries, self.centroids)
+        candidates = np.argpartition(coarse, self.top_k - 1, axis=1)[:, : self.top_k]
+        out_labels = np.empty(m, dtype=np.int32)
+        out_dist = np.empty(m, dtype=np.float64)
+        for i in range(m):
+            mask = np.isin(self.labels, self.centroid_labels[candidates[i]])
+            dist = self._distances(queries[i : i + 1], self.histograms[mask])[0]
+            best = int(dist.argmin())
+            out_labels[i] = self.labels[mask][best]
+            out_dist[i] = dist[best]
+        return out_labels, out_dist
+
+    def predict(self, gray: np.ndarray) -> Tuple[int, float]:
+        labels, distances = self.query(self.compute_histogram(gray)[None, :])
+        return int(labels[0]), float(distances[0])
+
+    def predict_batch(self, crops: Sequence[np.ndarray]) -> List[Tuple[int, float]]:
+        """一帧内所有人脸一次查询。"""
+        if len(crops) == 0:
+            return []
+        queries = np.vstack([self.compute_histogram(crop) for crop in crops])
+        labels, distances = self.query(queries)
+        return [(int(label), float(dist)) for label, dist in zip(labels, distances)]
+
+    def __len__(self):
+        return int(self.labels.size)
+
+    @property
+    def params(self) -> Dict[str, int]:
+        return {"radius": self.radius, "neighbors": self.neighbors, "grid_x": self.grid_x, "grid_y": self.grid_y}
+
+    def save_lbph_yaml(self, path):
+        """写出 LBPHFaceRecognizer 可直接 read 的 trainer.yml（先写临时文件再替换，避免读到半成品）。"""
+        root, ext = os.path.splitext(path)
+        tmp_path = f"{root}.tmp{ext or '.yml'}"
+        fs = cv2.FileStorage(tmp_path, cv2.FILE_STORAGE_WRITE)
+        fs.startWriteStruct("opencv_lbphfaces", cv2.FileNode_MAP)
+        fs.write("threshold", NO_MATCH[1])
+        for key, value in self.params.items():
+            fs.write(key, value)
+        fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+        for row in self.histograms:
+            fs.write("", row.reshape(1, -1))
+        fs.endWriteStruct()
+        fs.write("labels", self.labels.reshape(-1, 1))
+        fs.startWriteStruct("labelsInfo", cv2.FileNode_SEQ)
+        fs.endWriteStruct()
+        fs.endWriteStruct()
+        fs.release()
+        os.replace(tmp_path, path)
+
+    def to_lbph(self):
+        """
+        转换为 cv2.face 的 LBPHFaceRecognizer（经临时 trainer.yml），预测走 OpenCV 的原生实现。
+        没有样本时 LBPH 无法预测，返回索引本身（predict 返回 NO_MATCH）。
+        """
+        if self.labels.size == 0:
+            return self
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trainer.yml")
+            self.save_lbph_yaml(path)
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.read(path)
+        return recognizer
+
+
+class HistogramStore:
+    """
+    按身份分文件保存的直方图库：每个身份一个 <id>.npy，参数写在 params.json。
+
+    增删一个身份只读写这一个文件，目录 mtime 随之变化，便于识别端热加载。
+    """
+
+    PARAMS_FILE = "params.json"
+
+    def __init__(self, directory, radius: int = 1, neighbors: int = 8, grid_x: int = 8, grid_y: int = 8):
+        self.directory = directory
+        params_path = os.path.join(directory, self.PARAMS_FILE)
+        if os.path.exists(params_path):
+            with open(params_path, "r", encoding="utf-8") as f:
+                self.params = json.load(f)
+        else:
+            self.params = {"radius": radius, "neighbors": neighbors, "grid_x": grid_x, "grid_y": grid_y}
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.directory, self.PARAMS_FILE))
+
+    def _ensure_dir(self):
+        os.makedirs(self.directory, exist_ok=True)
+        params_path = os.path.join(self.directory, self.PARAMS_FILE)
+        if not os.path.exists(params_path):
+            with open(params_path, "w", encoding="utf-8") as f:
+                json.dump(self.params, f)
+
+    def _path(self, label: int) -> str:
+        return os.path.join(self.directory, f"{int(label)}.npy")
+
+    def labels(self) -> List[int]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith(".npy") and name[:-4].isdigit())
+
+    def compute(self, images: Sequence[np.ndarray]) -> np.ndarray:
+        return np.vstack([lbp_histogram(img, **self.params) for img in images])
+
+    def load(self, label: int) -> np.ndarray:
+        return np.load(self._path(label))
+
+    def save(self, label: int, histograms: np.ndarray):
+        """整体写入某个身份的直方图（原子替换）。"""
+        self._ensure_dir()
+        tmp_path = self._path(label) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(histograms, dtype=np.float32))
+        os.replace(tmp_path, self._path(label))
+
+    def append(self, label: int, histograms: np.ndarray):
+        """为已有身份追加样本。"""
+        if os.path.exists(self._path(label)):
+            histograms = np.vstack([self.load(label), histograms])
+        self.save(label, histograms)
+
+    def remove(self, label: int) -> bool:
+        try:
+            os.remove(self._path(label))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def import_index(self, index: "LBPHistogramIndex", replace: bool = False):
+        """
+        把已有模型（如从 trainer.yml 导出的索引）拆分为按身份的文件。
+        replace=True 时（全量重训后）删除索引中已不存在的身份，并按索引参数重写 params.json。
+        """
+        self.params = dict(index.params)
+        self._ensure_dir()
+        if replace:
+            with open(os.path.join(self.directory, self.PARAMS_FILE), "w", encoding="utf-8") as f:
+                json.dump(self.params, f)
+        labels = np.unique(index.labels)
+        for label in labels:
+            self.save(int(label), index.histograms[index.labels == label])
+        if replace:
+            for label in set(self.labels()) - {int(label) for label in labels}:
+                self.remove(label)
+
+    def build_index(self, **kwargs) -> LBPHistogramIndex:
+        labels = self.labels()
+        dim = self.params["grid_x"] * self.params["grid_y"] * (1 << self.params["neighbors"])
+        if not labels:
+            return LBPHistogramIndex(np.empty((0, dim), dtype=np.float32), [], **self.params, **kwargs)
+        blocks = [self.load(label) for label in labels]
+        matrix = np.vstack(blocks)
+        label_array = np.concatenate([np.full(len(block), label, dtype=np.int32) for label, block in zip(labels, blocks)])
+        return LBPHistogramIndex(matrix, label_array, **self.params, **kwargs)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="LBP 直方图索引演示与加载耗时对比")
+    parser.add_argument("--samples", type=int, default=500, help="加载对比使用的样本数")
+    parser.add_argument("--queries", type=int, default=4, help="预测对比使用的人脸数")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    faces = [rng.integers(0, 256, (100, 100), dtype=np.uint8) for _ in range(40)]
+    index = LBPHistogramIndex.from_images(faces, [i % 8 for i in range(40)])
+    begin = time.perf_counter()
+    results = index.predict_batch(faces[:10])
+    print(f"批量查询 10 张人脸用时 {1000 * (time.perf_counter() - begin):.1f}ms：{results[:3]}")
+
+    # 冷启动对比：解析 trainer.yml 与映射二进制快照
+    dim = index.histograms.shape[1]
+    big = LBPHistogramIndex(
+        rng.random((args.samples, dim), dtype=np.float32) / dim, rng.integers(0, 50, args.samples), **index.params
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        yaml_path = os.path.join(tmp, "trainer.yml")
+        big.save_lbph_yaml(yaml_path)
+        big.save_snapshot(os.path.join(tmp, "snapshot"))
+        begin = time.perf_counter()
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(yaml_path)
+        yaml_ms = 1000 * (time.perf_counter() - begin)
+        begin = time.perf_counter()
+        loaded = LBPHistogramIndex.from_snapshot(os.path.join(tmp, "snapshot"))
+        snapshot_ms = 1000 * (time.perf_counter() - begin)
+        same = loaded.predict(faces[0]) == LBPHistogramIndex.from_recognizer(recognizer).predict(faces[0])
+        print(
+            f"{args.samples} 个样本（trainer.yml {os.path.getsize(yaml_path) / 1e6:.1f}MB）："
+            f"读取 trainer.yml {yaml_ms:.0f}ms，加载快照 {snapshot_ms:.1f}ms，预测一致：{same}"
+        )
+        # 稳态预测对比：加载快一点不代表预测也快，精确模式明显慢于 LBPH。
+        # 这里的直方图是随机生成的，没有身份结构，标签一致率只反映模式之间的差别
+        queries = faces[: args.queries]
+        begin = time.perf_counter()
+        expected = [recognizer.predict(face) for face in queries]
+        print(f"预测 {len(queries)} 张人脸：LBPH {1000 * (time.perf_counter() - begin):.1f}ms")
+        for mode in ("exact", "centroid", "coarse"):
+            candidate = LBPHistogramIndex(loaded.histograms, loaded.labels, mode=mode, **loaded.params)
+            begin = time.perf_counter()
+            results = candidate.predict_batch(queries)
+            elapsed_ms = 1000 * (time.perf_counter() - begin)
+            agree = sum(label == want[0] for (label, _), want in zip(results, expected))
+            print(f"  {mode:8s} {elapsed_ms:.1f}ms，与 LBPH 标签一致 {agree}/{len(queries)}")
+        del loaded
@@ -0,0 +1,122 @@
+import time
+from typing import List, Optional, Tuple
+
+import cv2
+
+from genzong import box_iou
+
+Box = Tuple[int, int, int, int]
+
+
+def _dedupe_boxes(boxes: List[Box], iou_threshold: float = 0.3) -> List[Box]:
+    """ROI 之间可能重叠，同一张脸只保留一个框。"""
+    kept: List[Box] = []
+    for box in sorted(boxes, key=lambda b: b[2] * b[3], reverse=True):
+        if all(box_iou(box, other) < iou_threshold for other in kept):
+            kept.append(box)
+    return kept
+
+
+class FaceDetector:
+    """
+    降采样 + ROI 限定的 Haar 人脸检测。
+
+    检测在按 scale 缩小的灰度图上进行，结果换算回原分辨率；两次全图扫描之间，
+    只在上一帧人脸周围扩大 roi_margin 倍的区域内搜索。每经过 full_scan_interval 帧（含调用方
+    通过 skip_frame() 告知的跳过帧），或距上次全图扫描超过 full_scan_seconds 秒时强制全图重扫，
+    因此配合运动门控时新出现在 ROI 之外的人脸也能及时检出。
+    默认 scale=1.0 不缩小，检测结果只受 ROI 影响；实时识别等需要提速的调用方显式传入 0.5。
+    scale=1.0、full_scan_interval=1 时与原先逐帧全图检测一致。
+    """
+
+    def __init__(
+        self,
+        scale: float = 1.0,
+        roi_margin: float = 0.5,
+        full_scan_interval: int = 10,
+        full_scan_seconds: Optional[float] = 1.0,
+        scale_factor: float = 1.1,
+        min_neighbors: int = 5,
+        min_size: Tuple[int, int] = (50, 50),
+    ):
+        self.scale = scale
+        self.roi_margin = roi_margin
+        self.full_scan_interval = max(1, full_scan_interval)
+        self.full_scan_seconds = full_scan_seconds
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self._last_boxes: List[Box] = []
+        self._frames_since_full = 0
+        self._last_full_time = 0.0
+        self.full_scans = 0
+        self.roi_scans = 0
+
+    def _run_cascade(self, cascade, image):
+        min_w = max(1, int(round(self.min_size[0] * self.scale)))
+        min_h = max(1, int(round(self.min_size[1] * self.scale)))
+        return cascade.detectMultiScale(
+            image,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(min_w, min_h),
+            flags=cv2.CASCADE_SCALE_IMAGE,
+        )
+
+    def _to_full(self, x, y, w, h, offset=(0, 0)) -> Box:
+        inv = 1.0 / self.scale
+        ox, oy = offset
+        return (
+            int(round((x + ox) * inv)),
+            int(round((y + oy) * inv)),
+            int(round(w * inv)),
+            int(round(h * inv)),
+        )
+
+    def detect(self, cascade, gray) -> List[Box]:
+        """返回原分辨率坐标下的人脸框 [(x, y, w, h), ...]。"""
+        if self.scale != 1.0:
+            small = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        else:
+            small = gray
+        now = time.monotonic()
+        full_scan = (
+            not self._last_boxes
+            or self._frames_since_full >= self.full_scan_interval - 1
+            or (self.full_scan_seconds is not None and now - self._last_full_time >= self.full_scan_seconds)
+        )
+
+        if full_scan:
+            self.full_scans += 1
+            self._frames_since_full = 0
+            self._last_full_time = now
+            boxes = [self._to_full(x, y, w, h) for (x, y, w, h) in self._run_cascade(cascade, small)]
+        else:
+            self.roi_scans += 1
+            self._frames_since_full += 1
+            sh, sw = small.shape[:2]
+            boxes = []
+            for (x, y, w, h) in self._last_boxes:
+                # 上一帧的框换算到缩小图，并向四周扩展
+                sx, sy, sw_box, sh_box = x * self.scale, y * self.scale, w * self.scale, h * self.scale
+                mx, my = sw_box * self.roi_margin, sh_box * self.roi_margin
+                x0, y0 = max(0, int(sx - mx)), max(0, int(sy - my))
+                x1, y1 = min(sw, int(sx + sw_box + mx)), min(sh, int(sy + sh_box + my))
+                if x1 <= x0 or y1 <= y0:
+                    continue
+                found = self._run_cascade(cascade, small[y0:y1, x0:x1])
+                boxes.extend(self._to_full(fx, fy, fw, fh, (x0, y0)) for (fx, fy, fw, fh) in found)
+            boxes = _dedupe_boxes(boxes)
+
+        self._last_boxes = boxes
+        return boxes
+
+    def skip_frame(self):
+        """调用方未做检测的帧（如被运动门控跳过）也计入全图重扫的间隔。"""
+        self._frames_since_full += 1
+
+    def reset(self):
+        self._last_boxes = []
+        self._frames_since_full = 0
+        self._last_full_time = 0.0
+
@@ -0,0 +1,290 @@
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import cv2
+
+from fenpian_shibie import ShardedRecognizer
+from lbp_suoyin import SNAPSHOT_MANIFEST, HistogramStore, LBPHistogramIndex
+from renlian_yuchuli import FacePreprocessor, PreprocessConfig
+
+FACE_DATA_DIR = os.path.join(os.path.dirname(__file__), "face_data")
+CASCADE_PATH = os.path.join(FACE_DATA_DIR, "haarcascade_frontalface_alt.xml")
+TRAINER_PATH = os.path.join(FACE_DATA_DIR, "trainer.yml")
+FACE_LIST_PATH = os.path.join(FACE_DATA_DIR, "face_list.txt")
+# 增量注册写入的按身份直方图库（见 renlian_zhuce.py）
+HISTOGRAM_DIR = os.path.join(FACE_DATA_DIR, "histograms")
+# 训练时使用的人脸预处理参数，识别时必须保持一致
+PREPROCESS_PATH = os.path.join(FACE_DATA_DIR, "preprocess.json")
+# 训练/注册时同时写出的二进制模型快照，加载时不解析 trainer.yml
+SNAPSHOT_DIR = os.path.join(FACE_DATA_DIR, "snapshot")
+
+# 识别后端："lbph" 使用 OpenCV 自带的逐样本比较，"numpy" 使用向量化直方图索引，
+# "sharded" 把身份分散到多个子进程并行查询（index_options 中的 shards 为进程数）。
+# "lbph" 始终用 OpenCV 预测（稳态最快），trainer.yml 过期时由直方图库转换回 LBPH；
+# 其他后端在直方图库或快照较新时由其构建索引，不解析 trainer.yml。
+# 默认的精确模式只为与 LBPH 结果一致，比 LBPH 慢；追求速度时 index_options 传 mode="centroid" 或 "coarse"
+DEFAULT_BACKEND = "lbph"
+BACKENDS = ("lbph", "numpy", "sharded")
+
+
+def load_face_dictionary(list_path=FACE_LIST_PATH):
+    if not os.path.exists(list_path):
+        raise FileNotFoundError(f"未找到人脸字典文件：{list_path}")
+    mapping = {}
+    with open(list_path, "r", encoding="utf-8") as f:
+        for line in f:
+            # "#" 开头为注释（如已删除的身份），不计入字典
+            parts = line.split()
+            if len(parts) >= 2 and not parts[0].startswith("#"):
+                mapping[int(parts[0])] = parts[1]
+    return mapping
+
+
+def _file_signature(path) -> Optional[Tuple[int, int]]:
+    """返回 (mtime_ns, size)，文件不存在时返回 None。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+@dataclass
+class FaceModel:
+    """一次完整加载得到的级联检测器、识别器、ID→姓名 字典与人脸预处理器。"""
+
+    cascade: "cv2.CascadeClassifier"
+    recognizer: object
+    face_dict: Dict[int, str]
+    preprocessor: FacePreprocessor
+    signatures: Dict[str, Optional[Tuple[int, int]]] = field(default_factory=dict)
+    # 正在使用该模型的 lease() 数量，以及是否已被注册表替换
+    leases: int = 0
+    retired: bool = False
+
+    def close(self):
+        """释放识别器持有的资源（如分片子进程）；lbph/numpy 后端无需释放。"""
+        close = getattr(self.recognizer, "close", None)
+        if close is not None:
+            close()
+
+
+class FaceModelRegistry:
+    """
+    进程内共享的人脸模型缓存。
+
+    只在某个文件的 mtime/大小 变化时重新加载；新模型完整构建成功后才替换引用，
+    加载期间文件再次变化（仍在写入）或加载失败时，继续使用旧模型。
+
+    被替换的旧模型会显式 close()：没有 lease() 使用者时立即关闭，否则由最后一个使用者归还时关闭，
+    不依赖垃圾回收（分片后端的子进程因此不会随热加载累积）。
+    """
+
+    def __init__(
+        self,
+        cascade_path=CASCADE_PATH,
+        trainer_path=TRAINER_PATH,
+        list_path=FACE_LIST_PATH,
+        backend=DEFAULT_BACKEND,
+        index_options=None,
+        histogram_dir=HISTOGRAM_DIR,
+        preprocess_path=PREPROCESS_PATH,
+        snapshot_dir=SNAPSHOT_DIR,
+    ):
+        self.backend = backend
+        self.index_options = dict(index_options or {})
+        # 直方图库目录的 mtime 在增删身份文件时变化，一并纳入热加载检测
+        self.paths = {
+            "cascade": cascade_path,
+            "trainer": trainer_path,
+            "face_list": list_path,
+            "histograms": histogram_dir,
+            "preprocess": preprocess_path,
+            # 快照以清单文件为准，清单最后写入
+            "snapshot": os.path.join(snapshot_dir, SNAPSHOT_MANIFEST),
+        }
+        self.snapshot_dir = snapshot_dir
+        self._model: Optional[FaceModel] = None
+        self._lock = threading.Lock()
+        self._lease_lock = threading.Lock()
+        self.reload_count = 0
+
+    def _current_signatures(self):
+        return {key: _file_signature(path) for key, path in self.paths.items()}
+
+    def _use_store(self, signatures) -> bool:
+        # 直方图库不比 trainer.yml 与快照旧时才使用；用旧版训练脚本全量重训而未同步直方图库时，
+        # 退回 trainer.yml/快照，避免旧直方图与新的 编号→姓名 字典错配
+        store = signatures["histograms"]
+        if store is None:
+            return False
+        return all(sig is None or store[0] >= sig[0] for sig in (signatures["trainer"], signatures["snapshot"]))
+
+    def _use_snapshot(self, signatures) -> bool:
+        # 快照不比 trainer.yml 旧时才使用，防止只更新了 trainer.yml 却读到过期快照
+        snapshot, trainer = signatures["snapshot"], signatures["trainer"]
+        return snapshot is not None and (trainer is None or snapshot[0] >= trainer[0])
+
+    def _trainer_stale(self, signatures) -> bool:
+        # 训练与导出都在直方图库之后写 trainer.yml；直方图库更新说明之后有增量注册而未导出
+        store, trainer = signatures["histograms"], signatures["trainer"]
+        return trainer is None or (store is not None and store[0] > trainer[0])
+
+    def _check_files(self, signatures):
+        if signatures["cascade"] is None:
+            raise FileNotFoundError(f"未找到 Haar 分类器：{self.paths['cascade']}")
+        if signatures["trainer"] is None and not self._use_store(signatures) and not self._use_snapshot(signatures):
+            raise FileNotFoundError(f"未找到训练模型：{self.paths['trainer']}")
+        if signatures["face_list"] is None:
+            raise FileNotFoundError(f"未找到人脸字典文件：{self.paths['face_list']}")
+
+    def _build(self, signatures) -> FaceModel:
+        face_cascade = cv2.CascadeClassifier(self.paths["cascade"])
+        if face_cascade.empty():
+            raise RuntimeError(f"Haar 分类器加载失败：{self.paths['cascade']}")
+        options = dict(self.index_options)
+        shards = options.pop("shards", None)
+        if self.backend == "lbph":
+            if not self._trainer_stale(signatures):
+                recognizer = cv2.face.LBPHFaceRecognizer_create()
+                recognizer.read(self.paths["trainer"])
+            elif self._use_store(signatures):
+                recognizer = HistogramStore(self.paths["histograms"]).build_index().to_lbph()
+            else:
+                recognizer = LBPHistogramIndex.from_snapshot(self.snapshot_dir, mmap=False).to_lbph()
+        elif self.backend == "sharded" and self._use_snapshot(signatures) and not self._use_store(signatures):
+            # 各分片进程自行映射快照，父进程不加载直方图
+            recognizer = ShardedRecognizer.from_snapshot(self.snapshot_dir, shards, **options)
+        elif self._use_store(signatures):
+            recognizer = HistogramStore(self.paths["histograms"]).build_index(**options)
+        elif self._use_snapshot(signatures):
+            # 快照与 trainer.yml 内容相同，精确模式下预测结果与 LBPH 一致
+            recognizer = LBPHistogramIndex.from_snapshot(self.snapshot_dir, **options)
+        else:
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.read(self.paths["trainer"])
+            recognizer = LBPHistogramIndex.from_recognizer(recognizer, **options)
+        if self.backend == "sharded" and isinstance(recognizer, LBPHistogramIndex):
+            recognizer = ShardedRecognizer.from_index(recognizer, shards)
+        model = FaceModel(face_cascade, recognizer, {}, None, signatures)
+        try:
+            model.face_dict = load_face_dictionary(self.paths["face_list"])
+            model.preprocessor = FacePreprocessor(PreprocessConfig.load(self.paths["preprocess"]))
+        except Exception:
+            model.close()
+            raise
+        return model
+
+    def get(self) -> FaceModel:
+        """返回当前模型，必要时重新加载。"""
+        model = self._model
+        signatures = self._current_signatures()
+        if model is not None and model.signatures == signatures:
+            return model
+
+        with self._lock:
+            model = self._model
+            signatures = self._current_signatures()
+            if model is not None and model.signatures == signatures:
+                return model
+            try:
+                self._check_files(signatures)
+                new_model = self._build(signatures)
+            except Exception:
+                if model is None:
+                    raise
+                return model
+            # 加载过程中文件又被改写，说明读到的可能是半成品，下次再试
+            if self._current_signatures() != signatures:
+                if model is not None:
+                    new_model.close()
+                    return model
+            self._model = new_model
+            self.reload_count += 1
+        self._retire(model)
+        return new_model
+
+    def _retire(self, model: Optional[FaceModel]):
+        if model is None:
+            return
+        with self._lease_lock:
+            model.retired = True
+            idle = model.leases == 0
+        if idle:
+            model.close()
+
+    @contextmanager
+    def lease(self):
+        """
+        取得当前模型并在 with 块内持有：块内模型即使被热加载替换也不会被关闭。
+        需要跨多帧使用同一模型时应使用 lease()，而不是只调用 get()。
+        """
+        while True:
+            model = self.get()
+            with self._lease_lock:
+                # 取得模型与登记使用之间可能已被替换并关闭，重新获取
+                if not model.retired:
+                    model.leases += 1
+                    break
+        try:
+            yield model
+        finally:
+            with self._lease_lock:
+                model.leases -= 1
+                idle = model.retired and model.leases == 0
+            if idle:
+                model.close()
+
+    def set_backend(self, backend, index_options=None):
+        """切换识别后端（见 BACKENDS），下次 get() 时按新后端重新加载。"""
+        if backend not in BACKENDS:
+            raise ValueError(f"不支持的识别后端：{backend}")
+        with self._lock:
+            self.backend = backend
+            self.index_options = dict(index_options or {})
+            model, self._model = self._model, None
+        self._retire(model)
+
+    def invalidate(self):
+        """丢弃缓存，下次 get() 时强制重新加载。"""
+        with self._lock:
+            model, self._model = self._model, None
+        self._retire(model)
+
+
+_default_registry: Optional[FaceModelRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> FaceModelRegistry:
+    global _default_registry
+    if _default_registry is None:
+        with _default_registry_lock:
+            if _default_registry is None:
+                _default_registry = FaceModelRegistry()
+    return _default_registry
+
+
+def set_recognizer_backend(backend, **index_options):
+    """切换默认注册表的识别后端。"""
+    get_model_registry().set_backend(backend, index_options)
+
+
+def get_face_model() -> FaceModel:
+    """获取默认路径下的人脸模型（按需热加载）。"""
+    return get_model_registry().get()
+
+
+def lease_face_model():
+    """with lease_face_model() as model: 在块内持有默认注册表的当前模型。"""
+    return get_model_registry().lease()
+
+
+if __name__ == "__main__":
+    registry = get_model_registry()
+    first = registry.get()
+    second = registry.get()
+    print(f"人脸字典：{first.face_dict}，加载次数：{registry.reload_count}，复用：{first is second}")
@@ -1,40 +1,76 @@
 #--------------------------------------------负责人：杨宁轻------------------------------------------------#
-import os
-import cv2
-import numpy as np
-
-FACE_DATA_DIR = os.path.join(os.path.dirname(__file__), "face_data")
-CASCADE_PATH = os.path.join(FACE_DATA_DIR, "haarcascade_frontalface_alt.xml")
-TRAINER_PATH = os.path.join(FACE_DATA_DIR, "trainer.yml")
-FACE_LIST_PATH = os.path.join(FACE_DATA_DIR, "face_list.txt")
-
-
-def load_face_dictionary(list_path=FACE_LIST_PATH):
-    if not os.path.exists(list_path):
-        raise FileNotFoundError(f"未找到人脸字典文件：{list_path}")
-    data = np.loadtxt(list_path, dtype="str")
-    mapping = {}
-    for row in data:
-        mapping[int(row[0])] = row[1]
-    return mapping
-
+import queue
+import threading
 
-def recognize_from_camera(duration_seconds=10, on_identity=None, silent=False):
-
-    if not os.path.exists(CASCADE_PATH):
-        raise FileNotFoundError(f"未找到 Haar 分类器：{CASCADE_PATH}")
-    if not os.path.exists(TRAINER_PATH):
-        raise FileNotFoundError(f"未找到训练模型：{TRAINER_PATH}")
+import cv2
 
-    face_dict = load_face_dictionary()
+from genzong import FaceTracker
+from renlian_jiance import FaceDetector
+from renlian_moxing import (
+    BACKENDS,
+    CASCADE_PATH,
+    FACE_DATA_DIR,
+    FACE_LIST_PATH,
+    TRAINER_PATH,
+    get_face_model,
+    lease_face_model,
+    load_face_dictionary,
+    set_recognizer_backend,
+)
+from toupiao import IdentityVoter
+from yundong import MotionGate
+from zhenyuan import add_source_arguments, open_source
+
+
+def recognize_from_camera(
+    duration_seconds=10,
+    on_identity=None,
+    silent=False,
+    source=None,
+    stats=None,
+    tracker=None,
+    detector=None,
+    gate=None,
+    voter=None,
+):
+    """
+    识别画面中的人脸，返回 (最后识别到的身份, 已识别人员集合, 投票汇总)。
+
+    source 为 None 时使用共享摄像头，也可传入视频文件、图片目录或 FrameSource；
+    传入 stats 字典时写入处理帧数、耗时、帧率与 predict 调用次数。
+    tracker 可在多次调用间复用，稳定的人脸轨迹直接沿用缓存的身份，不再 predict。
+    detector 控制降采样与 ROI 检测方式，predict 仍使用原分辨率的人脸区域。
+    gate 为 MotionGate 时，画面静止的帧直接沿用 tracker 中上一次的结果。
+    voter 为 IdentityVoter 时身份集合稳定后提前结束，不必等满 duration_seconds；
+    不论是否提前结束都会逐帧投票，投票汇总为 {身份: {"votes", "mean_confidence", "std_confidence"}}。
+    """
+    # 模型由注册表缓存，只有文件变化时才会重新加载；识别期间持有模型，热加载不会关闭正在使用的识别器
+    with lease_face_model() as model:
+        return _recognize_with_model(
+            model, duration_seconds, on_identity, silent, source, stats, tracker, detector, gate, voter
+        )
 
-    face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.read(TRAINER_PATH)
 
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        raise RuntimeError("无法打开摄像头")
+def _recognize_with_model(model, duration_seconds, on_identity, silent, source, stats, tracker, detector, gate, voter):
+    face_dict = model.face_dict
+    face_cascade = model.cascade
+    recognizer = model.recognizer
+    if tracker is None:
+        tracker = FaceTracker()
+    tracker.bind_model(model)
+    if detector is None:
+        # 实时识别在半分辨率上检测，换取帧率
+        detector = FaceDetector(scale=0.5)
+    # 未传入 voter 时仍统计票数，只是不提前结束
+    early_exit = voter is not None
+    if voter is None:
+        voter = IdentityVoter()
+    voter.reset()
+    predict_calls_before = tracker.predict_calls
+
+    # 摄像头由后台采集服务长期持有，这里只取最新帧；CameraSource 在摄像头断开后不再空转
+    cap = open_source(source)
+    frame_count = 0
 
     collected = set()
     last_identity = None
@@ -44,31 +80,60 @@ def recognize_from_camera(duration_seconds=10, on_identity=None, silent=False):
         print("摄像头人脸识别已启动，按 'q' 退出窗口。")
 
     while True:
-        success, frame = cap.read()
+        # 非静默模式会在帧上绘制，需要复制一份，避免改动共享缓冲区
+        success, frame = cap.read(copy=not silent)
         if not success:
+            if not cap.finite and not cap.isOpened():
+                raise RuntimeError("摄像头已断开或关闭")
+            if cap.exhausted:
+                break
             continue
+        frame_count += 1
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(50, 50),
-            flags=cv2.CASCADE_SCALE_IMAGE,
-        )
-
-        for (x, y, w, h) in faces:
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
-            id_face, confidence = recognizer.predict(gray[y : y + h, x : x + w])
-            if confidence < 100:
-                identity = face_dict.get(id_face, "unknown")
+        # 运动门控：画面静止时跳过检测与识别，沿用上一次的轨迹结果；
+        # 首帧总要完整处理，先判断首帧，避免强制处理被门控计为跳过
+        process = tracker.frame_index == 0 or gate is None or gate.should_process(gray)
+        if process:
+            pass_start = cv2.getTickCount()
+            faces = detector.detect(face_cascade, gray)
+            tracks = tracker.update(faces)
+            pending = [track for track in tracks if tracker.needs_predict(track)]
+            # 统一预处理为固定尺寸，predict 耗时不再随人脸大小变化
+            crops = [model.preprocessor.crop(gray, track.box) for track in pending]
+            # 向量化后端一次查询整帧的人脸，LBPH 仍逐张 predict
+            if hasattr(recognizer, "predict_batch"):
+                predictions = recognizer.predict_batch(crops)
             else:
-                identity = "unknown"
+                predictions = [recognizer.predict(crop) for crop in crops]
+            for track, (id_face, confidence) in zip(pending, predictions):
+                if confidence < 100:
+                    identity = face_dict.get(id_face, "unknown")
+                else:
+                    identity = "unknown"
+                tracker.set_prediction(track, id_face, confidence, identity)
+            if gate is not None:
+                gate.record_pass((cv2.getTickCount() - pass_start) / freq)
+        else:
+            detector.skip_frame()
+            tracks = [t for t in tracker.tracks if t.missed == 0]
+
+        for track in tracks:
+            identity, confidence = track.identity, track.confidence
             last_identity = identity
             if identity != "unknown":
                 collected.add(identity)
+            if silent:
+                # 静默模式读到的是共享缓冲区（未复制），不能在上面绘制，否则二维码签到等其他使用者会读到框线
+                continue
+            x, y, w, h = track.box
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
             label = f"{identity} {confidence:.2f}"
             cv2.putText(frame, label, (x + 5, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
 
+        voter.add_frame((t.identity, t.confidence) for t in tracks)
+        if early_exit and voter.is_settled():
+            break
+
         elapsed = (cv2.getTickCount() - start) / freq
         if not silent:
             cv2.imshow("Face Recognizer", frame)
@@ -77,15 +142,113 @@ def recognize_from_camera(duration_seconds=10, on_identity=None, silent=False):
         if duration_seconds is not None and elapsed >= duration_seconds:
             break
 
-    cap.release()
+    if source is not None:
+        cap.release()
     if not silent:
         cv2.destroyAllWindows()
 
+    if stats is not None:
+        elapsed = (cv2.getTickCount() - start) / freq
+        stats["frames"] = frame_count
+        stats["seconds"] = elapsed
+        stats["fps"] = frame_count / elapsed if elapsed > 0 else 0.0
+        stats["predict_calls"] = tracker.predict_calls - predict_calls_before
+        if gate is not None:
+            stats["gate"] = gate.counters()
+        stats["votes"] = voter.summary()
+
     if on_identity:
         on_identity(last_identity)
-    return last_identity, collected
+    return last_identity, collected, voter.summary()
+
+
+class RecognitionWorker:
+    """
+    后台人员检测线程：按固定节奏静默识别，把 (identity, people_set, votes) 放入结果队列。
+
+    识别出错时放入异常对象并退出，由界面线程决定如何处理。
+    """
+
+    def __init__(self, result_queue=None, interval_seconds=2.0, duration_seconds=1.0):
+        self.result_queue = result_queue if result_queue is not None else queue.Queue()
+        self.interval_seconds = interval_seconds
+        self.duration_seconds = duration_seconds
+        self._stop_event = threading.Event()
+        self._thread = None
+        # 跨轮次复用轨迹，座位上不动的学生无需每轮重新 predict
+        self.tracker = FaceTracker()
+        self.detector = FaceDetector(scale=0.5)
+        self.gate = MotionGate()
+        # duration_seconds 只是上限，身份稳定后即提前返回
+        self.voter = IdentityVoter()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="recognition-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                result = recognize_from_camera(
+                    duration_seconds=self.duration_seconds,
+                    silent=True,
+                    tracker=self.tracker,
+                    detector=self.detector,
+                    gate=self.gate,
+                    voter=self.voter,
+                )
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                self.result_queue.put(err)
+                return
+            if self._stop_event.is_set():
+                return
+            self.result_queue.put(result)
+            self._stop_event.wait(self.interval_seconds)
 
 
 if __name__ == "__main__":
-    recognize_from_camera()
+    import argparse
+
+    parser = add_source_arguments(argparse.ArgumentParser(description="摄像头/视频人脸识别"))
+    parser.add_argument("--duration", type=float, default=None, help="识别时长（秒），默认直到按 q 或来源读完")
+    parser.add_argument("--silent", action="store_true", help="不显示窗口（无界面环境下测速）")
+    parser.add_argument("--detect-scale", type=float, default=0.5, help="检测时的缩放比例，1 为原图")
+    parser.add_argument("--full-scan-interval", type=int, default=10, help="每隔多少帧全图重新检测")
+    parser.add_argument("--motion-gate", action="store_true", help="画面静止时跳过检测")
+    parser.add_argument("--early-exit", action="store_true", help="身份稳定后提前结束")
+    parser.add_argument("--backend", choices=BACKENDS, default="lbph", help="识别后端")
+    parser.add_argument("--shards", type=int, default=None, help="sharded 后端的进程数，默认等于 CPU 核数")
+    args = parser.parse_args()
+    if args.backend == "sharded":
+        set_recognizer_backend(args.backend, shards=args.shards)
+    else:
+        set_recognizer_backend(args.backend)
+    face_detector = FaceDetector(scale=args.detect_scale, full_scan_interval=args.full_scan_interval)
+    run_stats = {}
+    frame_source = None if args.source is None else open_source(args.source, realtime=args.realtime)
+    identity, people, votes = recognize_from_camera(
+        args.duration,
+        silent=args.silent,
+        source=frame_source,
+        stats=run_stats,
+        detector=face_detector,
+        gate=MotionGate() if args.motion_gate else None,
+        voter=IdentityVoter() if args.early_exit else None,
+    )
+    print(f"识别结果：{identity}，人员：{sorted(people)}")
+    print(f"处理 {run_stats['frames']} 帧，用时 {run_stats['seconds']:.2f}s，{run_stats['fps']:.1f} 帧/秒")
+    print(f"predict 调用 {run_stats['predict_calls']} 次")
+    if "gate" in run_stats:
+        print(f"运动门控：{run_stats['gate']}")
+    for name, info in votes.items():
+        print(f"{name}：{info['votes']} 票，平均置信度 {info['mean_confidence']:.2f}")
 
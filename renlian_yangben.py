@@ -0,0 +1,179 @@
+import json
+import os
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from renlian_yuchuli import FACE_SIZE, resize_face
+
+DEFAULT_SIZE = FACE_SIZE
+
+
+class FacePack:
+    """
+    打包的人脸样本集：所有样本统一缩放为 size（宽, 高）后连续存放。
+
+    <path>.u8      uint8 数组，第 i 个样本位于偏移 i * 高 * 宽 处
+    <path>.labels  int32 数组，第 i 个样本的编号
+    <path>.json    尺寸与 编号→姓名 字典
+
+    两个数据文件只追加写入，读取时用 numpy.memmap 零拷贝访问。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            header = json.load(f)
+        self.width, self.height = header["size"]
+        self.names: Dict[int, str] = {int(k): v for k, v in header["names"].items()}
+        self._images: Optional[np.memmap] = None
+        self._labels: Optional[np.memmap] = None
+        self._mapped_count = -1
+
+    @classmethod
+    def create(cls, path, size: Tuple[int, int] = DEFAULT_SIZE) -> "FacePack":
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        for ext in (".u8", ".labels"):
+            open(path + ext, "wb").close()
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump({"size": list(size), "names": {}}, f, ensure_ascii=False)
+        return cls(path)
+
+    @classmethod
+    def open_or_create(cls, path, size: Tuple[int, int] = DEFAULT_SIZE) -> "FacePack":
+        if os.path.exists(path + ".json"):
+            return cls(path)
+        return cls.create(path, size)
+
+    @property
+    def sample_bytes(self) -> int:
+        return self.width * self.height
+
+    def __len__(self) -> int:
+        # 追加可能中途中断，以两个文件中较少的样本数为准
+        images = os.path.getsize(self.path + ".u8") // self.sample_bytes
+        labels = os.path.getsize(self.path + ".labels") // 4
+        return min(images, labels)
+
+    def _map(self):
+        count = len(self)
+        if count != self._mapped_count:
+            if count == 0:
+                self._images = np.empty((0, self.height, self.width), dtype=np.uint8)
+                self._labels = np.empty(0, dtype=np.int32)
+            else:
+                self._images = np.memmap(self.path + ".u8", dtype=np.uint8, mode="r", shape=(count, self.height, self.width))
+                self._labels = np.memmap(self.path + ".labels", dtype=np.int32, mode="r", shape=(count,))
+            self._mapped_count = count
+
+    @property
+    def images(self) -> np.ndarray:
+        self._map()
+        return self._images
+
+    @property
+    def labels(self) -> np.ndarray:
+        self._map()
+        return self._labels
+
+    def normalize(self, gray: np.ndarray) -> np.ndarray:
+        return resize_face(gray, (self.width, self.height))
+
+    def _save_header(self):
+        tmp_path = self.path + ".json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"size": [self.width, self.height], "names": self.names}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path + ".json")
+
+    def append(self, images: Sequence[np.ndarray], label: int, name: Optional[str] = None) -> int:
+        """追加同一编号的一批样本，返回追加数量。"""
+        if name is not None and self.names.get(label) != name:
+            self.names[label] = name
+            self._save_header()
+        count = len(self)
+        # 先截掉上次中断留下的半截数据，保证两个文件对齐
+        for ext, unit in ((".u8", self.sample_bytes), (".labels", 4)):
+            with open(self.path + ext, "r+b") as f:
+                f.truncate(count * unit)
+        data = [self.normalize(img) for img in images]
+        with open(self.path + ".u8", "ab") as f:
+            for img in data:
+                f.write(img.tobytes())
+        with open(self.path + ".labels", "ab") as f:
+            f.write(np.full(len(data), label, dtype=np.int32).tobytes())
+        return len(data)
+
+    def label_for(self, name: str) -> int:
+        """姓名对应的编号，新姓名分配下一个编号。"""
+        for label, known in self.names.items():
+            if known == name:
+                return label
+        return max(self.names, default=-1) + 1
+
+    def iter_chunks(self, chunk_size: int = 1024) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """按块产出 (图像视图, 编号视图)，不复制数据。"""
+        images, labels = self.images, self.labels
+        for start in range(0, len(labels), chunk_size):
+            yield images[start:start + chunk_size], labels[start:start + chunk_size]
+
+    def import_folders(self, base_path) -> int:
+        """从 face_collect 的 <姓名>/<序号>.jpg 目录结构导入；已有姓名沿用原编号。"""
+        total = 0
+        for name in sorted(os.listdir(base_path)):
+            folder = os.path.join(base_path, name)
+            if not os.path.isdir(folder) or name.startswith("."):
+                continue
+            label = self.label_for(name)
+            images = []
+            for file_name in sorted(os.listdir(folder)):
+                if file_name.endswith(".jpg"):
+                    img = cv2.imdecode(np.fromfile(os.path.join(folder, file_name), dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+                    if img is not None:
+                        images.append(img)
+            if images:
+                total += self.append(images, label, name)
+        return total
+
+    def export_folders(self, out_dir) -> int:
+        """导出为 <姓名>/<序号>.jpg 目录结构。"""
+        counters: Dict[int, int] = {}
+        for img, label in zip(self.images, self.labels):
+            label = int(label)
+            folder = os.path.join(out_dir, self.names.get(label, str(label)))
+            os.makedirs(folder, exist_ok=True)
+            index = counters.get(label, 0)
+            counters[label] = index + 1
+            ok, buf = cv2.imencode(".jpg", np.asarray(img))
+            if ok:
+                buf.tofile(os.path.join(folder, "%d.jpg" % index))
+        return sum(counters.values())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="人脸样本打包工具")
+    parser.add_argument("pack", help="打包文件路径（不含扩展名）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_cmd = sub.add_parser("import", help="从采集目录导入")
+    import_cmd.add_argument("folder")
+    import_cmd.add_argument("--size", type=int, nargs=2, default=list(DEFAULT_SIZE), metavar=("W", "H"))
+    export_cmd = sub.add_parser("export", help="导出为采集目录结构")
+    export_cmd.add_argument("folder")
+    sub.add_parser("info", help="显示样本统计")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        pack = FacePack.open_or_create(args.pack, tuple(args.size))
+        print(f"导入 {pack.import_folders(args.folder)} 个样本")
+    else:
+        pack = FacePack(args.pack)
+        if args.command == "export":
+            print(f"导出 {pack.export_folders(args.folder)} 个样本")
+        else:
+            counts = np.bincount(pack.labels) if len(pack) else []
+            print(f"样本尺寸 {pack.width}x{pack.height}，共 {len(pack)} 个")
+            for label, name in sorted(pack.names.items()):
+                print(label, name, counts[label] if label < len(counts) else 0)
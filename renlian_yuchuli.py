@@ -0,0 +1,139 @@
+import json
+import math
+import os
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+EYE_CASCADE_PATH = os.path.join(os.path.dirname(__file__), "train", "haarcascade_eye.xml")
+FACE_SIZE = (100, 100)
+
+
+def resize_face(gray: np.ndarray, size: Tuple[int, int] = FACE_SIZE) -> np.ndarray:
+    """转灰度并缩放到 size（宽, 高）。"""
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+    if gray.shape[:2] != (size[1], size[0]):
+        interpolation = cv2.INTER_AREA if gray.shape[1] > size[0] else cv2.INTER_LINEAR
+        gray = cv2.resize(gray, size, interpolation=interpolation)
+    return np.ascontiguousarray(gray, dtype=np.uint8)
+
+
+@dataclass
+class PreprocessConfig:
+    """人脸预处理参数，训练与识别必须一致，随模型一起保存。size 为 None 时不缩放。"""
+
+    size: Optional[Tuple[int, int]] = FACE_SIZE
+    equalize: bool = False
+    align: bool = False
+
+    @classmethod
+    def passthrough(cls) -> "PreprocessConfig":
+        """不做任何处理（只转灰度），与引入预处理之前训练的模型一致。"""
+        return cls(None, False, False)
+
+    @classmethod
+    def load(cls, path) -> "PreprocessConfig":
+        # 旧模型旁没有 preprocess.json，训练时用的是原始人脸区域，识别时也不能缩放
+        if not os.path.exists(path):
+            return cls.passthrough()
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        size = data.get("size", FACE_SIZE)
+        return cls(tuple(size) if size is not None else None, bool(data.get("equalize", False)), bool(data.get("align", False)))
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f)
+        os.replace(tmp_path, path)
+
+    def key(self) -> str:
+        size = "raw" if self.size is None else "%dx%d" % tuple(self.size)
+        return "%s-eq%d-al%d" % (size, self.equalize, self.align)
+
+
+class FacePreprocessor:
+    """
+    采集、训练与识别共用的人脸预处理：可选双眼对齐 → 缩放到固定尺寸 → 可选直方图均衡。
+
+    固定尺寸后每张人脸的 LBPH 计算量恒定，不再随人离摄像头远近变化。
+    """
+
+    def __init__(self, config: Optional[PreprocessConfig] = None, eye_cascade_path=EYE_CASCADE_PATH):
+        self.config = config or PreprocessConfig()
+        self.eye_cascade_path = eye_cascade_path
+        self._eye_cascade = None
+
+    def _eyes(self):
+        if self._eye_cascade is None:
+            cascade = cv2.CascadeClassifier(self.eye_cascade_path)
+            if cascade.empty():
+                raise FileNotFoundError(f"未找到人眼分类器：{self.eye_cascade_path}")
+            self._eye_cascade = cascade
+        return self._eye_cascade
+
+    def align(self, gray: np.ndarray) -> np.ndarray:
+        """在人脸上半部分找两只眼睛，旋转使双眼连线水平；找不到时原样返回。"""
+        h, w = gray.shape[:2]
+        upper = gray[: int(h * 0.6), :]
+        min_eye = max(8, w // 8)
+        eyes = self._eyes().detectMultiScale(upper, scaleFactor=1.1, minNeighbors=5, minSize=(min_eye, min_eye))
+        if len(eyes) < 2:
+            return gray
+        eyes = sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2]
+        (x1, y1, w1, h1), (x2, y2, w2, h2) = sorted(eyes, key=lambda e: e[0])
+        left = (x1 + w1 / 2.0, y1 + h1 / 2.0)
+        right = (x2 + w2 / 2.0, y2 + h2 / 2.0)
+        angle = math.degrees(math.atan2(right[1] - left[1], right[0] - left[0]))
+        if abs(angle) < 1.0 or abs(angle) > 30.0:
+            return gray
+        matrix = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), angle, 1.0)
+        return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    def __call__(self, gray: np.ndarray) -> np.ndarray:
+        if gray.ndim == 3:
+            gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+        if self.config.align:
+            gray = self.align(gray)
+        if self.config.size is None:
+            face = np.ascontiguousarray(gray, dtype=np.uint8)
+        else:
+            face = resize_face(gray, self.config.size)
+        if self.config.equalize:
+            face = cv2.equalizeHist(face)
+        return face
+
+    def crop(self, gray: np.ndarray, box) -> np.ndarray:
+        """从整帧灰度图中截取 box=(x, y, w, h) 并预处理。"""
+        x, y, w, h = box
+        return self(gray[y : y + h, x : x + w])
+
+
+def sharpness(gray: np.ndarray) -> float:
+    """拉普拉斯方差，数值越小图像越模糊。"""
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def dhash(gray: np.ndarray, hash_size: int = 8) -> int:
+    """差值感知哈希：相邻像素亮度比较得到 hash_size² 位整数。"""
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def add_preprocess_arguments(parser):
+    parser.add_argument("--face-size", type=int, nargs=2, default=list(FACE_SIZE), metavar=("W", "H"), help="人脸统一尺寸")
+    parser.add_argument("--equalize", action="store_true", help="直方图均衡")
+    parser.add_argument("--align", action="store_true", help="按双眼位置对齐")
+    return parser
+
+
+def config_from_args(args) -> PreprocessConfig:
+    return PreprocessConfig(tuple(args.face_size), args.equalize, args.align)
@@ -0,0 +1,178 @@
+import os
+from typing import Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from lbp_suoyin import HistogramStore, LBPHistogramIndex
+from renlian_moxing import FACE_LIST_PATH, HISTOGRAM_DIR, PREPROCESS_PATH, SNAPSHOT_DIR, TRAINER_PATH
+from renlian_yuchuli import FacePreprocessor, PreprocessConfig
+
+
+class FaceRoster:
+    """
+    face_list.txt 的读写：每行 "编号 姓名"，编号只增不减。
+
+    删除的身份写成 "# removed 编号 姓名" 注释行保留下来，保证编号永不复用；
+    np.loadtxt 会跳过注释，旧的读取代码不受影响。
+    """
+
+    def __init__(self, path=FACE_LIST_PATH):
+        self.path = path
+        self.entries: Dict[int, str] = {}
+        self.removed: Dict[int, str] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 4 and parts[0] == "#" and parts[1] == "removed":
+                        self.removed[int(parts[2])] = parts[3]
+                    elif len(parts) >= 2 and not parts[0].startswith("#"):
+                        self.entries[int(parts[0])] = parts[1]
+
+    def find(self, name) -> Optional[int]:
+        for face_id, face_name in self.entries.items():
+            if face_name == name:
+                return face_id
+        return None
+
+    def next_id(self) -> int:
+        used = list(self.entries) + list(self.removed)
+        return max(used) + 1 if used else 0
+
+    def add(self, name) -> int:
+        """追加一个身份，只在文件末尾写一行。"""
+        if " " in name or not name:
+            raise ValueError("姓名不能为空且不能包含空格")
+        existing = self.find(name)
+        if existing is not None:
+            return existing
+        face_id = self.next_id()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("%d %s\n" % (face_id, name))
+        self.entries[face_id] = name
+        return face_id
+
+    def remove(self, name) -> Optional[int]:
+        face_id = self.find(name)
+        if face_id is None:
+            return None
+        del self.entries[face_id]
+        self.removed[face_id] = name
+        self._rewrite()
+        return face_id
+
+    def _rewrite(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for face_id in sorted(self.entries):
+                f.write("%d %s\n" % (face_id, self.entries[face_id]))
+            for face_id in sorted(self.removed):
+                f.write("# removed %d %s\n" % (face_id, self.removed[face_id]))
+        os.replace(tmp_path, self.path)
+
+
+def load_face_images(folder) -> List[np.ndarray]:
+    """读取 face_collect 采集的 .jpg 人脸图并转为灰度。"""
+    images = []
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".jpg"):
+            img = cv2.imdecode(np.fromfile(os.path.join(folder, name), dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                images.append(img)
+    return images
+
+
+class FaceEnrollment:
+    """
+    增量注册：新增/删除一个身份时只计算该身份的直方图并写入对应的 <id>.npy，
+    不再重新训练全校模型。识别端（包括默认的 lbph 后端）直接由直方图库建立索引，
+    通过模型注册表的 mtime 检测自动热加载。
+
+    trainer.yml 与二进制快照只能整体重写，默认不更新；需要给直接读取 trainer.yml 的旧脚本使用时，
+    批量注册完成后调用一次 export_model()，或传入 sync_yaml=True 每次注册都重写。
+    """
+
+    def __init__(
+        self,
+        roster_path=FACE_LIST_PATH,
+        store_dir=HISTOGRAM_DIR,
+        trainer_path=TRAINER_PATH,
+        sync_yaml=False,
+        preprocess_path=PREPROCESS_PATH,
+        snapshot_dir=SNAPSHOT_DIR,
+    ):
+        self.roster = FaceRoster(roster_path)
+        self.store = HistogramStore(store_dir)
+        # 与识别端读取同一份预处理参数；全新的模型（还没有 trainer.yml 与直方图库）使用默认的固定尺寸并保存
+        if not os.path.exists(preprocess_path) and not self.store.exists() and not os.path.exists(trainer_path):
+            PreprocessConfig().save(preprocess_path)
+        self.preprocessor = FacePreprocessor(PreprocessConfig.load(preprocess_path))
+        self.trainer_path = trainer_path
+        self.snapshot_dir = snapshot_dir
+        self.sync_yaml = sync_yaml
+        if not self.store.exists() and os.path.exists(trainer_path):
+            self._import_trainer()
+
+    def _import_trainer(self):
+        """首次使用时把已有 trainer.yml 拆分为按身份的直方图文件。"""
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(self.trainer_path)
+        self.store.import_index(LBPHistogramIndex.from_recognizer(recognizer))
+
+    def enroll(self, name, images: Sequence[np.ndarray]) -> int:
+        if len(images) == 0:
+            raise ValueError(f"{name} 没有可用的人脸图片")
+        images = [self.preprocessor(img) for img in images]
+        face_id = self.roster.add(name)
+        histograms = self.store.compute(images)
+        self.store.append(face_id, histograms)
+        if self.sync_yaml:
+            self.export_model()
+        return face_id
+
+    def remove(self, name) -> Optional[int]:
+        face_id = self.roster.remove(name)
+        if face_id is None:
+            return None
+        self.store.remove(face_id)
+        if self.sync_yaml:
+            self.export_model()
+        return face_id
+
+    def export_model(self):
+        """由直方图库整体重写 trainer.yml 与二进制快照（批量步骤，不需要重新解码图片）。"""
+        index = self.store.build_index()
+        # 快照在 trainer.yml 之后写入，mtime 不早于 trainer.yml，识别端才会优先使用
+        index.save_lbph_yaml(self.trainer_path)
+        index.save_snapshot(self.snapshot_dir)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="增量注册/删除人脸身份")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add_cmd = sub.add_parser("add", help="注册一个身份（或为已有身份追加样本）")
+    add_cmd.add_argument("name")
+    add_cmd.add_argument("folder", help="face_collect 采集的图片目录")
+    remove_cmd = sub.add_parser("remove", help="删除一个身份")
+    remove_cmd.add_argument("name")
+    sub.add_parser("list", help="列出已注册身份")
+    sub.add_parser("export", help="由直方图库重写 trainer.yml 与二进制快照")
+    parser.add_argument("--sync-yaml", action="store_true", help="每次注册/删除后都重写 trainer.yml 与快照")
+    args = parser.parse_args()
+
+    enrollment = FaceEnrollment(sync_yaml=args.sync_yaml)
+    if args.command == "add":
+        new_id = enrollment.enroll(args.name, load_face_images(args.folder))
+        print(f"已注册 {args.name}，编号 {new_id}")
+    elif args.command == "remove":
+        old_id = enrollment.remove(args.name)
+        print(f"已删除 {args.name}（编号 {old_id}）" if old_id is not None else f"未找到 {args.name}")
+    elif args.command == "export":
+        enrollment.export_model()
+        print(f"已写出 {enrollment.trainer_path}")
+    else:
+        for fid, fname in sorted(enrollment.roster.entries.items()):
+            print(fid, fname)
@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class CameraService:
+    """
+    长驻摄像头采集服务：设备只打开一次，后台线程持续读帧写入定长环形缓冲区。
+
+    消费者拿到的是最新帧的引用，默认不复制；需要在帧上绘制时请传 copy=True。
+    缓冲区只保留最近几帧，读取总是跳到最新一帧，旧帧直接丢弃。
+    """
+
+    def __init__(self, device=0, buffer_size: int = 2):
+        self.device = device
+        self.buffer_size = max(1, buffer_size)
+        self._buffer: deque = deque(maxlen=self.buffer_size)
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._cap = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        # 每个读取线程各自记录读到的序号，互不抢帧
+        self._reader_state = threading.local()
+        self.dropped_frames = 0
+
+    def start(self):
+        if self._running:
+            return self
+        cap = cv2.VideoCapture(self.device)
+        if not cap.isOpened():
+            cap.release()
+            raise RuntimeError("无法打开摄像头")
+        self._cap = cap
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"camera-{self.device}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running:
+            ok, frame = self._cap.read()
+            if not ok:
+                time.sleep(0.01)
+                continue
+            with self._cond:
+                self._seq += 1
+                if len(self._buffer) == self.buffer_size:
+                    self.dropped_frames += 1
+                self._buffer.append((self._seq, frame))
+                self._cond.notify_all()
+
+    def isOpened(self) -> bool:  # pylint: disable=invalid-name
+        return self._running
+
+    def wait_frame(self, after_seq: int = 0, timeout: float = 1.0) -> Tuple[int, Optional[np.ndarray]]:
+        """等待序号大于 after_seq 的帧，返回 (序号, 最新帧)；超时返回 (after_seq, None)。"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._buffer or self._buffer[-1][0] <= after_seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._running:
+                    return after_seq, None
+                self._cond.wait(remaining)
+            return self._buffer[-1]
+
+    def latest(self, copy: bool = False, timeout: float = 1.0) -> Optional[np.ndarray]:
+        """返回当前最新帧（可能与上次相同）。"""
+        _, frame = self.wait_frame(0, timeout)
+        if frame is not None and copy:
+            frame = frame.copy()
+        return frame
+
+    def read(self, copy: bool = False, timeout: float = 1.0) -> Tuple[bool, Optional[np.ndarray]]:
+        """与 cv2.VideoCapture.read 相同的返回形式，但总是给出尚未读取过的最新帧。"""
+        last_seq = getattr(self._reader_state, "seq", 0)
+        seq, frame = self.wait_frame(last_seq, timeout)
+        if frame is None:
+            return False, None
+        self._reader_state.seq = seq
+        if copy:
+            frame = frame.copy()
+        return True, frame
+
+    def frames(
+        self, copy: bool = False, timeout: float = 1.0, stall_timeout: Optional[float] = 5.0
+    ) -> Iterator[np.ndarray]:
+        """
+        逐帧迭代，消费者处理慢时自动跳过积压的旧帧。
+        服务停止，或连续 stall_timeout 秒没有新帧（摄像头断开）时结束；stall_timeout=None 时一直等待。
+        """
+        seq = 0
+        last_frame_at = time.monotonic()
+        while self._running:
+            new_seq, frame = self.wait_frame(seq, timeout)
+            if frame is None:
+                if stall_timeout is not None and time.monotonic() - last_frame_at >= stall_timeout:
+                    return
+                continue
+            seq = new_seq
+            last_frame_at = time.monotonic()
+            yield frame.copy() if copy else frame
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        self._buffer.clear()
+
+    # 与 VideoCapture 保持一致，便于替换
+    release = stop
+
+
+_cameras: Dict[object, CameraService] = {}
+_cameras_lock = threading.Lock()
+
+
+def get_camera(device=0, buffer_size: int = 2) -> CameraService:
+    """获取（必要时启动）进程内共享的摄像头服务。"""
+    with _cameras_lock:
+        camera = _cameras.get(device)
+        if camera is None or not camera.isOpened():
+            camera = CameraService(device, buffer_size).start()
+            _cameras[device] = camera
+        return camera
+
+
+def release_all_cameras():
+    """关闭所有摄像头服务，程序退出时调用。"""
+    with _cameras_lock:
+        cameras = list(_cameras.values())
+        _cameras.clear()
+    for camera in cameras:
+        camera.stop()
+
+
+if __name__ == "__main__":
+    cam = get_camera()
+    count = 0
+    start = time.monotonic()
+    for img in cam.frames():
+        count += 1
+        if count >= 60:
+            break
+    print(f"读取 {count} 帧，用时 {time.monotonic() - start:.2f}s，丢弃 {cam.dropped_frames} 帧")
+    release_all_cameras()
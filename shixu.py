@@ -0,0 +1,262 @@
+import csv
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from kongzhiluoji import AC_STATES, LIGHT_STATES
+
+# 定长记录，22 字节/条：毫秒时间戳、教室编号、温度、光照、人数、空调/照明状态编码
+RECORD_DTYPE = np.dtype(
+    [
+        ("ts", "<i8"),
+        ("room", "<u2"),
+        ("temperature", "<f4"),
+        ("light", "<f4"),
+        ("people", "<u2"),
+        ("ac", "u1"),
+        ("lighting", "u1"),
+    ]
+)
+META_FILE = "meta.json"
+SEGMENT_RECORDS = 1 << 20
+
+
+def to_epoch_ms(value) -> int:
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000)
+    return int(value)
+
+
+class TimeSeriesLog:
+    """
+    环境数据的二进制时序日志：目录下按时间顺序的定长记录段 seg-<首条时间戳>.bin，
+    教室名与控制状态的编码表写在 meta.json。
+
+    段文件只追加；读取时用 numpy.memmap 映射，按时间戳二分查找后直接切片，不复制数据。
+    记录须按时间顺序追加（与实时采样一致）。
+    """
+
+    def __init__(self, directory, segment_records: int = SEGMENT_RECORDS):
+        self.directory = directory
+        self.segment_records = segment_records
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        else:
+            meta = {"rooms": [], "ac": list(AC_STATES), "lighting": list(LIGHT_STATES)}
+        self.rooms: List[str] = meta["rooms"]
+        self.enums: Dict[str, List[str]] = {"ac": meta["ac"], "lighting": meta["lighting"]}
+        self._lock = threading.Lock()
+        self._file = None
+        self._segment_count = 0
+
+    def _save_meta(self):
+        tmp_path = os.path.join(self.directory, META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"rooms": self.rooms, **self.enums}, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.directory, META_FILE))
+
+    def _code(self, table: List[str], value: str) -> int:
+        # 新出现的教室或状态追加到编码表末尾，已有编码不变
+        try:
+            return table.index(value)
+        except ValueError:
+            table.append(value)
+            self._save_meta()
+            return len(table) - 1
+
+    def room_id(self, room: str) -> int:
+        return self._code(self.rooms, room)
+
+    def segments(self) -> List[str]:
+        names = [name for name in os.listdir(self.directory) if name.startswith("seg-") and name.endswith(".bin")]
+        return [os.path.join(self.directory, name) for name in sorted(names, key=lambda n: int(n[4:-4]))]
+
+    @staticmethod
+    def _segment_start(path) -> int:
+        return int(os.path.basename(path)[4:-4])
+
+    def _open_segment(self, first_ts: int):
+        segments = self.segments()
+        if segments:
+            last = segments[-1]
+            count = os.path.getsize(last) // RECORD_DTYPE.itemsize
+            if count < self.segment_records:
+                # 截掉异常退出留下的半条记录
+                with open(last, "r+b") as f:
+                    f.truncate(count * RECORD_DTYPE.itemsize)
+                self._file = open(last, "ab")
+                self._segment_count = count
+                return
+        self._file = open(os.path.join(self.directory, f"seg-{first_ts}.bin"), "ab")
+        self._segment_count = 0
+
+    def encode(self, room: str, timestamp, data, controls) -> np.ndarray:
+        record = np.zeros(1, dtype=RECORD_DTYPE)
+        record["ts"] = to_epoch_ms(timestamp)
+        record["room"] = self.room_id(room)
+        record["temperature"] = data["temperature"]
+        record["light"] = data["light"]
+        record["people"] = data["people"]
+        record["ac"] = self._code(self.enums["ac"], controls["空调"])
+        record["lighting"] = self._code(self.enums["lighting"], controls["照明"])
+        return record
+
+    def append(self, room: str, timestamp, data, controls):
+        self.append_records(self.encode(room, timestamp, data, controls))
+
+    def append_records(self, records: np.ndarray):
+        """
+        追加已编码的记录数组，写满一段后自动开新段。
+        每批写完即 flush 到操作系统：程序崩溃不丢已追加的记录，其他进程也能立即读到。
+        """
+        records = np.ascontiguousarray(records, dtype=RECORD_DTYPE)
+        with self._lock:
+            self._append_locked(records)
+            self._file.flush()
+
+    def _append_locked(self, records: np.ndarray):
+        start = 0
+        while start < len(records):
+            if self._file is None:
+                self._open_segment(int(records[start]["ts"]))
+            elif self._segment_count >= self.segment_records:
+                # 当前段已满，新段以下一条记录的时间戳命名
+                self._file.close()
+                self._file = open(os.path.join(self.directory, f"seg-{int(records[start]['ts'])}.bin"), "ab")
+                self._segment_count = 0
+            take = min(len(records) - start, self.segment_records - self._segment_count)
+            self._file.write(records[start : start + take].tobytes())
+            self._segment_count += take
+            start += take
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def iter_range(self, start=None, end=None) -> Iterator[np.ndarray]:
+        """逐段产出 [start, end) 内记录的零拷贝视图；整段不在范围内的段不会被映射。"""
+        self.flush()
+        start_ms = None if start is None else to_epoch_ms(start)
+        end_ms = None if end is None else to_epoch_ms(end)
+        segments = self.segments()
+        for k, path in enumerate(segments):
+            if end_ms is not None and self._segment_start(path) >= end_ms:
+                break
+            if start_ms is not None and k + 1 < len(segments) and self._segment_start(segments[k + 1]) <= start_ms:
+                continue
+            count = os.path.getsize(path) // RECORD_DTYPE.itemsize
+            if count == 0:
+                continue
+            records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+            lo = 0 if start_ms is None else int(np.searchsorted(records["ts"], start_ms, side="left"))
+            hi = count if end_ms is None else int(np.searchsorted(records["ts"], end_ms, side="left"))
+            if hi > lo:
+                yield records[lo:hi]
+
+    def range(self, start=None, end=None, room: Optional[str] = None) -> np.ndarray:
+        """[start, end) 内的记录；room 指定时只保留该教室。"""
+        parts = list(self.iter_range(start, end))
+        if not parts:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        records = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        if room is not None:
+            if room not in self.rooms:
+                return np.empty(0, dtype=RECORD_DTYPE)
+            records = records[records["room"] == self.rooms.index(room)]
+        return records
+
+    def decode(self, record) -> dict:
+        """把一条记录还原为与 CSV 相同含义的字典。"""
+        return {
+            "时间": datetime.fromtimestamp(int(record["ts"]) / 1000).strftime("%Y-%m-%d %H:%M:%S"),
+            "教室": self.rooms[int(record["room"])],
+            "温度": round(float(record["temperature"]), 1),
+            "光照": float(record["light"]),
+            "人员数": int(record["people"]),
+            "空调": self.enums["ac"][int(record["ac"])],
+            "照明": self.enums["lighting"][int(record["lighting"])],
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert_csv(csv_path, log: TimeSeriesLog, date=None, batch_size=10000) -> int:
+    """
+    把 classroom_data.csv 转为二进制日志。CSV 的时间只有 "时:分:秒"，
+    日期默认取文件修改日期，时间倒退时视为跨过零点进入下一天。
+    """
+    if date is None:
+        date = datetime.fromtimestamp(os.path.getmtime(csv_path)).strftime("%Y-%m-%d")
+    day = datetime.strptime(date, "%Y-%m-%d")
+    previous = None
+    batch = []
+    total = 0
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) < 7:
+                continue
+            if len(row[0]) > 8:
+                moment = datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S")
+            else:
+                moment = datetime.combine(day.date(), datetime.strptime(row[0], "%H:%M:%S").time())
+                if previous is not None and moment < previous:
+                    day += timedelta(days=1)
+                    moment += timedelta(days=1)
+            previous = moment
+            data = {"temperature": float(row[2]), "light": float(row[3]), "people": int(float(row[4]))}
+            batch.append(log.encode(row[1], moment, data, {"空调": row[5], "照明": row[6]}))
+            if len(batch) >= batch_size:
+                log.append_records(np.concatenate(batch))
+                total += len(batch)
+                batch = []
+    if batch:
+        log.append_records(np.concatenate(batch))
+        total += len(batch)
+    log.flush()
+    return total
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="环境数据二进制时序日志")
+    parser.add_argument("log", help="日志目录")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert_cmd = sub.add_parser("convert", help="由 classroom_data.csv 转换")
+    convert_cmd.add_argument("csv")
+    convert_cmd.add_argument("--date", default=None, help="CSV 首行的日期（YYYY-MM-DD），默认取文件修改日期")
+    query_cmd = sub.add_parser("query", help="按时间范围查询")
+    query_cmd.add_argument("--start", default=None, help="YYYY-MM-DD HH:MM:SS")
+    query_cmd.add_argument("--end", default=None, help="YYYY-MM-DD HH:MM:SS")
+    query_cmd.add_argument("--room", default=None)
+    args = parser.parse_args()
+
+    with TimeSeriesLog(args.log) as ts_log:
+        if args.command == "convert":
+            print(f"转换 {convert_csv(args.csv, ts_log, args.date)} 条记录")
+        else:
+            parse = lambda text: datetime.strptime(text, "%Y-%m-%d %H:%M:%S") if text else None
+            found = ts_log.range(parse(args.start), parse(args.end), args.room)
+            for item in found[:20]:
+                print(ts_log.decode(item))
+            print(f"共 {len(found)} 条，{found.nbytes} 字节")
@@ -1,16 +1,28 @@
 
 import csv
 import os
+import threading
 from datetime import datetime
 
+from fenqu import PartitionedLog, get_partitioned_log
+from shujuku import full_timestamp, get_store
+
 FIELDNAMES = ["时间", "教室", "温度", "光照", "人员数", "空调", "照明"]
 SIGN_FIELDNAMES = ["时间", "姓名", "来源"]
+# 分区目录中签到记录不区分教室，统一使用该分区键
+SIGN_PARTITION_KEY = "sign"
+# 存储后端：csv 为单个 CSV 文件，sqlite 为数据库文件（见 shujuku.py），partitioned 为分区目录（见 fenqu.py）
+BACKENDS = ("csv", "sqlite", "partitioned")
 
 
-def append_environment_record(csv_path, room, timestamp, data, controls):
-    """将监测数据追加写入 CSV 文件。"""
-    file_exists = os.path.exists(csv_path)
-    row = [
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的存储后端：{backend}，可选 {', '.join(BACKENDS)}")
+    return backend
+
+
+def _environment_row(room, timestamp, data, controls):
+    return [
         timestamp,
         room,
         data["temperature"],
@@ -19,6 +31,28 @@ def append_environment_record(csv_path, room, timestamp, data, controls):
         controls["空调"],
         controls["照明"],
     ]
+
+
+def _dated_row(row, moment):
+    # CSV 中只有 "时:分:秒"，入库时用采样时刻的日期补全，跨午夜的批次也不会记错日期
+    return [full_timestamp(str(row[0]), moment.strftime("%Y-%m-%d")), *row[1:]]
+
+
+def append_environment_record(csv_path, room, timestamp, data, controls, moment=None, backend="csv"):
+    """
+    将监测数据追加写入 csv_path，backend 指定存储后端（见 BACKENDS）。
+    moment 为采样时刻，SQLite 与分区按它补日期、选分区，缺省为当前时间。
+    """
+    _check_backend(backend)
+    row = _environment_row(room, timestamp, data, controls)
+    moment = moment or datetime.now()
+    if backend == "sqlite":
+        get_store(csv_path).insert_environment([_dated_row(row, moment)])
+        return
+    if backend == "partitioned":
+        get_partitioned_log(csv_path, FIELDNAMES).append(room, row, moment)
+        return
+    file_exists = os.path.exists(csv_path)
     with open(csv_path, "a", newline="", encoding="utf-8-sig") as f:
         writer = csv.writer(f)
         if not file_exists:
@@ -26,24 +60,153 @@ def append_environment_record(csv_path, room, timestamp, data, controls):
         writer.writerow(row)
 
 
-def append_sign_record(csv_path, student_name, source="二维码"):
-    """记录学生签到信息。"""
-    file_exists = os.path.exists(csv_path)
+class EnvironmentRecordWriter:
+    """
+    环境数据的缓冲写入器：文件句柄常驻，记录先放入内存，
+    由后台线程在积累 flush_rows 条或距上次写入超过 flush_interval 秒时批量写盘。
+
+    immediate=True 时逐条写入并落盘，适合不能丢失的数据：CSV 与分区文件 fsync，
+    SQLite 以 synchronous=FULL 提交。
+    backend 为 "sqlite" 时每批记录在一个事务中插入；为 "partitioned" 时按教室写入采样当天的分区。
+    取出批次与写盘在同一把锁内完成，界面线程的 flush() 与后台线程不会写出乱序的批次。
+    日期在 append() 时随记录一起确定，而不是在写盘时，午夜前采集、午夜后写盘的记录仍属于前一天。
+    退出前必须调用 close()，否则缓冲中的记录会丢失。
+    """
+
+    def __init__(self, csv_path, flush_rows=50, flush_interval=5.0, immediate=False, backend="csv"):
+        self.csv_path = csv_path
+        self.backend = _check_backend(backend)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.immediate = immediate
+        self._buffer = []
+        self._file = None
+        self._writer = None
+        self._closed = False
+        self._cond = threading.Condition()
+        # 取批次与写盘单独加锁，后台写盘时界面线程仍可继续 append
+        self._io_lock = threading.Lock()
+        self._thread = None
+        if not immediate:
+            self._thread = threading.Thread(target=self._run, name="environment-writer", daemon=True)
+            self._thread.start()
+
+    def _open(self):
+        if self._file is None:
+            new_file = not os.path.exists(self.csv_path) or os.path.getsize(self.csv_path) == 0
+            self._file = open(self.csv_path, "a", newline="", encoding="utf-8-sig")
+            self._writer = csv.writer(self._file)
+            if new_file:
+                self._writer.writerow(FIELDNAMES)
+
+    def append(self, room, timestamp, data, controls, moment=None):
+        """moment 为采样时刻，缺省为当前时间。"""
+        row = _environment_row(room, timestamp, data, controls)
+        moment = moment or datetime.now()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("环境数据写入器已关闭")
+            self._buffer.append((row, moment))
+            if not self.immediate:
+                if len(self._buffer) >= self.flush_rows:
+                    self._cond.notify()
+                return
+        self._drain(sync=True)
+
+    def _drain(self, sync=False):
+        # 取出与写出在同一把锁内完成，先取出的批次一定先写入
+        with self._io_lock:
+            with self._cond:
+                entries, self._buffer = self._buffer, []
+            self._write(entries, sync)
+
+    def _write(self, entries, sync=False):
+        if not entries:
+            return
+        if self.backend == "sqlite":
+            rows = [_dated_row(row, moment) for row, moment in entries]
+            get_store(self.csv_path).insert_environment(rows, sync=sync)
+            return
+        if self.backend == "partitioned":
+            log = get_partitioned_log(self.csv_path, FIELDNAMES)
+            groups = {}
+            for row, moment in entries:
+                groups.setdefault((row[1], moment.date()), (moment, []))[1].append(row)
+            for (room, _), (moment, rows) in groups.items():
+                log.append_many(room, rows, moment, sync=sync)
+            return
+        self._open()
+        self._writer.writerows(row for row, _ in entries)
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._buffer) < self.flush_rows:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self._drain()
+            if closed:
+                return
+
+    def flush(self):
+        """立即把缓冲中的记录写入文件。"""
+        self._drain(sync=self.immediate)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def append_sign_record(csv_path, student_name, source="二维码", backend="csv"):
+    """记录学生签到信息，返回写入的签到时间字符串。"""
+    _check_backend(backend)
     row = [
         datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         student_name,
         source,
     ]
-    with open(csv_path, "a", newline="", encoding="utf-8-sig") as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(SIGN_FIELDNAMES)
-        writer.writerow(row)
+    if backend == "sqlite":
+        get_store(csv_path).insert_sign([row])
+    elif backend == "partitioned":
+        get_partitioned_log(csv_path, SIGN_FIELDNAMES).append(SIGN_PARTITION_KEY, row)
+    else:
+        file_exists = os.path.exists(csv_path)
+        with open(csv_path, "a", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            if not file_exists:
+                writer.writerow(SIGN_FIELDNAMES)
+            writer.writerow(row)
+    return row[0]
 
-def load_sign_names(csv_path):
+def load_sign_names(csv_path, backend="csv"):
     """
     从签到 CSV 中加载历史记录，格式为 '时间 姓名' 的字符串列表。
     """
+    _check_backend(backend)
+    if backend == "sqlite":
+        return [f"{time_str}  {name}" for time_str, name in get_store(csv_path).sign_names()]
+    if backend == "partitioned":
+        log = get_partitioned_log(csv_path, SIGN_FIELDNAMES)
+        return [f"{row[0]}  {row[1]}" for row in log.read(key=SIGN_PARTITION_KEY) if len(row) >= 2]
     if not os.path.exists(csv_path):
         return []
     records = []
@@ -58,15 +221,234 @@ def load_sign_names(csv_path):
                 time_str, name = row[0], row[1]
                 records.append(f"{time_str}  {name}")
     return records
-def clear_sign_records(csv_path):
-    if os.path.exists(csv_path):
+class SignHistoryReader:
+    """
+    从文件末尾倒序分页读取签到记录：newest() 取最新一页，older() 依次取更早的一页。
+
+    每次只向前读取够一页的字节块，耗时与历史总长度无关；游标为下一页的结束字节偏移。
+    """
+
+    BLOCK_SIZE = 64 * 1024
+
+    def __init__(self, csv_path, page_size=50, backend="csv"):
+        self.csv_path = csv_path
+        self.page_size = page_size
+        self._data_start = 0
+        self._cursor = 0
+        # SQLite 后端以 rowid 为游标；分区目录以分区文件为单位从新到旧读取
+        _check_backend(backend)
+        self._sqlite = backend == "sqlite"
+        self._partitioned = backend == "partitioned"
+        self._files = []
+        self._rows = []
+        if self._sqlite:
+            self._cursor = None
+        elif self._partitioned:
+            self.newest_files()
+        else:
+            self._sync_csv()
+
+    def _sync_csv(self):
+        """游标移到文件末尾；读者可能先于 CSV 创建，表头长度在文件出现后才能确定。"""
+        if not os.path.exists(self.csv_path):
+            return
+        with open(self.csv_path, "rb") as f:
+            # 跳过表头（含 BOM）
+            self._data_start = len(f.readline())
+            f.seek(0, os.SEEK_END)
+            self._cursor = f.tell()
+
+    def newest_files(self):
+        log = get_partitioned_log(self.csv_path, SIGN_FIELDNAMES)
+        log.flush()
+        self._files = log.partitions(key=SIGN_PARTITION_KEY)
+        self._rows = []
+
+    @property
+    def has_more(self):
+        if self._sqlite:
+            return self._cursor is None or self._cursor > 1
+        if self._partitioned:
+            return bool(self._rows or self._files)
+        return self._cursor > self._data_start
+
+    def newest(self):
+        if self._sqlite:
+            self._cursor = None
+        elif self._partitioned:
+            self.newest_files()
+        else:
+            self._sync_csv()
+        return self.older()
+
+    def older(self):
+        """返回更早的一页（按时间正序），没有更多记录时返回空列表。"""
+        if not self.has_more:
+            return []
+        if self._sqlite:
+            page, self._cursor = get_store(self.csv_path).sign_page(self.page_size, self._cursor)
+            return [f"{time_str}  {name}" for time_str, name in page]
+        if self._partitioned:
+            # 分区按大小轮转，单个分区整体读入，够一页即停
+            while len(self._rows) < self.page_size and self._files:
+                path = self._files.pop()
+                try:
+                    with PartitionedLog.open_text(path) as f:
+                        reader = csv.reader(f)
+                        next(reader, None)
+                        self._rows = [row for row in reader if len(row) >= 2] + self._rows
+                except FileNotFoundError:
+                    continue
+            page = self._rows[-self.page_size :]
+            del self._rows[-self.page_size :]
+            return [f"{row[0]}  {row[1]}" for row in page]
+        with open(self.csv_path, "rb") as f:
+            end = pos = self._cursor
+            buf = b""
+            while pos > self._data_start and buf.count(b"\n") <= self.page_size:
+                step = min(self.BLOCK_SIZE, pos - self._data_start)
+                pos -= step
+                f.seek(pos)
+                buf = f.read(step) + buf
+        lines = buf.split(b"\n")
+        # 第一行可能不完整（块边界落在行中间），留给下一页
+        start = pos
+        if pos > self._data_start:
+            start += len(lines[0]) + 1
+            lines = lines[1:]
+        offsets = []
+        offset = start
+        for line in lines:
+            offsets.append(offset)
+            offset += len(line) + 1
+        keep = [k for k, line in enumerate(lines) if line.strip()][-self.page_size :]
+        self._cursor = offsets[keep[0]] if keep else start
+        if end == start:
+            self._cursor = self._data_start
+        records = []
+        for row in csv.reader(lines[k].decode("utf-8", errors="ignore") for k in keep):
+            if len(row) >= 2:
+                records.append(f"{row[0]}  {row[1]}")
+        return records
+
+
+def load_recent_sign_names(csv_path, limit=50, backend="csv"):
+    """只读取最新的 limit 条签到记录，格式同 load_sign_names。"""
+    return SignHistoryReader(csv_path, limit, backend).newest()
+
+
+def clear_sign_records(csv_path, before=None, backend="csv"):
+    """清空签到记录；分区目录可用 before（日期）只删除该日期之前的分区。"""
+    _check_backend(backend)
+    if backend == "sqlite":
+        get_store(csv_path).clear_sign()
+    elif backend == "partitioned":
+        get_partitioned_log(csv_path, SIGN_FIELDNAMES).clear(before, key=SIGN_PARTITION_KEY)
+    elif os.path.exists(csv_path):
         os.remove(csv_path)
 
 
+def load_roster(roster_path):
+    """
+    读取名册：每行 "编号 姓名"（face_list.txt）或只有 "姓名"，"#" 开头为注释。
+    """
+    names = set()
+    with open(roster_path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if not parts or parts[0].startswith("#"):
+                continue
+            names.add(parts[-1] if len(parts) >= 2 else parts[0])
+    return names
+
+
+SIGN_OK = "ok"
+SIGN_UNKNOWN = "unknown"
+SIGN_DUPLICATE = "duplicate"
+
+
+class SignInStore:
+    """
+    一场签到的内存索引：名册集合 + 本场已签到集合。
+
+    未登记或重复的二维码在写盘前以 O(1) 集合查询拒绝；"谁还没签到" 等查询只用内存集合，
+    不重新扫描 CSV。roster 为 None 时不校验名册，只去重。
+    """
+
+    def __init__(self, csv_path, roster=None, session_start=None, backend="csv"):
+        self.csv_path = csv_path
+        self.backend = _check_backend(backend)
+        self.roster = set(roster) if roster is not None else None
+        self.signed = {}
+        self.rejected = {SIGN_UNKNOWN: 0, SIGN_DUPLICATE: 0}
+        if session_start is not None:
+            self._resume(session_start)
+
+    @classmethod
+    def from_roster_file(cls, csv_path, roster_path, session_start=None, backend="csv"):
+        roster = load_roster(roster_path) if os.path.exists(roster_path) else None
+        return cls(csv_path, roster, session_start, backend)
+
+    def _resume(self, session_start):
+        # 程序重启后接着本场签到：只在开始时读一次 CSV
+        start = session_start.strftime("%Y-%m-%d %H:%M:%S")
+        if self.backend == "sqlite":
+            for time_str, name, _ in get_store(self.csv_path).sign_range(start, "9999"):
+                if self.check(name) == SIGN_OK:
+                    self.signed[name] = time_str
+            return
+        if self.backend == "partitioned":
+            log = get_partitioned_log(self.csv_path, SIGN_FIELDNAMES)
+            for row in log.read(session_start, None, SIGN_PARTITION_KEY):
+                if len(row) >= 2 and row[0] >= start and self.check(row[1]) == SIGN_OK:
+                    self.signed[row[1]] = row[0]
+            return
+        if not os.path.exists(self.csv_path):
+            return
+        with open(self.csv_path, "r", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if len(row) >= 2 and row[0] >= start and self.check(row[1]) == SIGN_OK:
+                    self.signed[row[1]] = row[0]
+
+    def check(self, name):
+        if self.roster is not None and name not in self.roster:
+            return SIGN_UNKNOWN
+        if name in self.signed:
+            return SIGN_DUPLICATE
+        return SIGN_OK
+
+    def sign(self, name, source="二维码"):
+        """校验通过才写入 CSV，返回 SIGN_OK / SIGN_UNKNOWN / SIGN_DUPLICATE。"""
+        name = name.strip()
+        status = self.check(name)
+        if status != SIGN_OK:
+            self.rejected[status] += 1
+            return status
+        # 内存中的签到时间与写入记录的时间必须是同一个
+        self.signed[name] = append_sign_record(self.csv_path, name, source, self.backend)
+        return status
+
+    def is_signed(self, name):
+        return name in self.signed
+
+    def missing(self):
+        """名册中本场尚未签到的人。"""
+        if self.roster is None:
+            return []
+        return sorted(self.roster.difference(self.signed))
+
+    def summary(self):
+        total = len(self.roster) if self.roster is not None else None
+        return {"signed": len(self.signed), "total": total, **self.rejected}
+
+
 if __name__ == "__main__":
     demo_data = {"temperature": 25, "light": 350, "people": 1}
     demo_control = {"空调": "制冷中", "照明": "开灯"}
     append_environment_record("demo.csv", "A-101", "12:00:00", demo_data, demo_control)
-    append_sign_record("sign_demo.csv", "张三")
+    store = SignInStore("sign_demo.csv", roster={"张三", "李四"})
+    print(store.sign("张三"), store.sign("张三"), store.sign("https://www.runoob.com"), store.missing())
     print("已生成 demo.csv 与 sign_demo.csv")
 
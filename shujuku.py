@@ -0,0 +1,224 @@
+import csv
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS environment (
+    ts TEXT NOT NULL,
+    room TEXT NOT NULL,
+    temperature REAL,
+    light REAL,
+    people INTEGER,
+    ac TEXT,
+    lighting TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_environment_room_ts ON environment (room, ts);
+CREATE TABLE IF NOT EXISTS sign (
+    ts TEXT NOT NULL,
+    name TEXT NOT NULL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sign_name_ts ON sign (name, ts);
+CREATE INDEX IF NOT EXISTS idx_sign_ts ON sign (ts);
+"""
+
+
+def full_timestamp(timestamp, date=None) -> str:
+    """环境记录的时间只有 "时:分:秒" 时补上日期，入库后可跨天排序与范围查询。"""
+    if len(timestamp) <= 8:
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        return f"{date} {timestamp}"
+    return timestamp
+
+
+class SQLiteStore:
+    """
+    环境数据与签到记录的 SQLite 存储：WAL 模式，批量写入在一个事务中完成，
+    (room, ts) 与 (name, ts) 上建有索引，按教室/姓名的时间范围查询不再全表扫描。
+
+    同一连接由锁保护，可在界面线程与后台写盘线程之间共享。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _executemany(self, sql, rows, sync=False):
+        # sync=True 时本次提交临时使用 synchronous=FULL，提交返回即已落盘
+        with self._lock:
+            if sync:
+                self._conn.execute("PRAGMA synchronous=FULL")
+            try:
+                with self._conn:
+                    self._conn.executemany(sql, rows)
+            finally:
+                if sync:
+                    self._conn.execute("PRAGMA synchronous=NORMAL")
+        return len(rows)
+
+    def insert_environment(self, rows, sync=False):
+        """rows 为 [时间, 教室, 温度, 光照, 人员数, 空调, 照明]，与 CSV 的列相同。"""
+        rows = [(full_timestamp(str(row[0])), *row[1:]) for row in rows]
+        return self._executemany("INSERT INTO environment VALUES (?, ?, ?, ?, ?, ?, ?)", rows, sync)
+
+    def insert_sign(self, rows, sync=False):
+        """rows 为 [时间, 姓名, 来源]。"""
+        return self._executemany("INSERT INTO sign VALUES (?, ?, ?)", [tuple(row) for row in rows], sync)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def environment_range(self, room, start, end):
+        """某教室 [start, end) 时间段内的记录，时间格式 "YYYY-MM-DD HH:MM:SS"。"""
+        return self._query(
+            "SELECT ts, room, temperature, light, people, ac, lighting FROM environment "
+            "WHERE room = ? AND ts >= ? AND ts < ? ORDER BY ts",
+            (room, start, end),
+        )
+
+    def environment_stats(self, room, start, end):
+        """某教室时间段内温度与光照的 (条数, 平均温度, 最低温度, 最高温度, 平均光照)。"""
+        return self._query(
+            "SELECT COUNT(*), AVG(temperature), MIN(temperature), MAX(temperature), AVG(light) FROM environment "
+            "WHERE room = ? AND ts >= ? AND ts < ?",
+            (room, start, end),
+        )[0]
+
+    def sign_range(self, start, end):
+        return self._query("SELECT ts, name, source FROM sign WHERE ts >= ? AND ts < ? ORDER BY ts", (start, end))
+
+    def attendance(self, start, end):
+        """时间段内签到过的姓名集合。"""
+        return {row[0] for row in self._query("SELECT DISTINCT name FROM sign WHERE ts >= ? AND ts < ?", (start, end))}
+
+    def sign_page(self, limit, before_rowid=None):
+        """按写入顺序倒序分页：返回 (正序记录列表, 本页最小 rowid)。"""
+        if before_rowid is None:
+            rows = self._query("SELECT rowid, ts, name FROM sign ORDER BY rowid DESC LIMIT ?", (limit,))
+        else:
+            rows = self._query(
+                "SELECT rowid, ts, name FROM sign WHERE rowid < ? ORDER BY rowid DESC LIMIT ?", (before_rowid, limit)
+            )
+        rows.reverse()
+        return [(ts, name) for _, ts, name in rows], (rows[0][0] if rows else 0)
+
+    def sign_names(self):
+        return [(ts, name) for ts, name in self._query("SELECT ts, name FROM sign ORDER BY rowid")]
+
+    def clear_sign(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sign")
+
+    def import_csv(self, environment_csv=None, sign_csv=None, date=None, batch_size=5000):
+        """
+        一次性导入已有 CSV。环境 CSV 的时间没有日期，默认使用文件修改日期，也可用 date 指定。
+        返回 (环境记录数, 签到记录数)。
+        """
+        counts = [0, 0]
+        for index, path in enumerate((environment_csv, sign_csv)):
+            if not path or not os.path.exists(path):
+                continue
+            if index == 0:
+                day = date or datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d")
+            with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                batch = []
+                for row in reader:
+                    if index == 0 and len(row) >= 7:
+                        batch.append([full_timestamp(row[0], day), *row[1:7]])
+                    elif index == 1 and len(row) >= 2:
+                        batch.append([row[0], row[1], row[2] if len(row) > 2 else ""])
+                    if len(batch) >= batch_size:
+                        counts[index] += self._insert(index, batch)
+                        batch = []
+                counts[index] += self._insert(index, batch)
+        return tuple(counts)
+
+    def _insert(self, index, batch):
+        if not batch:
+            return 0
+        return self.insert_environment(batch) if index == 0 else self.insert_sign(batch)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(db_path) -> SQLiteStore:
+    """同一数据库文件在进程内共用一个连接。"""
+    key = os.path.abspath(db_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SQLiteStore(db_path)
+        return store
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import tempfile
+    import time
+
+    parser = argparse.ArgumentParser(description="SQLite 存储：导入 CSV 或与 CSV 对比写入/查询耗时")
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_cmd = sub.add_parser("import", help="把已有 CSV 导入数据库")
+    import_cmd.add_argument("db")
+    import_cmd.add_argument("--environment", default="classroom_data.csv")
+    import_cmd.add_argument("--sign", default="sign_records.csv")
+    import_cmd.add_argument("--date", default=None, help="环境记录的日期（YYYY-MM-DD），默认取文件修改日期")
+    bench_cmd = sub.add_parser("benchmark", help="写入吞吐与范围查询耗时对比")
+    bench_cmd.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        env_count, sign_count = get_store(args.db).import_csv(args.environment, args.sign, args.date)
+        print(f"导入环境记录 {env_count} 条，签到记录 {sign_count} 条")
+    else:
+        from shujucunchu import EnvironmentRecordWriter
+
+        rooms = ["A-101", "A-102", "B-201", "B-202"]
+        rows = []
+        base = datetime(2025, 9, 1).timestamp()
+        for i in range(args.rows):
+            ts = datetime.fromtimestamp(base + i * 2).strftime("%Y-%m-%d %H:%M:%S")
+            rows.append([ts, rooms[i % 4], round(random.uniform(18, 30), 1), random.randint(100, 800), 10, "待机", "维持"])
+        start, end = rows[args.rows // 2][0], rows[args.rows // 2 + 1800][0]
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path, db_path = os.path.join(tmp, "env.csv"), os.path.join(tmp, "env.db")
+            begin = time.perf_counter()
+            with EnvironmentRecordWriter(csv_path, flush_rows=5000) as writer:
+                for row in rows:
+                    writer.append(row[1], row[0], dict(zip(("temperature", "light", "people"), row[2:5])), {"空调": row[5], "照明": row[6]})
+            csv_insert = time.perf_counter() - begin
+            store = SQLiteStore(db_path)
+            begin = time.perf_counter()
+            for offset in range(0, len(rows), 5000):
+                store.insert_environment(rows[offset : offset + 5000])
+            db_insert = time.perf_counter() - begin
+
+            begin = time.perf_counter()
+            with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+                temps = [float(r[2]) for r in csv.reader(f) if r[1] == "A-101" and start <= r[0] < end]
+            csv_query = time.perf_counter() - begin
+            begin = time.perf_counter()
+            stats = store.environment_stats("A-101", start, end)
+            db_query = time.perf_counter() - begin
+            store.close()
+        print(f"写入 {args.rows} 条：CSV {args.rows / csv_insert:.0f} 条/秒，SQLite {args.rows / db_insert:.0f} 条/秒")
+        print(f"一小时范围查询（{len(temps)} 条）：CSV 全表扫描 {1000 * csv_query:.1f}ms，SQLite 索引 {1000 * db_query:.2f}ms")
+        assert stats[0] == len(temps)
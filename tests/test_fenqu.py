@@ -0,0 +1,86 @@
+import gzip
+import os
+from datetime import date, datetime
+
+import pytest
+
+from fenqu import PartitionedLog, close_partitioned_logs, get_partitioned_log
+
+FIELDS = ["时间", "值"]
+DAY1 = datetime(2026, 3, 1, 12, 0)
+DAY2 = datetime(2026, 3, 2, 9, 0)
+
+
+def _names(log, key="A"):
+    return [os.path.basename(path) for path in log.partitions(key=key)]
+
+
+def test_rotates_by_size_with_increasing_sequence(tmp_path):
+    with PartitionedLog(str(tmp_path), FIELDS, max_bytes=64, compression=None) as log:
+        for k in range(20):
+            log.append("A", [f"12:00:{k:02d}", "x" * 10], DAY1)
+        names = _names(log)
+        assert len(names) > 1
+        assert names == sorted(names) and all(name.startswith("2026-03-01-") for name in names)
+        assert [row[1] for row in log.read(key="A")] == ["x" * 10] * 20
+
+
+def test_rotates_on_day_change_and_reads_by_range(tmp_path):
+    with PartitionedLog(str(tmp_path), FIELDS, compression=None) as log:
+        log.append("A", ["d1", "1"], DAY1)
+        log.append("A", ["d2", "2"], DAY2)
+        log.append("B", ["d2", "3"], DAY2)
+        assert _names(log) == ["2026-03-01-000.csv", "2026-03-02-000.csv"]
+        assert [row[0] for row in log.read("2026-03-02", "2026-03-02")] == ["d2", "d2"]
+        assert [row[1] for row in log.read(date(2026, 3, 1), date(2026, 3, 1), key="A")] == ["1"]
+
+
+def test_rotated_partitions_are_compressed(tmp_path):
+    log = PartitionedLog(str(tmp_path), FIELDS, compression="gzip")
+    log.append("A", ["d1", "1"], DAY1)
+    log.append("A", ["d2", "2"], DAY2)
+    log.close()
+    assert _names(log) == ["2026-03-01-000.csv.gz", "2026-03-02-000.csv"]
+    with gzip.open(tmp_path / "A" / "2026-03-01-000.csv.gz", "rt", encoding="utf-8-sig") as f:
+        assert f.read().splitlines() == ["时间,值", "d1,1"]
+    reader = PartitionedLog(str(tmp_path), None, compression=None)
+    assert [row[1] for row in reader.read(key="A")] == ["1", "2"]
+
+
+def test_reopen_same_day_continues_after_compressed_partition(tmp_path):
+    log = PartitionedLog(str(tmp_path), FIELDS, max_bytes=16, compression="gzip")
+    log.append("A", ["a", "1"], DAY1)
+    log.append("A", ["b", "2"], DAY1)
+    log.close()
+    log = PartitionedLog(str(tmp_path), FIELDS, compression=None)
+    log.append("A", ["c", "3"], DAY1)
+    log.close()
+    names = _names(log)
+    assert names[0].endswith(".gz") and names[-1] == "2026-03-01-001.csv"
+    assert [row[1] for row in log.read(key="A")] == ["1", "2", "3"]
+
+
+def test_clear_before_day(tmp_path):
+    with PartitionedLog(str(tmp_path), FIELDS, compression=None) as log:
+        log.append("A", ["d1", "1"], DAY1)
+        log.append("A", ["d2", "2"], DAY2)
+        assert log.clear(before="2026-03-02", key="A") == 1
+        assert _names(log) == ["2026-03-02-000.csv"]
+        log.clear()
+        assert list(log.read()) == []
+
+
+def test_read_only_log_cannot_append(tmp_path):
+    log = PartitionedLog(str(tmp_path), None, compression=None)
+    with pytest.raises(ValueError):
+        log.append("A", ["x", "1"])
+
+
+def test_shared_log_rejects_other_fieldnames(tmp_path):
+    try:
+        log = get_partitioned_log(str(tmp_path), FIELDS)
+        assert get_partitioned_log(str(tmp_path), list(FIELDS)) is log
+        with pytest.raises(ValueError):
+            get_partitioned_log(str(tmp_path), ["时间", "姓名", "来源"])
+    finally:
+        close_partitioned_logs()
@@ -0,0 +1,58 @@
+from genzong import FaceTracker, box_iou
+
+
+def test_box_iou():
+    assert box_iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert box_iou((0, 0, 10, 10), (20, 20, 10, 10)) == 0.0
+    assert abs(box_iou((0, 0, 10, 10), (5, 0, 10, 10)) - 50 / 150) < 1e-9
+
+
+def test_tracks_keep_ids_while_moving():
+    tracker = FaceTracker()
+    first = tracker.update([(100, 100, 80, 80), (300, 120, 90, 90)])
+    ids = [t.track_id for t in first]
+    for step in range(1, 5):
+        current = tracker.update([(300, 120 + step, 90, 90), (100 + step, 100, 80, 80)])
+        assert [t.track_id for t in current] == ids[::-1]
+    assert len(tracker.tracks) == 2
+
+
+def test_cached_prediction_until_repredict_interval():
+    tracker = FaceTracker(repredict_interval=3)
+    track = tracker.update([(0, 0, 50, 50)])[0]
+    assert tracker.needs_predict(track)
+    tracker.set_prediction(track, 1, 40.0, "li")
+    tracker.update([(1, 0, 50, 50)])
+    assert not tracker.needs_predict(track)
+    tracker.update([(2, 0, 50, 50)])
+    tracker.update([(3, 0, 50, 50)])
+    assert tracker.needs_predict(track)
+    assert tracker.cached_hits == 1
+    assert tracker.active_identities() == {"li"}
+
+
+def test_poor_confidence_is_always_repredicted():
+    tracker = FaceTracker(good_confidence=70.0)
+    track = tracker.update([(0, 0, 50, 50)])[0]
+    tracker.set_prediction(track, 1, 90.0, "li")
+    tracker.update([(0, 0, 50, 50)])
+    assert tracker.needs_predict(track)
+
+
+def test_missed_tracks_are_dropped():
+    tracker = FaceTracker(max_missed=2)
+    tracker.update([(0, 0, 50, 50)])
+    for _ in range(3):
+        tracker.update([])
+    assert tracker.tracks == []
+
+
+def test_bind_model_resets_tracks():
+    tracker = FaceTracker()
+    model = object()
+    tracker.bind_model(model)
+    tracker.update([(0, 0, 50, 50)])
+    tracker.bind_model(model)
+    assert len(tracker.tracks) == 1
+    tracker.bind_model(object())
+    assert tracker.tracks == [] and tracker.frame_index == 0
@@ -0,0 +1,108 @@
+import csv
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+
+from huizong import STATE_FILE, RollupEngine, rebuild_from_log
+from shixu import TimeSeriesLog
+
+CONTROLS = {"空调": "待机", "照明": "开灯"}
+START = datetime(2026, 3, 1, 8, 0)
+
+
+def _samples(count=300, step_minutes=7):
+    for k in range(count):
+        moment = START + timedelta(minutes=k * step_minutes)
+        data = {"temperature": 20 + k % 5, "light": 100 + k % 7, "people": k % 30}
+        for room in ("A-101", "B-202"):
+            yield room, moment, data
+
+
+def _rows(directory, resolution):
+    with open(os.path.join(directory, f"rollup_{resolution}.csv"), encoding="utf-8-sig", newline="") as f:
+        return list(csv.reader(f))[1:]
+
+
+def _all(engine):
+    return {res: engine.query(res) for res in ("minute", "hour", "day")}
+
+
+def _live(directory, log=None):
+    engine = RollupEngine(directory)
+    for room, moment, data in _samples():
+        engine.add(room, moment, data)
+        if log is not None:
+            log.append(room, moment, data, CONTROLS)
+    return engine
+
+
+def test_query_filters_and_includes_open_buckets(tmp_path):
+    engine = _live(str(tmp_path))
+    hours = engine.query("hour", "A-101", "2026-03-01 10", "2026-03-01 12")
+    assert [row["时段"] for row in hours] == ["2026-03-01 10", "2026-03-01 11"]
+    assert sum(int(row["条数"]) for row in hours) == 17
+    last = engine.query("day", "A-101")[-1]
+    assert last["时段"] == "2026-03-02" and int(last["条数"]) > 0
+    assert not any(row[0] == "2026-03-02" for row in _rows(str(tmp_path), "day"))
+
+
+def test_open_buckets_checkpointed_when_bucket_closes(tmp_path):
+    engine = RollupEngine(str(tmp_path))
+    engine.add("A-101", START, {"temperature": 20, "light": 100, "people": 1})
+    engine.add("A-101", START + timedelta(minutes=1), {"temperature": 22, "light": 100, "people": 1})
+    with open(tmp_path / STATE_FILE, encoding="utf-8") as f:
+        state = json.load(f)
+    assert {(item["resolution"], item["key"]) for item in state} >= {("minute", "2026-03-01 08:01")}
+    # 不调用 close() 也能从检查点继续累加
+    again = RollupEngine(str(tmp_path))
+    assert again.query("hour")[0]["条数"] == "2"
+
+
+def test_restored_stale_checkpoint_does_not_duplicate_rows(tmp_path):
+    engine = RollupEngine(str(tmp_path))
+    data = {"temperature": 20, "light": 100, "people": 1}
+    engine.add("A-101", START, data)
+    engine.close()
+    stale = (tmp_path / STATE_FILE).read_text(encoding="utf-8")
+    engine.add("A-101", START + timedelta(minutes=1), data)
+    # 写出时段行之后、保存状态之前崩溃：状态还是旧的
+    (tmp_path / STATE_FILE).write_text(stale, encoding="utf-8")
+    restored = RollupEngine(str(tmp_path))
+    restored.add("A-101", START + timedelta(minutes=2), data)
+    minutes = [row[0] for row in _rows(str(tmp_path), "minute")]
+    assert minutes.count("2026-03-01 08:00") == 1
+
+
+def test_rebuild_matches_live_and_is_idempotent(tmp_path):
+    log = TimeSeriesLog(str(tmp_path / "log"))
+    live = _live(str(tmp_path / "rollups"), log)
+    expected = _all(live)
+    live.close()
+    log.flush()
+    shutil.copytree(tmp_path / "rollups", tmp_path / "twice")
+
+    rebuilt = RollupEngine(str(tmp_path / "rebuilt"))
+    assert rebuild_from_log(log, rebuilt) == 600
+    assert _all(rebuilt) == expected
+
+    twice = RollupEngine(str(tmp_path / "twice"))
+    for _ in range(2):
+        rebuild_from_log(log, twice)
+        assert _all(twice) == expected
+    # 部分范围按天对齐，重算后结果不变，也没有重复行
+    assert rebuild_from_log(log, twice, datetime(2026, 3, 2, 5), datetime(2026, 3, 2, 6)) == 324
+    assert _all(twice) == expected
+    for resolution in ("minute", "hour", "day"):
+        rows = _rows(str(tmp_path / "twice"), resolution)
+        assert len(rows) == len({(row[0], row[1]) for row in rows})
+    log.close()
+
+
+def test_query_sees_rows_appended_elsewhere(tmp_path):
+    reader = RollupEngine(str(tmp_path))
+    assert reader.query("minute") == []
+    writer = _live(str(tmp_path))
+    writer.close()
+    # reader 只从上次索引的位置往后读新行；writer 未结束的当前时段不在文件中
+    assert len(reader.query("minute", "A-101")) == len(writer.query("minute", "A-101")) - 1
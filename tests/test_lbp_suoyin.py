@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+import pytest
+
+from lbp_suoyin import HistogramStore, LBPHistogramIndex, lbp_histogram
+
+needs_face = pytest.mark.skipif(not hasattr(cv2, "face"), reason="需要 opencv-contrib 的 cv2.face")
+
+
+def _faces(count=12, seed=0):
+    rng = np.random.default_rng(seed)
+    images = []
+    for k in range(count):
+        base = rng.integers(0, 256, (100, 100), dtype=np.uint8)
+        images.append(cv2.GaussianBlur(base, (5, 5), 1 + k % 3))
+    labels = [k % 4 for k in range(count)]
+    return images, labels
+
+
+def _lbph(images, labels):
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train(images, np.array(labels))
+    return recognizer
+
+
+@needs_face
+def test_histograms_match_opencv():
+    images, labels = _faces()
+    recognizer = _lbph(images, labels)
+    for image, expected in zip(images, recognizer.getHistograms()):
+        np.testing.assert_allclose(lbp_histogram(image), np.asarray(expected).reshape(-1), rtol=1e-5, atol=1e-6)
+
+
+@needs_face
+def test_exact_predictions_match_opencv():
+    images, labels = _faces()
+    recognizer = _lbph(images, labels)
+    index = LBPHistogramIndex.from_recognizer(recognizer)
+    queries, _ = _faces(6, seed=1)
+    for query in queries + images[:3]:
+        label, confidence = recognizer.predict(query)
+        ours = index.predict(query)
+        assert ours[0] == label
+        assert ours[1] == pytest.approx(confidence, rel=1e-4)
+    assert index.predict_batch(queries) == [index.predict(q) for q in queries]
+
+
+def test_from_images_and_snapshot_roundtrip(tmp_path):
+    images, labels = _faces()
+    index = LBPHistogramIndex.from_images(images, labels)
+    assert index.predict(images[5])[0] == labels[5]
+    assert index.predict(images[5])[1] == pytest.approx(0.0, abs=1e-6)
+    index.save_snapshot(str(tmp_path))
+    loaded = LBPHistogramIndex.from_snapshot(str(tmp_path))
+    assert len(loaded) == len(index)
+    assert loaded.predict(images[7]) == index.predict(images[7])
+
+
+def test_empty_index_returns_no_match():
+    index = LBPHistogramIndex.from_images([], [])
+    label, distance = index.predict(np.zeros((100, 100), dtype=np.uint8))
+    assert label == -1 and distance > 1e300
+
+
+def test_histogram_store_builds_index(tmp_path):
+    images, labels = _faces()
+    store = HistogramStore(str(tmp_path / "hist"))
+    for label in sorted(set(labels)):
+        store.save(label, store.compute([img for img, lab in zip(images, labels) if lab == label]))
+    assert store.labels() == [0, 1, 2, 3]
+    index = store.build_index()
+    assert index.predict(images[2])[0] == labels[2]
+    assert store.remove(2)
+    assert 2 not in store.build_index().labels
@@ -0,0 +1,73 @@
+import os
+from datetime import datetime, timedelta
+
+from shixu import RECORD_DTYPE, TimeSeriesLog
+
+CONTROLS = {"空调": "待机", "照明": "开灯"}
+START = datetime(2026, 3, 1, 8, 0, 0)
+
+
+def _fill(log, count, room="A-101", first=0):
+    for k in range(first, first + count):
+        data = {"temperature": 20 + k % 5, "light": 300 + k, "people": k % 30}
+        log.append(room, START + timedelta(seconds=k), data, CONTROLS)
+
+
+def test_segments_roll_over_when_full(tmp_path):
+    with TimeSeriesLog(str(tmp_path), segment_records=10) as log:
+        _fill(log, 25)
+        log.flush()
+        segments = log.segments()
+        assert [os.path.getsize(p) // RECORD_DTYPE.itemsize for p in segments] == [10, 10, 5]
+        # 段以首条记录的时间戳命名
+        first_ts = [int(os.path.basename(p)[4:-4]) for p in segments]
+        expected = [int((START + timedelta(seconds=k)).timestamp() * 1000) for k in (0, 10, 20)]
+        assert first_ts == expected
+        assert len(log.range()) == 25
+
+
+def test_range_spans_segments(tmp_path):
+    with TimeSeriesLog(str(tmp_path), segment_records=10) as log:
+        _fill(log, 25)
+        records = log.range(START + timedelta(seconds=8), START + timedelta(seconds=13))
+        assert [int(r["light"]) for r in records] == [308, 309, 310, 311, 312]
+        # 跳过整段不在范围内的段
+        parts = list(log.iter_range(START + timedelta(seconds=21), None))
+        assert len(parts) == 1 and len(parts[0]) == 4
+
+
+def test_reopen_continues_partial_segment(tmp_path):
+    with TimeSeriesLog(str(tmp_path), segment_records=10) as log:
+        _fill(log, 7)
+    with TimeSeriesLog(str(tmp_path), segment_records=10) as log:
+        # 模拟异常退出留下的半条记录
+        with open(log.segments()[-1], "ab") as f:
+            f.write(b"\0" * 5)
+        for k in range(7, 12):
+            data = {"temperature": 20, "light": 300 + k, "people": 1}
+            log.append("A-101", START + timedelta(seconds=k), data, CONTROLS)
+        log.flush()
+        assert [os.path.getsize(p) // RECORD_DTYPE.itemsize for p in log.segments()] == [10, 2]
+        assert all(os.path.getsize(p) % RECORD_DTYPE.itemsize == 0 for p in log.segments())
+        assert [int(r["light"]) for r in log.range()] == list(range(300, 312))
+
+
+def test_room_filter_and_decode(tmp_path):
+    with TimeSeriesLog(str(tmp_path)) as log:
+        _fill(log, 3, room="A-101")
+        _fill(log, 2, room="B-202", first=3)
+        assert len(log.range(room="B-202")) == 2
+        assert len(log.range(room="C-303")) == 0
+        row = log.decode(log.range(room="A-101")[0])
+        assert row["教室"] == "A-101" and row["时间"] == "2026-03-01 08:00:00" and row["空调"] == "待机"
+    # 编码表保存在 meta.json，重新打开后不变
+    assert TimeSeriesLog(str(tmp_path)).rooms == ["A-101", "B-202"]
+
+
+def test_appended_records_are_visible_without_flush(tmp_path):
+    log = TimeSeriesLog(str(tmp_path))
+    _fill(log, 3)
+    # 另一个进程只看文件：不调用 flush()/close() 也能读到
+    path = TimeSeriesLog(str(tmp_path)).segments()[0]
+    assert os.path.getsize(path) == 3 * RECORD_DTYPE.itemsize
+    log.close()
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from shujucunchu import (
+    SIGN_DUPLICATE,
+    SIGN_OK,
+    SIGN_UNKNOWN,
+    SignHistoryReader,
+    SignInStore,
+    append_sign_record,
+    load_recent_sign_names,
+    load_sign_names,
+)
+
+BACKENDS = [("csv", "sign.csv"), ("sqlite", "classroom.db"), ("partitioned", "sign")]
+
+
+@pytest.fixture(autouse=True)
+def _close_logs():
+    yield
+    from fenqu import close_partitioned_logs
+
+    close_partitioned_logs()
+
+
+@pytest.mark.parametrize("backend,name", BACKENDS)
+def test_sign_in_store_rejects_unknown_and_duplicates(tmp_path, backend, name):
+    path = str(tmp_path / name)
+    store = SignInStore(path, roster={"张三", "李四"}, backend=backend)
+    assert store.sign("张三") == SIGN_OK
+    assert store.sign(" 张三 ") == SIGN_DUPLICATE
+    assert store.sign("https://www.runoob.com") == SIGN_UNKNOWN
+    assert store.missing() == ["李四"]
+    assert store.summary() == {"signed": 1, "total": 2, SIGN_UNKNOWN: 1, SIGN_DUPLICATE: 1}
+    assert [item.split()[-1] for item in load_sign_names(path, backend=backend)] == ["张三"]
+    # 内存中的签到时间与写入的记录一致
+    assert load_sign_names(path, backend=backend)[0] == f"{store.signed['张三']}  张三"
+
+
+@pytest.mark.parametrize("backend,name", BACKENDS)
+def test_sign_in_store_resumes_current_session(tmp_path, backend, name):
+    path = str(tmp_path / name)
+    append_sign_record(path, "张三", backend=backend)
+    resumed = SignInStore(path, roster={"张三", "李四"}, session_start=datetime.now() - timedelta(minutes=1), backend=backend)
+    assert resumed.is_signed("张三")
+    assert resumed.sign("张三") == SIGN_DUPLICATE
+    later = SignInStore(path, roster={"张三", "李四"}, session_start=datetime.now() + timedelta(minutes=1), backend=backend)
+    assert not later.is_signed("张三")
+
+
+def test_without_roster_only_duplicates_are_rejected(tmp_path):
+    store = SignInStore(str(tmp_path / "sign.csv"))
+    assert store.sign("anyone") == SIGN_OK
+    assert store.sign("anyone") == SIGN_DUPLICATE
+    assert store.missing() == []
+    assert store.summary()["total"] is None
+
+
+def test_roster_file(tmp_path):
+    roster = tmp_path / "face_list.txt"
+    roster.write_text("# 编号 姓名\n1 张三\n2 李四\n", encoding="utf-8")
+    store = SignInStore.from_roster_file(str(tmp_path / "sign.csv"), str(roster))
+    assert store.roster == {"张三", "李四"}
+    assert SignInStore.from_roster_file(str(tmp_path / "sign.csv"), str(tmp_path / "missing.txt")).roster is None
+
+
+def test_unknown_backend(tmp_path):
+    with pytest.raises(ValueError):
+        SignInStore(str(tmp_path / "sign.csv"), backend="mysql")
+
+
+
+def _names(page):
+    return [item.split()[-1] for item in page]
+
+
+@pytest.mark.parametrize("backend,name", BACKENDS)
+def test_history_reader_pages_from_newest(tmp_path, backend, name):
+    path = str(tmp_path / name)
+    for k in range(23):
+        append_sign_record(path, f"s{k:03d}", backend=backend)
+    reader = SignHistoryReader(path, page_size=10, backend=backend)
+    pages = [_names(reader.newest())]
+    while reader.has_more:
+        pages.append(_names(reader.older()))
+    assert pages == [
+        [f"s{k:03d}" for k in range(13, 23)],
+        [f"s{k:03d}" for k in range(3, 13)],
+        [f"s{k:03d}" for k in range(0, 3)],
+    ]
+    assert reader.older() == []
+    assert _names(load_recent_sign_names(path, 5, backend=backend)) == [f"s{k:03d}" for k in range(18, 23)]
+
+
+def test_history_reader_small_blocks(tmp_path, monkeypatch):
+    # 块边界落在行中间时，不完整的行留给下一页
+    monkeypatch.setattr(SignHistoryReader, "BLOCK_SIZE", 7)
+    path = str(tmp_path / "sign.csv")
+    for k in range(12):
+        append_sign_record(path, f"s{k:03d}")
+    reader = SignHistoryReader(path, page_size=5)
+    seen = _names(reader.newest())
+    while reader.has_more:
+        seen = _names(reader.older()) + seen
+    assert seen == [f"s{k:03d}" for k in range(12)]
+
+
+def test_history_reader_created_before_csv(tmp_path):
+    path = str(tmp_path / "sign.csv")
+    reader = SignHistoryReader(path, page_size=10)
+    assert reader.newest() == []
+    append_sign_record(path, "张三")
+    append_sign_record(path, "李四")
+    # 表头（含 BOM）不能出现在结果中
+    assert _names(reader.newest()) == ["张三", "李四"]
+    assert not reader.has_more
+
+
+def test_history_reader_missing_file(tmp_path):
+    reader = SignHistoryReader(str(tmp_path / "none.csv"))
+    assert not reader.has_more
+    assert reader.older() == []
@@ -0,0 +1,45 @@
+import pytest
+
+from toupiao import IdentityVoter
+
+
+def test_settles_after_stable_frames():
+    voter = IdentityVoter(stable_frames=3, margin=1000.0)
+    for expected in (False, False, True):
+        voter.add_frame([("ynq", 45.0), ("zsy", 80.0)])
+        assert voter.is_settled() is expected
+    assert voter.current_people() == {"ynq", "zsy"}
+
+
+def test_changing_set_restarts_stability():
+    voter = IdentityVoter(stable_frames=2, margin=1000.0)
+    voter.add_frame([("ynq", 45.0)])
+    voter.add_frame([("ynq", 45.0), ("zsy", 50.0)])
+    assert not voter.is_settled()
+    voter.add_frame([("ynq", 45.0), ("zsy", 50.0)])
+    assert voter.is_settled()
+
+
+def test_confident_votes_settle_early():
+    voter = IdentityVoter(stable_frames=10, margin=30.0, min_votes=2, threshold=100.0)
+    voter.add_frame([("ynq", 40.0)])
+    assert not voter.is_settled()
+    voter.add_frame([("ynq", 50.0), ("unknown", 120.0)])
+    assert voter.is_settled()
+
+
+def test_unknown_faces_are_not_counted():
+    voter = IdentityVoter()
+    voter.add_frame([("unknown", 120.0), (None, 0.0)])
+    assert voter.votes == {}
+    assert not voter.is_settled()
+
+
+def test_summary_statistics():
+    voter = IdentityVoter()
+    voter.add_frame([("ynq", 40.0)])
+    voter.add_frame([("ynq", 60.0)])
+    summary = voter.summary()["ynq"]
+    assert summary["votes"] == 2
+    assert summary["mean_confidence"] == pytest.approx(50.0)
+    assert summary["std_confidence"] == pytest.approx(10.0)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from yundong import MotionGate
+
+
+def _still():
+    return np.full((480, 640), 120, dtype=np.uint8)
+
+
+def test_static_frames_are_skipped_and_motion_passes():
+    gate = MotionGate(max_stale_seconds=60)
+    assert gate.should_process(_still())
+    for _ in range(5):
+        assert not gate.should_process(_still())
+    moved = _still()
+    moved[100:300, 200:400] = 255
+    assert gate.should_process(moved)
+    counters = gate.counters()
+    assert counters["checks"] == 7
+    assert counters["skipped"] == 5
+    assert counters["motion_triggers"] == 2
+    assert abs(gate.hit_rate - 5 / 7) < 1e-9
+
+
+def test_stale_scene_is_processed_again():
+    gate = MotionGate(max_stale_seconds=0.0)
+    gate.should_process(_still())
+    assert gate.should_process(_still())
+    assert gate.stale_triggers == 1
+
+
+def test_saved_seconds_uses_average_pass_cost():
+    gate = MotionGate(max_stale_seconds=60)
+    gate.record_pass(0.02)
+    gate.should_process(_still())
+    gate.should_process(_still())
+    assert abs(gate.saved_seconds - 0.02) < 1e-9
+
+
+def test_reset_forces_next_frame():
+    gate = MotionGate(max_stale_seconds=60)
+    gate.should_process(_still())
+    gate.reset()
+    assert gate.should_process(_still())
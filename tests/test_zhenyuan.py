@@ -0,0 +1,42 @@
+import numpy as np
+
+import zhenyuan
+
+
+class _LostCamera:
+    def __init__(self, frames=1):
+        self.frames = frames
+        self.running = True
+
+    def read(self):
+        if self.frames > 0:
+            self.frames -= 1
+            return True, np.zeros((4, 4, 3), dtype=np.uint8)
+        return False, None
+
+    def isOpened(self):  # pylint: disable=invalid-name
+        return self.running
+
+
+def test_camera_source_gives_up_after_failed_reads(monkeypatch):
+    monkeypatch.setattr(zhenyuan, "get_camera", lambda device: _LostCamera())
+    source = zhenyuan.CameraSource(0, max_failed_reads=3)
+    assert source.read()[0]
+    for _ in range(3):
+        assert source.read() == (False, None)
+    assert source.exhausted and not source.isOpened()
+
+
+def test_camera_source_stops_when_service_stops(monkeypatch):
+    camera = _LostCamera(frames=0)
+    monkeypatch.setattr(zhenyuan, "get_camera", lambda device: camera)
+    source = zhenyuan.CameraSource(0)
+    camera.running = False
+    source.read()
+    assert source.exhausted
+
+
+def test_array_source_exhausts():
+    source = zhenyuan.open_source([np.zeros((2, 2), dtype=np.uint8)] * 2)
+    assert [ok for ok, _ in (source.read() for _ in range(3))] == [True, True, False]
+    assert source.exhausted
@@ -0,0 +1,87 @@
+import math
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+
+class IdentityVoter:
+    """
+    跨帧身份投票：累计每个身份的命中次数与置信度统计，判断结果是否已经稳定。
+
+    满足以下任一条件即可提前结束识别：
+    - 连续 stable_frames 帧识别到的身份集合不变；
+    - 当前帧的每个身份都至少有 min_votes 票，且平均距离比识别阈值低 margin 以上。
+    """
+
+    def __init__(self, stable_frames: int = 3, margin: float = 30.0, min_votes: int = 2, threshold: float = 100.0):
+        self.stable_frames = stable_frames
+        self.margin = margin
+        self.min_votes = min_votes
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.stable_count = 0
+        self.votes: Dict[str, int] = {}
+        self._conf_sum: Dict[str, float] = {}
+        self._conf_sq_sum: Dict[str, float] = {}
+        self._current: Optional[Set[str]] = None
+
+    def add_frame(self, observations: Iterable[Tuple[Optional[str], float]]):
+        """observations 为本帧每张脸的 (身份, 置信度)；unknown 不计入身份集合。"""
+        self.frames += 1
+        seen = set()
+        for identity, confidence in observations:
+            if identity is None or identity == "unknown":
+                continue
+            seen.add(identity)
+            self.votes[identity] = self.votes.get(identity, 0) + 1
+            self._conf_sum[identity] = self._conf_sum.get(identity, 0.0) + confidence
+            self._conf_sq_sum[identity] = self._conf_sq_sum.get(identity, 0.0) + confidence * confidence
+        if seen == self._current:
+            self.stable_count += 1
+        else:
+            self._current = seen
+            self.stable_count = 1
+
+    def mean_confidence(self, identity: str) -> float:
+        return self._conf_sum[identity] / self.votes[identity]
+
+    def confidence_std(self, identity: str) -> float:
+        n = self.votes[identity]
+        mean = self._conf_sum[identity] / n
+        return math.sqrt(max(0.0, self._conf_sq_sum[identity] / n - mean * mean))
+
+    def is_settled(self) -> bool:
+        if self.frames == 0:
+            return False
+        if self.stable_count >= self.stable_frames:
+            return True
+        if not self._current:
+            return False
+        return all(
+            self.votes[identity] >= self.min_votes
+            and self.threshold - self.mean_confidence(identity) >= self.margin
+            for identity in self._current
+        )
+
+    def current_people(self) -> Set[str]:
+        return set(self._current or ())
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """每个身份的票数、平均置信度与标准差。"""
+        return {
+            identity: {
+                "votes": count,
+                "mean_confidence": self.mean_confidence(identity),
+                "std_confidence": self.confidence_std(identity),
+            }
+            for identity, count in self.votes.items()
+        }
+
+
+if __name__ == "__main__":
+    voter = IdentityVoter()
+    for _ in range(3):
+        voter.add_frame([("ynq", 45.0), ("zsy", 80.0)])
+        print(voter.frames, voter.is_settled())
+    print(voter.summary())
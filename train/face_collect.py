@@ -1,15 +1,110 @@
+import argparse
 import cv2
 import os
+import queue
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from renlian_yangben import FacePack
+from renlian_yuchuli import FacePreprocessor, add_preprocess_arguments, config_from_args, dhash, hamming, sharpness
+from zhenyuan import add_source_arguments, open_source
+
+
+class SampleWriter(threading.Thread):
+    """
+    后台写盘线程：JPG 编码、写文件、追加打包样本集都在这里完成，
+    预览循环只把人脸放入队列，不会因磁盘 IO 掉帧。
+    """
+
+    def __init__(self, pack=None, max_pending=256):
+        super().__init__(daemon=True)
+        self.pack = pack
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.written = 0
+
+    def submit(self, path, roi, face_id):
+        self.queue.put((path, roi, face_id))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            path, roi, face_id = item
+            ok, buf = cv2.imencode(".jpg", roi)
+            if ok:
+                buf.tofile(path)
+                self.written += 1
+            if self.pack is not None:
+                self.pack.append([roi], self.pack.label_for(face_id), face_id)
+
+    def close(self):
+        # 等待队列中的样本全部写完
+        self.queue.put(None)
+        self.join()
+
+
+class AutoCapture:
+    """
+    自动采集的样本筛选：丢弃模糊（拉普拉斯方差过低）和与已保存样本过于相似（dHash 距离过小）的人脸。
+    画面中有多张人脸的帧不采集，计入 crowded。
+    """
+
+    def __init__(self, target=30, blur_threshold=60.0, hash_distance=6):
+        self.target = target
+        self.blur_threshold = blur_threshold
+        self.hash_distance = hash_distance
+        self.hashes = []
+        self.blurry = 0
+        self.duplicates = 0
+        self.crowded = 0
+
+    def reset(self):
+        self.hashes = []
+        self.blurry = 0
+        self.duplicates = 0
+        self.crowded = 0
+
+    def accept(self, roi) -> bool:
+        if sharpness(roi) < self.blur_threshold:
+            self.blurry += 1
+            return False
+        h = dhash(roi)
+        if any(hamming(h, old) <= self.hash_distance for old in self.hashes):
+            self.duplicates += 1
+            return False
+        self.hashes.append(h)
+        return True
+
+    def done(self) -> bool:
+        return len(self.hashes) >= self.target
+
 
 if __name__ == "__main__":
+    parser = add_source_arguments(argparse.ArgumentParser(description="人脸采集"))
+    parser.add_argument("--pack", default=None, help="同时把采集的人脸追加到打包样本集")
+    parser.add_argument("--auto", action="store_true", help="自动连续采集，不需要按 c")
+    parser.add_argument("--target", type=int, default=30, help="自动采集时每人的样本数")
+    parser.add_argument("--blur-threshold", type=float, default=60.0, help="拉普拉斯方差低于该值视为模糊")
+    parser.add_argument("--hash-distance", type=int, default=6, help="与已保存样本的 dHash 距离不超过该值视为重复")
+    add_preprocess_arguments(parser)
+    args = parser.parse_args()
+    # 保存的是未经预处理的人脸区域，训练时按模型的预处理参数处理一次（避免均衡、对齐做两遍）；
+    # 这里的预处理结果只用于模糊/重复筛选，与训练时看到的人脸一致
+    preprocessor = FacePreprocessor(config_from_args(args))
+    pack = FacePack.open_or_create(args.pack) if args.pack else None
+    writer = SampleWriter(pack)
+    writer.start()
+    auto = AutoCapture(args.target, args.blur_threshold, args.hash_distance) if args.auto else None
     str_face_id = ""
     index_photo=0
 
     # 加载训练好的人脸检测器
     faceCascade = cv2.CascadeClassifier('haarcascade_frontalface_alt.xml')
 
-    # 打开摄像头
-    cap = cv2.VideoCapture(0)
+    # 打开摄像头（或 --source 指定的视频/图片目录）
+    cap = open_source(args.source, realtime=args.realtime)
 
     while True:
         
@@ -17,14 +112,19 @@ if __name__ == "__main__":
         if str_face_id.strip()=="":
             str_face_id = input('Enter your face ID:')
             index_photo=0
+            if auto is not None:
+                auto.reset()
             
             if not os.path.exists(str_face_id):
                 os.makedirs(str_face_id)
           
         # 读取一帧图像
-        success, img = cap.read()
+        # 要在图像上画框，取一份副本，不改动摄像头缓冲区中的帧
+        success, img = cap.read(copy=True)
         
         if not success:
+            if cap.exhausted:
+                break
             continue
         
         
@@ -34,6 +134,21 @@ if __name__ == "__main__":
         # 进行人脸检测
         faces = faceCascade.detectMultiScale(gray,scaleFactor=1.1,minNeighbors=5,minSize=(50, 50),flags=cv2.CASCADE_SCALE_IMAGE)
         
+        # 自动采集：合格的人脸直接交给后台线程保存
+        # 无人值守时画面中可能有旁人，只采集恰好一张人脸的帧，避免把别人存进当前编号
+        if auto is not None and str_face_id.strip()!="":
+            if len(faces) == 1:
+                (x, y, w, h) = faces[0]
+                face = gray[y:y+h,x:x+w]
+                if auto.accept(preprocessor(face)):
+                    writer.submit("%s/%d.jpg"%(str_face_id,index_photo), face.copy(), str_face_id)
+                    index_photo = index_photo+1
+            elif len(faces) > 1:
+                auto.crowded += 1
+            if auto.done():
+                print("%s 采集完成：保存 %d 张，丢弃模糊 %d 张、重复 %d 张，跳过多人帧 %d 帧"%(str_face_id,index_photo,auto.blurry,auto.duplicates,auto.crowded))
+                str_face_id = ""
+
         # 画框
         for (x, y, w, h) in faces:
             cv2.rectangle(img, (x, y), (x+w, y+h), (255, 0, 0), 3)
@@ -50,8 +165,7 @@ if __name__ == "__main__":
             
             # 保存人脸
             for (x, y, w, h) in faces:
-                roi = img[y:y+h,x:x+w]
-                cv2.imwrite("%s/%d.jpg"%(str_face_id,index_photo),roi)
+                writer.submit("%s/%d.jpg"%(str_face_id,index_photo), gray[y:y+h,x:x+w].copy(), str_face_id)
                 index_photo = index_photo+1
             key = 0
         #  按键"x" 切换 人脸_id   
@@ -61,4 +175,6 @@ if __name__ == "__main__":
         # 按键 "q" 退出
         elif key ==  ord('q'):
             break
-    cap.release() 
\ No newline at end of file
+    cap.release()
+    writer.close()
+    print("共写入 %d 张人脸"%writer.written)
@@ -1,6 +1,13 @@
+import argparse
 import cv2
 import os
+import sys
 import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from renlian_yuchuli import FacePreprocessor, PreprocessConfig
+from zhenyuan import add_source_arguments, open_source
+
 def read_dic_face(file_list):
     data = np.loadtxt(file_list,dtype='str')
     dic_face = {}
@@ -10,6 +17,7 @@ def read_dic_face(file_list):
     return dic_face 
     
 if __name__ == "__main__":    
+    args = add_source_arguments(argparse.ArgumentParser(description="LBPH 人脸识别")).parse_args()
     
     # 加载人脸字典
     dic_face = read_dic_face("face_list.txt")
@@ -21,10 +29,12 @@ if __name__ == "__main__":
     # 加载训练好的人脸识别器
     recognizer = cv2.face.LBPHFaceRecognizer_create()
     recognizer.read('trainer.yml')
+    # 与训练时相同的人脸预处理（缩放、均衡等），旧模型没有 preprocess.json 时不做处理
+    preprocessor = FacePreprocessor(PreprocessConfig.load('preprocess.json'))
 
 
-    # 打开摄像头
-    cap = cv2.VideoCapture(0)
+    # 打开摄像头（或 --source 指定的视频/图片目录）
+    cap = open_source(args.source, realtime=args.realtime)
 
     while True:
         
@@ -32,6 +42,8 @@ if __name__ == "__main__":
         success, img = cap.read()
         
         if not success:
+            if cap.exhausted:
+                break
             continue
         
         # 转换为灰度
@@ -46,7 +58,7 @@ if __name__ == "__main__":
             cv2.rectangle(img, (x, y), (x+w, y+h), (255, 0, 0), 3)
             
             # 进行人脸识别 
-            id_face, confidence = recognizer.predict(gray[y:y+h,x:x+w])
+            id_face, confidence = recognizer.predict(preprocessor.crop(gray, (x, y, w, h)))
             
             print(confidence)
             # 检测可信度，这里是通过计算距离来计算可信度，confidence越小说明越近似 
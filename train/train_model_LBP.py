@@ -1,16 +1,133 @@
+import argparse
 import cv2
+import hashlib
 import os
+import sys
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
-# 获取所有文件（人脸id）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lbp_suoyin import HistogramStore, LBPHistogramIndex
+from renlian_moxing import FACE_DATA_DIR, FACE_LIST_PATH, HISTOGRAM_DIR, PREPROCESS_PATH, SNAPSHOT_DIR, TRAINER_PATH
+from renlian_yangben import FacePack
+from renlian_yuchuli import FacePreprocessor, add_preprocess_arguments, config_from_args
+from renlian_zhuce import FaceRoster
+
+# 获取所有文件（人脸id），按名称排序保证每次训练顺序一致
 def get_face_list(path):
     for root,dirs,files in os.walk(path):
         if root == path:
-            return dirs
-        
+            return sorted(dirs)
+
+
+# 读取图像、转换为灰度图并做统一预处理（在子进程中执行）
+def decode_face(file_face_img, config=None):
+    # imread 不支持中文路径，改用 imdecode
+    img = cv2.imdecode(np.fromfile(file_face_img, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    if config is not None:
+        img = FacePreprocessor(config)(img)
+    return img
+
+
+class FaceSampleCache:
+    """
+    预处理后灰度人脸的磁盘缓存，键为 (文件路径, mtime, 大小, 预处理参数)。
+
+    图片没有改动时直接读取缓存的 .npy，不再解码 JPG。
+    """
+
+    def __init__(self, cache_dir, variant=""):
+        self.cache_dir = cache_dir
+        self.variant = variant
+        self.used = set()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _key(self, path):
+        st = os.stat(path)
+        raw = "%s|%d|%d|%s" % (os.path.abspath(path), st.st_mtime_ns, st.st_size, self.variant)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, path):
+        key = self._key(path)
+        self.used.add(key)
+        cache_file = os.path.join(self.cache_dir, key + ".npy")
+        if os.path.exists(cache_file):
+            return np.load(cache_file)
+        return None
+
+    def put(self, path, img):
+        key = self._key(path)
+        self.used.add(key)
+        np.save(os.path.join(self.cache_dir, key + ".npy"), img)
+
+    def prune(self):
+        # 删除本次训练没有用到的缓存（图片已修改或删除）
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npy") and name[:-4] not in self.used:
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+# 列出所有人脸图片及其编号，labels 为与 face_ids 对应的编号（默认按顺序 0, 1, 2...）
+def list_face_samples(base_path, face_ids, labels=None):
+    samples = []
+    for i, face_id in enumerate(face_ids):
+        label = i if labels is None else labels[i]
+        path_img_face = os.path.join(base_path, face_id)
+        for face_img in sorted(os.listdir(path_img_face)):
+            # 读取以.jpg为后缀的文件
+            if face_img.endswith(".jpg"):
+                samples.append((os.path.join(path_img_face, face_img), label))
+    return samples
+
+
+def iter_sample_chunks(samples, chunk_size=256, executor=None, cache=None, config=None):
+    """
+    按块产出 (图像列表, 编号数组)，峰值内存只与 chunk_size 有关。
+
+    缓存未命中的图片交给进程池并行解码。
+    """
+    for start in range(0, len(samples), chunk_size):
+        chunk = samples[start:start + chunk_size]
+        images = [cache.get(path) if cache else None for path, _ in chunk]
+        missing = [k for k, img in enumerate(images) if img is None]
+        if missing:
+            paths = [chunk[k][0] for k in missing]
+            decode = partial(decode_face, config=config)
+            decoded = executor.map(decode, paths) if executor else map(decode, paths)
+            for k, img in zip(missing, decoded):
+                images[k] = img
+                if cache is not None and img is not None:
+                    cache.put(chunk[k][0], img)
+        faces = [img for img in images if img is not None]
+        ids = [label for (_, label), img in zip(chunk, images) if img is not None]
+        if faces:
+            yield faces, np.array(ids)
+
 
 if __name__ == "__main__":
-    
+
+    parser = argparse.ArgumentParser(description="训练 LBPH 人脸识别模型")
+    parser.add_argument("--base-path", default="E:/1/PyCharm/python_class/practice_project_7", help="人脸存储路径")
+    parser.add_argument("--chunk-size", type=int, default=256, help="每批送入训练的图片数")
+    parser.add_argument("--workers", type=int, default=None, help="解码进程数，默认等于 CPU 核数")
+    parser.add_argument("--cache-dir", default=None, help="灰度图缓存目录，默认 <人脸存储路径>/.cache")
+    parser.add_argument("--no-cache", action="store_true", help="不使用缓存")
+    parser.add_argument("--pack", default=None, help="直接从打包样本集训练（见 renlian_yangben.py）")
+    parser.add_argument("--model-dir", default=FACE_DATA_DIR, help="模型输出目录，默认识别端读取的 face_data")
+    add_preprocess_arguments(parser)
+    args = parser.parse_args()
+    config = config_from_args(args)
+    preprocessor = FacePreprocessor(config)
+
+    # 输出文件与识别端使用同样的文件名，放在模型目录下而不是当前工作目录
+    model_path = lambda default: os.path.join(args.model_dir, os.path.basename(default))
+    os.makedirs(args.model_dir, exist_ok=True)
+    # 沿用 face_list.txt 中已有的编号（含已删除身份的注释行），新姓名追加到末尾，编号不会因重训而改变
+    roster = FaceRoster(model_path(FACE_LIST_PATH))
+
     # 创建人脸识别器
     recognizer = cv2.face.LBPHFaceRecognizer_create()
 
@@ -18,57 +135,64 @@ if __name__ == "__main__":
     # 构建人脸编号 和 人脸id 的关系
     dic_face = {}
 
-    # 人脸存储路径
-
-    base_path = "E:/1/PyCharm/python_class/practice_project_7"
-    
-    # 获取人脸id
-    face_ids = get_face_list(base_path)
-    print(face_ids)
-    # 用来存放人脸数据与id号的列表
-    faceSamples=[]
-    ids = []
-    
-    # 遍历人脸id命名的文件夹
-    for i, face_id in enumerate(face_ids):
-        
-        # 人脸字典更新
-        dic_face[i] = face_id
-            
-        # 获取人脸图片存放路径
-        path_img_face = os.path.join(base_path,face_id)
-        
-        for face_img in os.listdir(path_img_face):
-            # 读取以.jpg为后缀的文件
-            if face_img.endswith(".jpg"):
-                file_face_img = os.path.join(path_img_face,face_img)
-                
-                # 读取图像并转换为灰度图
-                img = cv2.imread(file_face_img)
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                
-                # 保存图像和人脸ID
-                faceSamples.append(img)
-                ids.append(i)
-    
-    print(dic_face)
-    
-    # 进行模型训练    
-    recognizer.train(faceSamples, np.array(ids))
-
-    # 模型保存 
-    recognizer.save('trainer.yml')                
-    
-    # 进行字典保存
-    with open("face_list.txt",'w') as f:
-        for face_id in dic_face:
-            f.write("%d %s\n"%(face_id,dic_face[face_id]))
-    
-        
-        
-        
-        
-
-
-                
-      
\ No newline at end of file
+    # 进行模型训练：第一块用 train，之后用 update 追加，避免一次性把所有图片放进内存
+    trained = False
+
+    if args.pack:
+        # 打包样本集：编号与姓名直接取自包内，样本通过 memmap 零拷贝读取
+        pack = FacePack(args.pack)
+        # 包内编号换成花名册中的稳定编号
+        label_map = {pack_id: roster.add(name) for pack_id, name in sorted(pack.names.items())}
+        dic_face = {label_map[pack_id]: name for pack_id, name in pack.names.items()}
+        print(dic_face)
+        for images, ids in pack.iter_chunks(args.chunk_size):
+            images = [preprocessor(img) for img in images]
+            ids = np.array([label_map[int(i)] for i in ids], dtype=np.int32)
+            if not trained:
+                recognizer.train(images, ids)
+                trained = True
+            else:
+                recognizer.update(images, ids)
+    else:
+        # 人脸存储路径
+
+        base_path = args.base_path
+
+        # 获取人脸id（排除缓存目录）
+        face_ids = [d for d in get_face_list(base_path) if not d.startswith(".")]
+        print(face_ids)
+        for face_id in face_ids:
+            # 人脸字典更新
+            dic_face[roster.add(face_id)] = face_id
+
+        print(dic_face)
+
+        samples = list_face_samples(base_path, face_ids, [roster.find(face_id) for face_id in face_ids])
+        cache = None
+        if not args.no_cache:
+            cache = FaceSampleCache(args.cache_dir or os.path.join(base_path, ".cache"), config.key())
+
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            for faceSamples, ids in iter_sample_chunks(samples, args.chunk_size, executor, cache, config):
+                if not trained:
+                    recognizer.train(faceSamples, ids)
+                    trained = True
+                else:
+                    recognizer.update(faceSamples, ids)
+        if cache is not None:
+            cache.prune()
+
+    # 没有任何样本时不能保存：空模型比现有模型新，识别端会用它替换掉仍可用的旧模型
+    if not trained:
+        raise SystemExit(f"未找到任何人脸样本，未保存模型（{args.pack or args.base_path}）")
+
+    # 先整体替换增量注册使用的直方图库，再写 trainer.yml 与快照：
+    # 两者都比直方图库新，"lbph" 后端直接读取 trainer.yml，其他后端映射快照
+    index = LBPHistogramIndex.from_recognizer(recognizer)
+    config.save(model_path(PREPROCESS_PATH))
+    HistogramStore(model_path(HISTOGRAM_DIR)).import_index(index, replace=True)
+    # 模型保存（预处理参数一并保存，识别时按相同方式处理人脸）
+    recognizer.save(model_path(TRAINER_PATH))
+    # 同时写出二进制快照，识别端启动时直接内存映射，不再解析 trainer.yml
+    index.save_snapshot(model_path(SNAPSHOT_DIR))
+    # face_list.txt 已由花名册逐行追加，不再整体重写
@@ -0,0 +1,101 @@
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    帧差运动门控：在缩小的灰度图上与滑动平均背景比较，画面静止时跳过检测与识别。
+
+    变化像素比例超过 threshold，或距上次完整处理超过 max_stale_seconds 时放行一次完整处理。
+    命中率与估算节省的 CPU 时间通过计数器暴露。
+    """
+
+    def __init__(
+        self,
+        size: Tuple[int, int] = (80, 60),
+        pixel_delta: int = 15,
+        threshold: float = 0.01,
+        alpha: float = 0.05,
+        max_stale_seconds: float = 5.0,
+    ):
+        self.size = size
+        self.pixel_delta = pixel_delta
+        self.threshold = threshold
+        self.alpha = alpha
+        self.max_stale_seconds = max_stale_seconds
+        self._background: Optional[np.ndarray] = None
+        self._last_full = 0.0
+        self._avg_pass_cost = 0.0
+        self.last_motion = 0.0
+        self.checks = 0
+        self.skipped = 0
+        self.motion_triggers = 0
+        self.stale_triggers = 0
+
+    def should_process(self, gray) -> bool:
+        """返回 True 表示本帧需要完整检测与识别。"""
+        self.checks += 1
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA).astype(np.float32)
+        now = time.monotonic()
+        if self._background is None:
+            self._background = small
+            self._last_full = now
+            self.motion_triggers += 1
+            return True
+
+        diff = cv2.absdiff(small, self._background)
+        self.last_motion = float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+        cv2.accumulateWeighted(small, self._background, self.alpha)
+
+        if self.last_motion >= self.threshold:
+            self.motion_triggers += 1
+        elif now - self._last_full >= self.max_stale_seconds:
+            self.stale_triggers += 1
+        else:
+            self.skipped += 1
+            return False
+        self._last_full = now
+        return True
+
+    def record_pass(self, seconds: float):
+        """记录一次完整处理的耗时，用于估算跳过帧节省的时间。"""
+        if self._avg_pass_cost == 0.0:
+            self._avg_pass_cost = seconds
+        else:
+            self._avg_pass_cost = 0.9 * self._avg_pass_cost + 0.1 * seconds
+
+    @property
+    def hit_rate(self) -> float:
+        return self.skipped / self.checks if self.checks else 0.0
+
+    @property
+    def saved_seconds(self) -> float:
+        return self.skipped * self._avg_pass_cost
+
+    def counters(self):
+        return {
+            "checks": self.checks,
+            "skipped": self.skipped,
+            "motion_triggers": self.motion_triggers,
+            "stale_triggers": self.stale_triggers,
+            "hit_rate": self.hit_rate,
+            "saved_seconds": self.saved_seconds,
+        }
+
+    def reset(self):
+        self._background = None
+        self._last_full = 0.0
+
+
+if __name__ == "__main__":
+    gate = MotionGate(max_stale_seconds=60)
+    still = np.full((480, 640), 120, dtype=np.uint8)
+    for i in range(20):
+        frame = still.copy()
+        if i == 10:
+            frame[100:300, 200:400] = 255
+        gate.should_process(frame)
+    print(gate.counters())
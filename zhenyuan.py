@@ -0,0 +1,228 @@
+import abc
+import os
+import time
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from shexiangtou import get_camera
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class FrameSource(abc.ABC):
+    """
+    帧来源的统一接口，读取方式与 cv2.VideoCapture 保持一致：read() -> (ok, frame)。
+
+    有限来源（视频文件、图片目录、内存数组）读完后 exhausted 为 True，摄像头断开后也置为 True；
+    realtime=True 时按 fps 节奏回放，否则尽可能快地读取。
+    """
+
+    finite = False
+
+    def __init__(self, fps: Optional[float] = None, realtime: bool = False):
+        self.fps = fps
+        self.realtime = realtime
+        self.exhausted = False
+        self.frame_count = 0
+        self._next_due: Optional[float] = None
+
+    def _pace(self):
+        if not self.realtime or not self.fps:
+            return
+        now = time.monotonic()
+        if self._next_due is None:
+            self._next_due = now
+        elif self._next_due > now:
+            time.sleep(self._next_due - now)
+        self._next_due = max(self._next_due, now) + 1.0 / self.fps
+
+    @abc.abstractmethod
+    def _read_frame(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """读取下一帧，返回 (ok, frame)；子类必须实现。"""
+
+    def read(self, copy: bool = False) -> Tuple[bool, Optional[np.ndarray]]:
+        if self.exhausted:
+            return False, None
+        self._pace()
+        ok, frame = self._read_frame()
+        if not ok:
+            return False, None
+        self.frame_count += 1
+        if copy:
+            frame = frame.copy()
+        return True, frame
+
+    def isOpened(self) -> bool:  # pylint: disable=invalid-name
+        return not self.exhausted
+
+    def release(self):
+        self.exhausted = True
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        while self.isOpened():
+            ok, frame = self.read()
+            if ok:
+                yield frame
+
+
+class CameraSource(FrameSource):
+    """
+    实时摄像头，底层复用共享的 CameraService，释放时不关闭设备。
+
+    每次读取最多等待 1 秒新帧；连续 max_failed_reads 次读不到，或采集服务已停止时视为摄像头断开，
+    exhausted 置为 True，调用方的读取循环随之结束，而不是一直空转。
+    """
+
+    def __init__(self, device=0, max_failed_reads: int = 5):
+        super().__init__()
+        self.device = device
+        self.max_failed_reads = max_failed_reads
+        self._failed_reads = 0
+        self._camera = get_camera(device)
+
+    def _read_frame(self):
+        ok, frame = self._camera.read()
+        if ok:
+            self._failed_reads = 0
+            return ok, frame
+        self._failed_reads += 1
+        if self._failed_reads >= self.max_failed_reads or not self._camera.isOpened():
+            self.exhausted = True
+        return False, None
+
+    def isOpened(self) -> bool:  # pylint: disable=invalid-name
+        return not self.exhausted and self._camera.isOpened()
+
+    def release(self):
+        pass
+
+
+class VideoFileSource(FrameSource):
+    """录制好的视频文件，fps 默认取自文件本身。"""
+
+    finite = True
+
+    def __init__(self, path, realtime: bool = False, fps: Optional[float] = None):
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise RuntimeError(f"无法打开视频文件：{path}")
+        if fps is None:
+            fps = cap.get(cv2.CAP_PROP_FPS) or None
+        super().__init__(fps, realtime)
+        self.path = path
+        self._cap = cap
+
+    def _read_frame(self):
+        ok, frame = self._cap.read()
+        if not ok:
+            self.release()
+        return ok, frame
+
+    def release(self):
+        super().release()
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+class ImageDirSource(FrameSource):
+    """按文件名排序依次读取目录中的图片，loop=True 时循环播放。"""
+
+    finite = True
+
+    def __init__(self, directory, realtime: bool = False, fps: Optional[float] = 25.0, loop: bool = False):
+        super().__init__(fps, realtime)
+        self.directory = directory
+        self.loop = loop
+        self.paths: List[str] = sorted(
+            os.path.join(directory, name)
+            for name in os.listdir(directory)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        if not self.paths:
+            raise RuntimeError(f"目录中没有图片：{directory}")
+        self._index = 0
+
+    def _read_frame(self):
+        while True:
+            if self._index >= len(self.paths):
+                if not self.loop:
+                    self.release()
+                    return False, None
+                self._index = 0
+            path = self.paths[self._index]
+            self._index += 1
+            # imread 不支持中文路径，改用 imdecode
+            frame = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is not None:
+                return True, frame
+
+
+class ArraySource(FrameSource):
+    """内存中的帧序列（列表或 N×H×W[×C] 数组），读取时默认不复制。"""
+
+    finite = True
+
+    def __init__(self, frames: Sequence[np.ndarray], realtime: bool = False, fps: Optional[float] = 25.0, loop: bool = False):
+        super().__init__(fps, realtime)
+        self.frames = frames
+        self.loop = loop
+        self._index = 0
+
+    def _read_frame(self):
+        if self._index >= len(self.frames):
+            if not self.loop or len(self.frames) == 0:
+                self.release()
+                return False, None
+            self._index = 0
+        frame = self.frames[self._index]
+        self._index += 1
+        return True, frame
+
+
+def open_source(spec=None, realtime: bool = False, fps: Optional[float] = None) -> FrameSource:
+    """
+    根据描述创建帧来源：
+    None / 整数 / 纯数字字符串 → 摄像头；目录 → 图片目录；其他路径 → 视频文件；
+    数组或列表 → 内存帧序列。
+    """
+    if isinstance(spec, FrameSource):
+        return spec
+    if spec is None:
+        return CameraSource(0)
+    if isinstance(spec, int):
+        return CameraSource(spec)
+    if isinstance(spec, (np.ndarray, list, tuple)):
+        return ArraySource(spec, realtime=realtime, fps=fps or 25.0)
+    spec = str(spec)
+    if spec.isdigit():
+        return CameraSource(int(spec))
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, realtime=realtime, fps=fps or 25.0)
+    if os.path.exists(spec):
+        return VideoFileSource(spec, realtime=realtime, fps=fps)
+    raise FileNotFoundError(f"未找到帧来源：{spec}")
+
+
+def add_source_arguments(parser):
+    """为命令行入口添加 --source / --realtime 参数。"""
+    parser.add_argument("--source", default=None, help="帧来源：摄像头编号、视频文件或图片目录（默认摄像头 0）")
+    parser.add_argument("--realtime", action="store_true", help="按原始帧率回放视频/图片，默认尽可能快")
+    return parser
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = add_source_arguments(argparse.ArgumentParser(description="测量帧来源读取速度"))
+    args = arg_parser.parse_args()
+    src = open_source(args.source, realtime=args.realtime)
+    begin = time.monotonic()
+    for _ in src:
+        if not src.finite and src.frame_count >= 100:
+            break
+    cost = time.monotonic() - begin
+    print(f"读取 {src.frame_count} 帧，用时 {cost:.2f}s，{src.frame_count / max(cost, 1e-6):.1f} 帧/秒")
+    src.release()